@@ -13,6 +13,8 @@ import plotly.graph_objects as go
 from bs4 import BeautifulSoup
 import re
 
+from mexico_city_cache import memoize
+
 # Define paths to data files
 employment_rate_file = "Employment rate by city.xls"
 hourly_salary_file = "Mean hourly salary by city.xls"
@@ -168,6 +170,7 @@ print("Compiling data...")
 city_data_df = compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
 
 # Calculate yearly averages and growth rates
+@memoize
 def calculate_growth_rates(data):
     """Calculate year-over-year growth rates."""
     # Group by city and year, taking the average for each year
@@ -209,6 +212,7 @@ def calculate_growth_rates(data):
     return pd.DataFrame(yearly_growth)
 
 # Calculate Compound Annual Growth Rate (CAGR)
+@memoize
 def calculate_cagr(data, start_year, end_year):
     """Calculate CAGR for the specified time period."""
     # Filter data for the specified time period
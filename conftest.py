@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shared pytest fixtures: random panels with the gaps of the real sources
+(missing quarters, cities missing from a source, non-positive values).
+"""
+
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+
+from mexico_city_cache import metrics_cache
+from mexico_city_data_compiler import compile_data
+
+# Tests compute everything afresh instead of reading or filling the disk tier
+metrics_cache.disk_dir = None
+
+def random_sources(n_cities, seed=0, first_year=2005, last_year=2024):
+    """Random source series shaped like the parsed ENOE and SHF tables.
+
+    Returns:
+        tuple: (employment, salary, population, housing cost, time points), as compile_data takes them
+    """
+    rng = np.random.default_rng(seed)
+    time_points = [f"{year}Q{quarter}" for year in range(first_year, last_year + 1) for quarter in range(1, 5)]
+    cities = [f"Ciudad de City{i}" if i % 3 == 0 else f"City{i}" for i in range(n_cities)]
+
+    def source(scale, missing, coverage=1.0):
+        series = {}
+        for city in cities:
+            if rng.random() > coverage:
+                continue
+            values = rng.random(len(time_points)) * scale
+            values[rng.random(len(time_points)) < missing] = np.nan
+            if rng.random() < 0.05:
+                values[0] = -1.0
+            series[city] = pd.Series(values, index=time_points)
+        return series
+
+    housing = {}
+    for i, city in enumerate(cities):
+        if rng.random() < 0.8:
+            values = rng.random(len(time_points)) * 200
+            values[rng.random(len(time_points)) < 0.1] = np.nan
+            # SHF names some cities without the 'Ciudad de ' prefix
+            housing[city.replace('Ciudad de ', '') if i % 2 == 0 else city] = pd.Series(values, index=time_points)
+    return source(100, 0.1), source(50, 0.2, 0.9), source(1e6, 0.05, 0.95), housing, time_points
+
+def random_panel(n_cities, seed=0):
+    """Compiled panel of random sources, with infinite values (from zero deflators) as NaN."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return compile_data(*random_sources(n_cities, seed)).replace([np.inf, -np.inf], np.nan)
+
+@pytest.fixture(scope='session')
+def panel():
+    return random_panel(40, seed=1)
@@ -17,6 +17,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from bs4 import BeautifulSoup
 import re
+from mexico_city_cache import memoize
+from mexico_city_data_compiler import CityPanel, calculate_boxplot_stats, calculate_time_series_bands
 
 # Set plotting styles
 plt.style.use('seaborn')
@@ -158,6 +160,7 @@ def compile_data(employment_data, salary_data, population_data, housing_cost_dat
     return pd.DataFrame(result_data)
 
 # 3. Function to calculate growth rates
+@memoize
 def calculate_growth_rates(data):
     """Calculate year-over-year growth rates."""
     # Group by city and year, taking the average for each year
@@ -199,6 +202,7 @@ def calculate_growth_rates(data):
     return pd.DataFrame(yearly_growth)
 
 # 4. Function to calculate CAGR
+@memoize
 def calculate_cagr(data, start_year, end_year):
     """Calculate CAGR for the specified time period."""
     # Filter data for the specified time period
@@ -239,9 +243,10 @@ def calculate_cagr(data, start_year, end_year):
 
 # 5. Visualization functions
 
-def plot_employment_vs_population(data, selected_city, start_year, end_year):
+def plot_employment_vs_population(city_panel, selected_city, start_year, end_year):
     """Create scatter plot of employment rate vs. population (Fig. 1)."""
     # Filter data for the selected years
+    data = city_panel.frame
     filtered_data = data[
         (data['year'] >= start_year) & 
         (data['year'] <= end_year)
@@ -250,8 +255,9 @@ def plot_employment_vs_population(data, selected_city, start_year, end_year):
         'population': 'mean'
     }).reset_index()
     
-    # Get latest available year for each city
-    latest_data = filtered_data.loc[filtered_data.groupby('city')['year'].idxmax()]
+    # Latest available year of each city, sliced from a panel of the yearly means
+    yearly_panel = CityPanel(filtered_data, ['year'])
+    latest_data = yearly_panel.latest
     
     # Create figure
     fig = px.scatter(
@@ -268,7 +274,7 @@ def plot_employment_vs_population(data, selected_city, start_year, end_year):
     )
     
     # Highlight selected city
-    selected_data = latest_data[latest_data['city'] == selected_city]
+    selected_data = yearly_panel.latest_city(selected_city)
     if not selected_data.empty:
         fig.add_trace(
             go.Scatter(
@@ -291,37 +297,41 @@ def plot_employment_vs_population(data, selected_city, start_year, end_year):
     
     return fig
 
-def plot_population_growth_boxplot(yearly_data, selected_city):
+def plot_population_growth_boxplot(yearly_panel, selected_city, stats=None):
     """Create boxplot of population growth (Fig. 2)."""
-    # Get years in the data
-    years = sorted(yearly_data['year'].unique())
+    # Summary statistics for all years, computed once if not precomputed
+    if stats is None:
+        stats, _ = calculate_boxplot_stats(yearly_panel.frame, 'population_growth')
     
     # Create figure
     fig = go.Figure()
     
-    # Add boxplots for each year
-    for year in years:
-        year_data = yearly_data[yearly_data['year'] == year]
+    # Add a single box trace for all years from the precomputed statistics
+    fig.add_trace(
+        go.Box(
+            x=stats['year'].astype(str),
+            q1=stats['q1'],
+            median=stats['median'],
+            q3=stats['q3'],
+            lowerfence=stats['lowerfence'],
+            upperfence=stats['upperfence'],
+            boxpoints=False,
+            showlegend=False
+        )
+    )
+    
+    # Add markers for selected city
+    selected_city_data = yearly_panel.city(selected_city)
+    if not selected_city_data.empty:
         fig.add_trace(
-            go.Box(
-                y=year_data['population_growth'],
-                name=str(year),
-                boxpoints=False
+            go.Scatter(
+                x=selected_city_data['year'].astype(str),
+                y=selected_city_data['population_growth'],
+                mode='markers',
+                marker=dict(color='red', size=10),
+                showlegend=False
             )
         )
-        
-        # Add marker for selected city
-        selected_city_data = year_data[year_data['city'] == selected_city]
-        if not selected_city_data.empty:
-            fig.add_trace(
-                go.Scatter(
-                    x=[str(year)],
-                    y=selected_city_data['population_growth'],
-                    mode='markers',
-                    marker=dict(color='red', size=10),
-                    showlegend=False
-                )
-            )
     
     # Update layout
     fig.update_layout(
@@ -332,11 +342,19 @@ def plot_population_growth_boxplot(yearly_data, selected_city):
     
     return fig
 
-def plot_population_growth_vs_real_wages(yearly_data, selected_city):
+# Above this many points Fig. 3 switches to a single WebGL trace without point labels
+SCATTERGL_THRESHOLD = 1000
+
+def plot_population_growth_vs_real_wages(yearly_panel, selected_city, high_volume=None):
     """Create scatter of population growth vs. real wages (Fig. 3)."""
+    if high_volume is None:
+        high_volume = len(yearly_panel) > SCATTERGL_THRESHOLD
+    if high_volume:
+        return plot_population_growth_vs_real_wages_gl(yearly_panel, selected_city)
+    
     # Create figure
     fig = px.scatter(
-        yearly_data,
+        yearly_panel.frame,
         x='population_growth',
         y='avg_real_wage',
         text='city',
@@ -349,7 +367,7 @@ def plot_population_growth_vs_real_wages(yearly_data, selected_city):
     )
     
     # Highlight selected city
-    selected_data = yearly_data[yearly_data['city'] == selected_city]
+    selected_data = yearly_panel.city(selected_city)
     fig.add_trace(
         go.Scatter(
             x=selected_data['population_growth'],
@@ -363,10 +381,55 @@ def plot_population_growth_vs_real_wages(yearly_data, selected_city):
     
     return fig
 
-def plot_cagr_scatter(cagr_data, selected_city, x_var, y_var, x_label, y_label, title):
+def plot_population_growth_vs_real_wages_gl(yearly_panel, selected_city):
+    """Create Fig. 3 as a single Scattergl trace, with city names shown on hover only."""
+    yearly_data = yearly_panel.frame
+    fig = go.Figure()
+    
+    # All city-years in one trace, colored by year
+    fig.add_trace(
+        go.Scattergl(
+            x=yearly_data['population_growth'],
+            y=yearly_data['avg_real_wage'],
+            hovertext=yearly_data['city'],
+            mode='markers',
+            marker=dict(
+                color=yearly_data['year'],
+                colorscale='Viridis',
+                colorbar=dict(title='year'),
+                size=6
+            ),
+            showlegend=False
+        )
+    )
+    
+    # Highlight selected city
+    selected_data = yearly_panel.city(selected_city)
+    fig.add_trace(
+        go.Scattergl(
+            x=selected_data['population_growth'],
+            y=selected_data['avg_real_wage'],
+            text=selected_data['city'],
+            mode='markers+text',
+            textposition='top center',
+            marker=dict(color='red', size=12),
+            name=selected_city
+        )
+    )
+    
+    # Update layout
+    fig.update_layout(
+        title=f"Population Growth vs. Real Wages with {selected_city} highlighted",
+        xaxis_title="Population Growth (%)",
+        yaxis_title="Real Wage (Monthly Salary / Housing Index)"
+    )
+    
+    return fig
+
+def plot_cagr_scatter(cagr_panel, selected_city, x_var, y_var, x_label, y_label, title):
     """Create scatter plot of CAGR variables (Figs. 4-5)."""
     fig = px.scatter(
-        cagr_data,
+        cagr_panel.frame,
         x=x_var,
         y=y_var,
         text='city',
@@ -378,7 +441,7 @@ def plot_cagr_scatter(cagr_data, selected_city, x_var, y_var, x_label, y_label,
     )
     
     # Highlight selected city
-    selected_data = cagr_data[cagr_data['city'] == selected_city]
+    selected_data = cagr_panel.city(selected_city)
     if not selected_data.empty:
         fig.add_trace(
             go.Scatter(
@@ -394,25 +457,48 @@ def plot_cagr_scatter(cagr_data, selected_city, x_var, y_var, x_label, y_label,
     
     return fig
 
-def plot_time_series(city_data, selected_city, value_col, value_label, title):
+def plot_time_series(city_panel, selected_city, value_col, value_label, title, bands=None):
     """Create time series line plots (Figs. 6-8)."""
-    # Calculate median values across all cities for each time point
-    city_data_by_year = city_data.groupby(['year', 'quarter']).agg({
-        value_col: 'median'
-    }).reset_index()
-    city_data_by_year['time_point'] = city_data_by_year['year'].astype(str) + 'Q' + city_data_by_year['quarter'].astype(str)
+    # Distribution across all cities for each time point, computed once if not precomputed
+    if bands is None:
+        bands = calculate_time_series_bands(city_panel.frame, [value_col])[value_col]
     
-    # Filter data for selected city
-    selected_city_data = city_data[city_data['city'] == selected_city]
+    # Rows of the selected city, already in time order
+    selected_city_data = city_panel.city(selected_city)
     
     # Create figure
     fig = go.Figure()
     
+    # Add shaded p10-p90 and p25-p75 bands across all cities
+    for lower, upper, opacity in [('p10', 'p90', 0.15), ('p25', 'p75', 0.3)]:
+        fig.add_trace(
+            go.Scatter(
+                x=bands['time_point'],
+                y=bands[upper],
+                mode='lines',
+                line=dict(width=0),
+                hoverinfo='skip',
+                showlegend=False
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=bands['time_point'],
+                y=bands[lower],
+                mode='lines',
+                line=dict(width=0),
+                fill='tonexty',
+                fillcolor=f'rgba(128, 128, 128, {opacity})',
+                name=f'All Cities ({lower}-{upper})',
+                hoverinfo='skip'
+            )
+        )
+    
     # Add line for median of all cities
     fig.add_trace(
         go.Scatter(
-            x=city_data_by_year['time_point'],
-            y=city_data_by_year[value_col],
+            x=bands['time_point'],
+            y=bands['p50'],
             mode='lines',
             name='Median of All Cities',
             line=dict(color='gray')
@@ -437,7 +523,7 @@ def plot_time_series(city_data, selected_city, value_col, value_label, title):
         yaxis_title=value_label,
         xaxis=dict(
             tickmode='array',
-            tickvals=city_data_by_year['time_point'][::4],  # Show every 4th tick (annual)
+            tickvals=bands['time_point'][::4],  # Show every 4th tick (annual)
             tickangle=45
         )
     )
@@ -473,26 +559,33 @@ def main():
         end_year = 2020
         print(f"Calculating CAGR for {start_year}-{end_year}...")
         cagr_data = calculate_cagr(city_data, start_year, end_year)
+        box_stats, _ = calculate_boxplot_stats(yearly_data, 'population_growth')
+        bands = calculate_time_series_bands(city_data)
+        
+        # Index the tables by city so each figure slices the selected city's rows
+        city_panel = CityPanel(city_data, ['year', 'quarter'])
+        yearly_panel = CityPanel(yearly_data, ['year'])
+        cagr_panel = CityPanel(cagr_data, [])
         
         # 5. Create visualizations for a selected city
         selected_city = "Ciudad de Monterrey"
         print(f"Creating visualizations for {selected_city}...")
         
         # Fig 1: Employment vs. Population
-        fig1 = plot_employment_vs_population(city_data, selected_city, start_year, end_year)
-        fig1.write_html("1_employment_vs_population.html")
+        fig1 = plot_employment_vs_population(city_panel, selected_city, start_year, end_year)
+        fig1.write_html("1_employment_vs_population.html", include_plotlyjs='directory')
         
         # Fig 2: Population Growth Boxplots
-        fig2 = plot_population_growth_boxplot(yearly_data, selected_city)
-        fig2.write_html("2_population_growth_boxplot.html")
+        fig2 = plot_population_growth_boxplot(yearly_panel, selected_city, box_stats)
+        fig2.write_html("2_population_growth_boxplot.html", include_plotlyjs='directory')
         
         # Fig 3: Population Growth vs. Real Wages
-        fig3 = plot_population_growth_vs_real_wages(yearly_data, selected_city)
-        fig3.write_html("3_population_growth_vs_real_wages.html")
+        fig3 = plot_population_growth_vs_real_wages(yearly_panel, selected_city)
+        fig3.write_html("3_population_growth_vs_real_wages.html", include_plotlyjs='directory')
         
         # Fig 4: CAGR Real Wages vs. Population Growth
         fig4 = plot_cagr_scatter(
-            cagr_data, 
+            cagr_panel, 
             selected_city,
             'real_wage_cagr', 
             'population_cagr',
@@ -500,11 +593,11 @@ def main():
             'Population CAGR (%)',
             f"CAGR of Real Wages vs. Population Growth ({start_year}-{end_year})"
         )
-        fig4.write_html("4_cagr_real_wages_vs_population.html")
+        fig4.write_html("4_cagr_real_wages_vs_population.html", include_plotlyjs='directory')
         
         # Fig 5: CAGR Nominal Wages vs. Population Growth
         fig5 = plot_cagr_scatter(
-            cagr_data, 
+            cagr_panel, 
             selected_city,
             'nominal_wage_cagr', 
             'population_cagr',
@@ -512,37 +605,40 @@ def main():
             'Population CAGR (%)',
             f"CAGR of Nominal Wages vs. Population Growth ({start_year}-{end_year})"
         )
-        fig5.write_html("5_cagr_nominal_wages_vs_population.html")
+        fig5.write_html("5_cagr_nominal_wages_vs_population.html", include_plotlyjs='directory')
         
         # Fig 6: Nominal Wages Time Series
         fig6 = plot_time_series(
-            city_data,
+            city_panel,
             selected_city,
             'monthly_salary',
             'Monthly Nominal Salary (MXN)',
-            f"Nominal Wages Over Time for {selected_city} vs. Median of All Cities"
+            f"Nominal Wages Over Time for {selected_city} vs. Median of All Cities",
+            bands['monthly_salary']
         )
-        fig6.write_html("6_nominal_wages_time_series.html")
+        fig6.write_html("6_nominal_wages_time_series.html", include_plotlyjs='directory')
         
         # Fig 7: Real Wages Time Series
         fig7 = plot_time_series(
-            city_data,
+            city_panel,
             selected_city,
             'real_wage',
             'Real Wage (Monthly Salary / Housing Index)',
-            f"Real Wages Over Time for {selected_city} vs. Median of All Cities"
+            f"Real Wages Over Time for {selected_city} vs. Median of All Cities",
+            bands['real_wage']
         )
-        fig7.write_html("7_real_wages_time_series.html")
+        fig7.write_html("7_real_wages_time_series.html", include_plotlyjs='directory')
         
         # Fig 8: Housing Cost Index Time Series
         fig8 = plot_time_series(
-            city_data,
+            city_panel,
             selected_city,
             'housing_index',
             'Housing Cost Index',
-            f"Housing Cost Index Over Time for {selected_city} vs. Median of All Cities"
+            f"Housing Cost Index Over Time for {selected_city} vs. Median of All Cities",
+            bands['housing_index']
         )
-        fig8.write_html("8_housing_cost_time_series.html")
+        fig8.write_html("8_housing_cost_time_series.html", include_plotlyjs='directory')
         
         print("Visualizations have been saved as HTML files.")
         
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Data API
+This module serves the compiled panel, yearly growth and CAGR tables as
+read-only JSON/CSV endpoints on the Flask server behind the Dash app.
+Responses are serialized and compressed once per data version and query, and
+carry strong ETags so repeated pulls of unchanged data get a 304.
+"""
+
+import gzip
+import hashlib
+import json
+from functools import lru_cache
+import pandas as pd
+from flask import Response, abort, request
+
+from mexico_city_data_compiler import CityPanel, frame_digest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+API_PREFIX = "/api/v1"
+API_FORMATS = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+
+# Columns always returned, whatever metrics are requested
+KEY_COLUMNS = ['city', 'year', 'quarter', 'time_point', 'start_year', 'end_year', 'years']
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+class PreparedResponse:
+    """A serialized table in every content encoding, with a strong ETag for each."""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body)
+
+        # Strong ETags differ between encodings since the bytes differ
+        tag = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {encoding: f"{tag}-{encoding}" for encoding in self.bodies}
+
+    def encoding_for(self, accept_encodings):
+        """Pick the best encoding the client accepts (brotli, then gzip, then none)."""
+        for encoding in ['br', 'gzip']:
+            if encoding in self.bodies and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+class DataAPI:
+    """Read-only endpoints over the compiled tables of one data version.
+
+    Tables are CityPanel objects, so filtering by city slices each city's rows
+    instead of scanning the table (or StorePanel objects, which query those
+    rows from a DuckDB store). CAGR for other windows comes from the
+    PeriodAggregates prefix sums, so no request re-runs compile_data or
+    calculate_cagr.
+
+    Attributes:
+        tables (dict): Table name mapped to its CityPanel (or StorePanel)
+        aggregates (PeriodAggregates): Prefix sums serving CAGR for any window
+        version (str): Digest of the tables, part of every cache key and ETag
+    """
+
+    def __init__(self, tables, aggregates=None, cache_size=512, version=None, preload=True):
+        """Index the tables and pre-serialize their unfiltered versions.
+
+        Args:
+            tables (dict): Table name mapped to a CityPanel, a StorePanel or a DataFrame
+            aggregates (PeriodAggregates): Used for CAGR windows other than the default
+            cache_size (int): Number of filtered responses kept in memory
+            version (str): Data version of the tables (e.g. the dashboard's), or
+                None to use a digest of the tables
+            preload (bool): Serialize every unfiltered table now; pass False for
+                tables served by a DuckDB store, whose responses are then
+                serialized on first request instead of reading every table at startup
+        """
+        self.tables = {name: CityPanel(table, ['year', 'quarter']) if isinstance(table, pd.DataFrame) else table
+                       for name, table in tables.items()}
+        self.aggregates = aggregates
+        self.prepare = lru_cache(maxsize=cache_size)(self._prepare)
+        self.version = version if version is not None else frame_digest(*[table.frame for table in self.tables.values()])[:16]
+        if not preload:
+            return
+
+        print(f"Pre-serializing API tables for data version {self.version}...")
+        for name in self.tables:
+            for fmt in API_FORMATS:
+                self.prepare(name, fmt, (), None, None, ())
+
+    def select(self, name, cities=(), start_year=None, end_year=None, metrics=()):
+        """Filter a table by city, period and metrics.
+
+        For the 'cagr' table, start_year and end_year select the CAGR window
+        instead of filtering rows.
+
+        Args:
+            name (str): Table name
+            cities (tuple): Cities to keep, all of them if empty
+            start_year (int): First year to keep
+            end_year (int): Last year to keep
+            metrics (tuple): Metric columns to keep, all of them if empty
+
+        Returns:
+            pd.DataFrame: The selected rows and columns
+        """
+        table = self.tables[name]
+        if name == 'cagr' and (start_year is not None or end_year is not None) and self.aggregates is not None:
+            first_year, last_year = int(self.aggregates.years.min()), int(self.aggregates.years.max())
+            table = CityPanel(self.aggregates.cagr(start_year or first_year, end_year or last_year), [])
+            start_year = end_year = None
+
+        data = pd.concat([table.city(city) for city in cities]) if cities else table.frame
+        if start_year is not None and 'year' in data.columns:
+            data = data[data['year'] >= start_year]
+        if end_year is not None and 'year' in data.columns:
+            data = data[data['year'] <= end_year]
+
+        if metrics:
+            unknown = [metric for metric in metrics if metric not in data.columns]
+            if unknown:
+                raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+            data = data[[col for col in data.columns if col in KEY_COLUMNS] + list(metrics)]
+        return data
+
+    def _prepare(self, name, fmt, cities, start_year, end_year, metrics):
+        """Serialize and compress one query (memoized per data version by self.prepare)."""
+        data = self.select(name, cities, start_year, end_year, metrics)
+        if fmt == 'csv':
+            body = data.to_csv(index=False).encode('utf-8')
+        else:
+            body = data.to_json(orient='records', double_precision=6).encode('utf-8')
+        return PreparedResponse(body, API_FORMATS[fmt])
+
+    def handle(self, table, fmt):
+        """Flask view for {API_PREFIX}/<table>.<fmt>."""
+        if table not in self.tables or fmt not in API_FORMATS:
+            abort(404)
+
+        try:
+            cities = tuple(sorted(set(request.args.getlist('city'))))
+            start_year = request.args.get('start_year', type=int)
+            end_year = request.args.get('end_year', type=int)
+            metrics = tuple(metric for value in request.args.getlist('metrics') for metric in value.split(',') if metric)
+            prepared = self.prepare(table, fmt, cities, start_year, end_year, metrics)
+        except ValueError as e:
+            return Response(json.dumps({'error': str(e)}), status=400, mimetype=API_FORMATS['json'])
+
+        encoding = prepared.encoding_for(request.accept_encodings)
+        etag = prepared.etags[encoding]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(prepared.bodies[encoding], mimetype=prepared.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Data-Version'] = self.version
+        return response
+
+    def index(self):
+        """Flask view listing the tables, their columns and the data version."""
+        return {
+            'version': self.version,
+            'formats': list(API_FORMATS),
+            'tables': {name: list(table.columns) for name, table in self.tables.items()},
+            'parameters': ['city (repeatable)', 'start_year', 'end_year', 'metrics (comma-separated)']
+        }
+
+    def register(self, server):
+        """Add the API routes to a Flask server (e.g. app.server of a Dash app)."""
+        server.add_url_rule(f"{API_PREFIX}/", 'data_api_index', self.index)
+        server.add_url_rule(f"{API_PREFIX}/<table>.<fmt>", 'data_api', self.handle)
+        return self
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Metrics Cache
+This module memoizes pure metric functions such as calculate_growth_rates and
+calculate_cagr, and the parsers of the source files. Results are keyed by a
+hash of the input panel (its data version) or of the file's metadata plus the
+other arguments, and kept in a bounded in-memory LRU backed by an on-disk LRU
+store, with hit/miss counters to size both tiers.
+"""
+
+import os
+import glob
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+import diskcache
+import pandas as pd
+
+METRICS_CACHE_DIR = "cache/metrics"
+
+# Number of results kept in memory, and bytes kept on disk
+MEMORY_SIZE = 64
+DISK_SIZE_LIMIT = 512 * 1024 * 1024
+
+# Held around every use of an on-disk (SQLite) store in this process, so a process
+# forked from another thread (e.g. a Dash background job) never inherits SQLite's
+# internal mutexes locked and deadlocks on its first query
+sqlite_lock = threading.RLock()
+
+@contextmanager
+def sqlite_session(store):
+    """Use a diskcache store under sqlite_lock and close this thread's connection to it afterwards.
+
+    A process forked from the threaded server closes the SQLite connections it
+    inherits (diskcache closes the forking thread's, Python drops the other
+    threads'), which corrupts the database for every process ("database disk
+    image is malformed"). With each connection closed after use and every fork
+    taken under the same lock, a forked process inherits none.
+
+    Args:
+        store (diskcache.Cache): Store to use, or None
+
+    Yields:
+        diskcache.Cache: The store
+    """
+    with sqlite_lock:
+        try:
+            yield store
+        finally:
+            if store is not None:
+                store.close()
+
+# Returned by MetricsCache.get and by memoized functions' cached() for a result
+# that isn't cached, so a result of None can be cached and told apart from a miss
+MISSING = object()
+
+# Source files whose code memoized results depend on
+CODE_FILES = "mexico_city_*.py"
+
+@lru_cache(maxsize=None)
+def code_version():
+    """Return a hash of the source of every module of the package.
+
+    Memoized functions call helpers and classes of other modules (fit_windows
+    reads PeriodAggregates.cagr_cube, forecast_panel calls smooth_block) and
+    may return instances of them, so every key includes the version of the
+    whole package's code: any code change invalidates every cached result.
+
+    Returns:
+        str: Hex digest of the modules' sources, read once per process
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), CODE_FILES))):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def frame_digest(*frames):
+    """Return a stable hash of the contents of one or more DataFrames.
+
+    Args:
+        *frames (pd.DataFrame): Tables to hash together
+
+    Returns:
+        str: Hex digest that changes whenever any value or column changes
+    """
+    digest = hashlib.sha256()
+    for frame in frames:
+        digest.update(",".join(map(str, frame.columns)).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+    return digest.hexdigest()
+
+class MetricsCache:
+    """Two-tier LRU cache: a bounded dict in memory in front of a diskcache store.
+
+    Attributes:
+        memory_hits (int): Lookups answered from memory
+        disk_hits (int): Lookups answered from disk (and promoted to memory)
+        misses (int): Lookups that had to compute the result
+    """
+
+    def __init__(self, memory_size=MEMORY_SIZE, disk_dir=METRICS_CACHE_DIR, disk_size_limit=DISK_SIZE_LIMIT):
+        """Set up both tiers; the disk store is only opened on first use.
+
+        Args:
+            memory_size (int): Maximum number of results kept in memory
+            disk_dir (str): Directory of the disk tier, or None for memory only
+            disk_size_limit (int): Maximum size of the disk tier in bytes
+        """
+        self.memory_size = memory_size
+        self.disk_dir = disk_dir
+        self.disk_size_limit = disk_size_limit
+        self._memory = OrderedDict()
+        self._disk_store = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def disk(self):
+        """The disk tier, evicting least recently used entries beyond its size limit."""
+        if self._disk_store is None and self.disk_dir is not None:
+            with sqlite_lock:
+                if self._disk_store is None:
+                    with sqlite_session(diskcache.Cache(self.disk_dir, size_limit=self.disk_size_limit,
+                                                        eviction_policy='least-recently-used')) as store:
+                        self._disk_store = store
+        return self._disk_store
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached result for key from either tier, or MISSING without computing it."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        disk = self.disk
+        if disk is not None:
+            with sqlite_session(disk):
+                value = disk.get(key, MISSING)
+            if value is not MISSING:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, value)
+                return value
+        return MISSING
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        disk = self.disk
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        self._remember(key, value)
+        if disk is not None:
+            # A result another process stored meanwhile is the same, and replacing it
+            # deletes the file a concurrent reader may be opening (a miss for that reader)
+            with sqlite_session(disk):
+                disk.add(key, value)
+        return value
+
+    def stats(self):
+        """Hit/miss counters and tier sizes."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        with sqlite_session(self.disk) as disk:
+            disk_entries = len(disk) if disk is not None else 0
+            disk_bytes = disk.volume() if disk is not None else 0
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'disk_entries': disk_entries,
+            'disk_bytes': disk_bytes
+        }
+
+    def clear(self):
+        """Empty both tiers and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+        if self.disk is not None:
+            with sqlite_session(self.disk) as disk:
+                disk.clear()
+
+# Cache shared by every memoized metric function
+metrics_cache = MetricsCache()
+
+def _argument_key(value):
+    """Hashable description of one argument: the data version of a DataFrame, repr otherwise."""
+    if isinstance(value, pd.DataFrame):
+        return f"frame:{frame_digest(value)}"
+    return repr(value)
+
+def memoize(func=None, cache=None, context=None):
+    """Memoize a pure function of DataFrames and plain arguments in a MetricsCache.
+
+    The key combines the function's name, the package's code version (so
+    editing the function or anything it calls invalidates old results), the
+    data version of every DataFrame argument and the repr of the other
+    arguments. Cached DataFrames are returned as copies so callers can modify
+    them freely.
+
+    Args:
+        func (callable): Function to memoize
+        cache (MetricsCache): Cache to use, metrics_cache by default
+        context (callable): Returns global state the result depends on besides
+            the arguments (e.g. the selected backend), added to the key
+
+    The memoized function's cached(*args, **kwargs) returns the cached result of
+    a call, or MISSING if it hasn't been computed, without computing it.
+    """
+    if func is None:
+        return lambda f: memoize(f, cache, context)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    def call_key(args, kwargs):
+        parts = [f"{name}:{code_version()}"] + [_argument_key(arg) for arg in args]
+        if context is not None:
+            parts.append(f"context={context()!r}")
+        parts += [f"{key}={_argument_key(value)}" for key, value in sorted(kwargs.items())]
+        return hashlib.sha256("|".join(parts).encode('utf-8')).hexdigest()
+
+    def copied(result):
+        return result.copy() if isinstance(result, pd.DataFrame) else result
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = call_key(args, kwargs)
+        return copied((cache or metrics_cache).get_or_compute(key, lambda: func(*args, **kwargs)))
+
+    def cached(*args, **kwargs):
+        return copied((cache or metrics_cache).get(call_key(args, kwargs)))
+
+    wrapper.cached = cached
+    return wrapper
+
+def memoize_file(func):
+    """Memoize a parser of one file by the file's path, size and modification time.
+
+    A warm cache returns the parsed result without reading the file or importing
+    the parser's dependencies (e.g. bs4); editing the file or the parser
+    invalidates it (like memoize, the key includes the package's code version).
+    Missing files are passed through to the parser uncached.
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return func(file_path)
+        key = hashlib.sha256(f"{name}:{code_version()}|{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')).hexdigest()
+        return metrics_cache.get_or_compute(key, lambda: func(file_path))
+
+    return wrapper
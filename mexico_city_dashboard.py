@@ -15,17 +15,40 @@ This script generates a dashboard with 8 visualizations for a selected Mexican c
 """
 
 import os
+import argparse
+import hashlib
+import json
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from bs4 import BeautifulSoup
 import re
+# plotly.express, bs4 and the plotly.js bundle are imported inside the functions that
+# need them, so importing this module (CLI runs, export and report workers) doesn't
+# pay for them up front
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+import diskcache
+from dash import dcc, html, no_update, DiskcacheManager
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from mexico_city_data_compiler import (
+    CROSSWALK_FILE, CityPanel, PeriodAggregates, calculate_boxplot_stats, calculate_time_series_bands, current_backend,
+    frame_digest, polars_backend
+)
+from mexico_city_api import DataAPI
+from mexico_city_cache import MISSING, memoize, memoize_file, metrics_cache, sqlite_lock, sqlite_session
+from mexico_city_deflators import SHF_HOUSING, load_deflators
+from mexico_city_figure_tables import city_slug, parse_period
+from mexico_city_diagnostics import QUADRANTS, QUADRANT_COLORS, QuadrantCube
+from mexico_city_geography import GeographyCube, load_geography
+from mexico_city_payloads import compact_figure, enable_compression, measure_payloads
+from mexico_city_profiling import add_profile_arguments, configure_from_args, profiler
+from mexico_city_seasonal import SEASONAL_METRICS, adjust_panel
+from mexico_city_uncertainty import Bootstrap, error_bars
+from mexico_city_regression import Regression
+from mexico_city_similarity import PEERS, PeerIndex
+from mexico_city_forecast import FORECAST_CONFIDENCE, FORECAST_HORIZON, Forecasts
 
 # Define paths to data files
 employment_rate_file = "Employment rate by city.xls"
@@ -33,12 +56,20 @@ hourly_salary_file = "Mean hourly salary by city.xls"
 population_file = "Population by city.xls"
 housing_cost_file = "Indice SHF datos abiertos 4_trim_2024(Indice SHF datos abiertos).csv"
 
+# DuckDB file written by the compiler's --store; the default view, data API and
+# export query it instead of holding the tables in memory
+store_file = os.environ.get('MEXICO_CITY_STORE')
+store = None
+
 # Functions to read and clean data
+@memoize_file
 def read_excel_html_table(file_path):
     """Read HTML tables stored in .xls format and extract city data."""
     with open(file_path, 'r', encoding='latin-1') as f:
         content = f.read()
     
+    # bs4 is only needed when the parsed file isn't cached yet
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(content, 'html.parser')
     rows = soup.find_all('tr')
     
@@ -79,6 +110,7 @@ def read_excel_html_table(file_path):
     
     return city_data, time_points
 
+@memoize_file
 def read_housing_cost(file_path):
     """Read housing cost data from CSV file."""
     # Read CSV file with semicolon separator
@@ -111,29 +143,40 @@ def read_housing_cost(file_path):
     
     return result
 
-# Process data
-try:
-    print("Reading employment data...")
-    employment_data, time_points = read_excel_html_table(employment_rate_file)
-    print("Reading salary data...")
-    salary_data, _ = read_excel_html_table(hourly_salary_file)
-    print("Reading population data...")
-    population_data, _ = read_excel_html_table(population_file)
-    print("Reading housing cost data...")
-    housing_cost_data = read_housing_cost(housing_cost_file)
-except Exception as e:
-    print(f"Error reading data: {str(e)}")
-    # If we can't read the actual data, use sample data instead
-    from mexico_city_sample import generate_sample_data
-    city_data_df = generate_sample_data()
-    print("Using sample data instead.")
-    has_real_data = False
+# Process data (from the compiler's DuckDB store when one is configured)
+if store_file:
+    # duckdb is optional, so the store module is only imported when it is used
+    from mexico_city_duckdb import PanelStore
+    print(f"Using compiled data from {store_file}...")
+    store = PanelStore(store_file)
+    raw_data_read = False
 else:
-    has_real_data = True
+    try:
+        print("Reading employment data...")
+        employment_data, time_points = read_excel_html_table(employment_rate_file)
+        print("Reading salary data...")
+        salary_data, _ = read_excel_html_table(hourly_salary_file)
+        print("Reading population data...")
+        population_data, _ = read_excel_html_table(population_file)
+        print("Reading housing cost data...")
+        housing_cost_data = read_housing_cost(housing_cost_file)
+    except Exception as e:
+        print(f"Error reading data: {str(e)}")
+        # If we can't read the actual data, use sample data instead
+        from mexico_city_sample import generate_sample_data
+        city_data_df = generate_sample_data()
+        print("Using sample data instead.")
+        raw_data_read = False
+    else:
+        raw_data_read = True
 
 # Compile data if real data is available
 def compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points):
     """Compile data into a single DataFrame."""
+    polars = polars_backend()
+    if polars is not None:
+        return polars.compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
+    
     # Get all city names
     all_cities = set(list(employment_data.keys()) + list(salary_data.keys()) + list(population_data.keys()))
     
@@ -188,14 +231,19 @@ def compile_data(employment_data, salary_data, population_data, housing_cost_dat
     
     return pd.DataFrame(result_data)
 
-if has_real_data:
+if raw_data_read:
     # Compile the data
     print("Compiling data...")
     city_data_df = compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
 
 # Calculate yearly averages and growth rates
+@memoize(context=current_backend)
 def calculate_growth_rates(data):
     """Calculate year-over-year growth rates."""
+    polars = polars_backend()
+    if polars is not None:
+        return polars.calculate_growth_rates(data)
+    
     # Group by city and year, taking the average for each year
     yearly_data = data.groupby(['city', 'year']).agg({
         'employment_rate': 'mean',
@@ -235,8 +283,13 @@ def calculate_growth_rates(data):
     return pd.DataFrame(yearly_growth)
 
 # Calculate Compound Annual Growth Rate (CAGR)
+@memoize(context=current_backend)
 def calculate_cagr(data, start_year, end_year):
     """Calculate CAGR for the specified time period."""
+    polars = polars_backend()
+    if polars is not None:
+        return polars.calculate_cagr(data, start_year, end_year, endpoints=True)
+    
     # Filter data for the specified time period
     yearly_data = data.groupby(['city', 'year']).agg({
         'population': 'mean',
@@ -279,38 +332,290 @@ def calculate_cagr(data, start_year, end_year):
     
     return pd.DataFrame(cagr_results)
 
-# Calculate growth rates and CAGR
-print("Calculating growth rates...")
-yearly_data_df = calculate_growth_rates(city_data_df)
-
 # Define time period for CAGR
 start_year = 2015
 end_year = 2020
-print(f"Calculating CAGR for {start_year}-{end_year}...")
-cagr_data_df = calculate_cagr(city_data_df, start_year, end_year)
+
+if store is None:
+    # Calculate growth rates and CAGR
+    print("Calculating growth rates...")
+    yearly_data_df = calculate_growth_rates(city_data_df)
+    
+    print(f"Calculating CAGR for {start_year}-{end_year}...")
+    cagr_data_df = calculate_cagr(city_data_df, start_year, end_year)
+    
+    # Boxplot statistics are computed once here instead of on every callback
+    population_growth_box_stats, population_growth_outliers = calculate_boxplot_stats(yearly_data_df, 'population_growth')
+    
+    # Cross-city p10/p25/p50/p75/p90 for every quarter of the time-series metrics
+    time_series_bands = calculate_time_series_bands(city_data_df)
+    
+    # Panels sorted by (city, period) so figures slice a city's rows instead of masking
+    city_panel = CityPanel(city_data_df, ['year', 'quarter'])
+    yearly_panel = CityPanel(yearly_data_df, ['year'])
+    cagr_panel = CityPanel(cagr_data_df, [])
+    
+    # Prefix sums per city, year and metric so any year window is served by array differences
+    period_aggregates = PeriodAggregates(city_data_df)
+    
+    # Version of the loaded data, part of the key of every memoized callback result
+    data_version = frame_digest(city_data_df)[:16]
+    
+    # Growth-diagnostic quadrant of every city for every CAGR window, as an int8 cube
+    quadrant_cube = QuadrantCube(period_aggregates)
+else:
+    # Nothing is read into memory at startup: the tables below query the store,
+    # and those it can't serve are built from its tables on first use
+    from mexico_city_duckdb import StoreAggregates, StoreGeography, StoreLoaded, StorePanel, StoreQuadrants
+    population_growth_box_stats, population_growth_outliers = store.boxplot_stats('yearly_growth', 'population_growth')
+    time_series_bands = store.bands()
+    city_panel = StorePanel(store, 'city_data')
+    yearly_panel = StorePanel(store, 'yearly_growth')
+    cagr_panel = StorePanel(store, 'cagr')
+    period_aggregates = StoreAggregates(store)
+    data_version = store.version
+    quadrant_cube = StoreQuadrants(store)
+
+# Metro zone and state of every city, and SHF's index at every level it is published
+city_geography_df, shf_levels, crosswalk = load_geography(period_aggregates.cities, CROSSWALK_FILE, housing_cost_file)
+
+if store is None:
+    # Every metric rolled up to each city's state and the nation, so figures compare by lookup
+    geography_cube = GeographyCube(city_data_df, city_geography_df, shf_levels, crosswalk)
+    
+    # Bootstrap confidence intervals of the CAGRs and cross-city medians, computed on first use
+    bootstrap = Bootstrap(city_data_df)
+    
+    # Growth-vs-wage regressions of every CAGR window and of the yearly panel, fitted on first use
+    growth_regression = Regression(city_data_df, yearly_data_df)
+    
+    # Nearest cities of every city by its standardized trajectories, and the medians of those peers
+    peer_index = PeerIndex(city_data_df)
+    
+    # Nowcasts and forecasts of every city's quarterly series, with intervals, computed on first use
+    panel_forecasts = Forecasts(city_data_df)
+else:
+    # Rollups written by the compiler (stores written before them get the cube built from the panel)
+    stored = store.tables()
+    if 'geography' in stored:
+        geography_cube = StoreGeography(store, city_geography_df, shf_levels, crosswalk)
+    else:
+        geography_cube = StoreLoaded(store, lambda data: GeographyCube(data, city_geography_df, shf_levels, crosswalk),
+                                     'city_data')
+    bootstrap = StoreLoaded(store, Bootstrap, 'city_data')
+    growth_regression = StoreLoaded(store, Regression, 'city_data', 'yearly_growth')
+    peer_index = StoreLoaded(store, PeerIndex, 'city_data')
+    # Stores written before forecasts were compiled don't have them
+    panel_forecasts = StorePanel(store, 'forecasts') if 'forecasts' in stored else StoreLoaded(store, Forecasts, 'city_data')
+
+# Local price series that can deflate wages besides the SHF housing index (skipped if missing)
+PRICE_FILES = {
+    "INPC (consumer prices)": "INPC by quarter.csv",
+    "Regional price level": "Regional price level by city.csv"
+}
+# Quarter set to 100 in every deflator (None keeps each index on its own scale)
+DEFLATOR_BASE_QUARTER = None
+
+if store is None:
+    deflators = load_deflators(city_data_df, PRICE_FILES, DEFLATOR_BASE_QUARTER)
+    deflator_names = deflators.names
+else:
+    # Built when another deflator or the seasonally adjusted view is first selected,
+    # so a price file that fails to read is only reported then
+    deflators = StoreLoaded(store, lambda data: load_deflators(data, PRICE_FILES, DEFLATOR_BASE_QUARTER), 'city_data')
+    deflator_names = [SHF_HOUSING] + [name for name, file_path in PRICE_FILES.items() if os.path.exists(file_path)]
+
+def seasonally_adjusted(data):
+    """Swap the seasonally adjusted series into the metric columns of a panel.
+    
+    The adjustment runs once per panel for all cities and metrics and is memoized
+    in the metrics cache; the '<metric>_qoq' columns keep the quarter-on-quarter growth of
+    the adjusted series.
+    """
+    adjusted = adjust_panel(data, SEASONAL_METRICS)
+    for metric in SEASONAL_METRICS:
+        if f'{metric}_sa' in adjusted.columns:
+            adjusted[metric] = adjusted[f'{metric}_sa']
+    return adjusted
+
+def default_tables(deflator, seasonal=False):
+    """Whether a deflator and adjustment are the default view, whose tables are built when the data loads."""
+    return deflator == SHF_HOUSING and DEFLATOR_BASE_QUARTER is None and not seasonal
+
+@lru_cache(maxsize=None)
+def deflated_tables(deflator, seasonal=False):
+    """Return the tables behind the figures for a deflator, raw or seasonally adjusted.
+    
+    The real wages of every deflator are precomputed by the DeflatorSet, so
+    switching deflators only rebuilds these derived tables, once per deflator
+    and adjustment: the panel and figure statistics are shared by every process
+    through the metrics cache (see build_deflated_panel), the cheap wrappers
+    around them are built in each process.
+    """
+    if default_tables(deflator, seasonal):
+        # Served by the store when one is configured
+        return {
+            'city_panel': city_panel,
+            'yearly_panel': yearly_panel,
+            'boxplot': (population_growth_box_stats, population_growth_outliers),
+            'bands': time_series_bands,
+            'aggregates': period_aggregates,
+            'quadrants': quadrant_cube,
+            'geography': geography_cube,
+            'uncertainty': bootstrap,
+            'regression': growth_regression,
+            'peers': peer_index,
+            'forecasts': panel_forecasts
+        }
+    built = build_deflated_panel(data_version, deflator, seasonal, DEFLATOR_BASE_QUARTER)
+    data, yearly_data = built['data'], built['yearly_data']
+    aggregates = PeriodAggregates(data)
+    return {
+        'city_panel': CityPanel(data, ['year', 'quarter']),
+        'yearly_panel': CityPanel(yearly_data, ['year']),
+        'boxplot': built['boxplot'],
+        'bands': built['bands'],
+        'aggregates': aggregates,
+        'quadrants': QuadrantCube(aggregates),
+        'geography': GeographyCube(data, city_geography_df, shf_levels, crosswalk),
+        'uncertainty': Bootstrap(data),
+        'regression': Regression(data, yearly_data),
+        'peers': PeerIndex(data),
+        'forecasts': Forecasts(data)
+    }
+
+def tables_built(deflator, seasonal=False):
+    """Whether deflated_tables is a lookup: the default view, or tables already built by any process."""
+    if default_tables(deflator, seasonal):
+        return True
+    return build_deflated_panel.cached(data_version, deflator, seasonal, DEFLATOR_BASE_QUARTER) is not MISSING
+
+def analyses_built(tables, section, year_range):
+    """Whether the analyses a tab draws (bootstrap intervals, regressions, peers, forecasts) are computed.
+    
+    Looks in the tables and the metrics cache without computing anything. The
+    peers are always needed, since every tab lists the most similar cities.
+    """
+    if not tables['peers'].built():
+        return False
+    if section == 'overview':
+        return tables['regression'].panel_built()
+    if section == 'cagr':
+        return tables['uncertainty'].cagr_built(*year_range) and tables['regression'].windows_built()
+    return tables['uncertainty'].median_bands_built() and tables['forecasts'].built()
+
+def build_analyses(tables, year_range):
+    """Compute every analysis the tabs draw for a period, which stores them in the metrics cache."""
+    tables['peers'].index()
+    tables['regression'].panel()
+    tables['regression'].windows()
+    tables['uncertainty'].cagr(*year_range)
+    tables['uncertainty'].median_bands('monthly_salary')
+    # Forecasts are computed on first access (stored ones need nothing)
+    if not tables['forecasts'].built():
+        tables['forecasts'].panel
+
+def prepared(ready, deflator, adjustment):
+    """Whether prepare_tables just built the tables of a deflator and adjustment (for any period)."""
+    return bool(ready) and ready[:2] == [deflator, adjustment]
+
+@memoize
+def build_deflated_panel(version, deflator, seasonal, base_quarter):
+    """Build the panel and figure statistics for another deflator or the seasonally adjusted panel.
+    
+    Memoized in the metrics cache by data version, deflator, adjustment and base
+    quarter (the arguments only key the cache; the panel is the loaded one), so
+    the tables built by a background job are shared with the web server and
+    every later job instead of being lost with the job's process. Only plain
+    tables are cached; deflated_tables wraps them.
+    
+    Returns:
+        dict: The panel ('data'), its yearly growth rates ('yearly_data'), the
+        population growth boxplot statistics ('boxplot') and the cross-city
+        quantile bands ('bands')
+    """
+    print(f"Building tables for deflator {deflator}{' (seasonally adjusted)' if seasonal else ''}...")
+    default_deflator = deflator == SHF_HOUSING and base_quarter is None
+    # The deflators hold the loaded panel (read from the store on first use)
+    data = deflators.city_data if default_deflator else deflators.panel(deflator)
+    if seasonal:
+        data = seasonally_adjusted(data)
+    yearly_data = calculate_growth_rates(data)
+    return {
+        'data': data,
+        'yearly_data': yearly_data,
+        'boxplot': calculate_boxplot_stats(yearly_data, 'population_growth'),
+        'bands': calculate_time_series_bands(data)
+    }
+
+def real_wage_label(deflator):
+    """Axis label for real wages computed against a deflator."""
+    if deflator == SHF_HOUSING:
+        return 'Real Wage (Monthly Salary / Housing Index)'
+    return f'Real Wage (Monthly Salary / {deflator})'
+
+def window_cagr_table(tables, start_year, end_year):
+    """CAGR of every city over a window, with its bootstrap intervals and the diagnostic quadrant of each wage measure."""
+    cagr = tables['aggregates'].cagr(start_year, end_year)
+    intervals = tables['uncertainty'].cagr(start_year, end_year)
+    quadrants = tables['quadrants'].frame(start_year, end_year)
+    return CityPanel(cagr.merge(intervals, on='city', how='left').merge(quadrants, on='city', how='left'), [])
+
+def filter_years(data, year_range):
+    """Keep the rows of a table whose year falls in year_range (all rows if None)."""
+    if year_range is None:
+        return data
+    return data[(data['year'] >= year_range[0]) & (data['year'] <= year_range[1])]
+
+def figure_template():
+    """Return a fresh copy of the default plotly template, for one Plotly Express figure.
+    
+    Plotly Express reads its template through plotly's lazily created child
+    objects, which isn't thread-safe: figures drawn at once by the threaded
+    server from the shared default template (what a template name resolves to)
+    fail with "Invalid value". A copy per figure is never shared.
+    """
+    import plotly.io as pio
+    return go.layout.Template(pio.templates[pio.templates.default])
 
 # Create visualization functions
-def plot_employment_vs_population(data, selected_city=None):
+def plot_employment_vs_population(panel, selected_city=None, year_range=None, aggregates=None):
     """Create a scatter plot of employment rate vs. population for all cities."""
-    # Group by city and calculate the latest data point
-    latest_data = data.groupby('city').apply(lambda x: x.sort_values('year').iloc[-1]).reset_index(drop=True)
+    import plotly.express as px
+    
+    if aggregates is None:
+        aggregates = period_aggregates
+    if year_range is None:
+        # Latest data point of each city, precomputed by the panel
+        latest_data = panel.latest
+        title = "Employment Rate vs. Population by City (Latest Year)"
+    else:
+        # Average over the selected years, from the prefix sums
+        latest_data = aggregates.window_means(*year_range)
+        latest_data['year'] = f"{year_range[0]}-{year_range[1]}"
+        title = f"Employment Rate vs. Population by City ({year_range[0]}-{year_range[1]} Average)"
     
     fig = px.scatter(
         latest_data,
         x='population',
         y='employment_rate',
         text='city',
-        title="Employment Rate vs. Population by City (Latest Year)",
+        title=title,
         labels={
             'population': 'Population',
             'employment_rate': 'Employment Rate (%)'
         },
-        hover_data=['year']
+        hover_data=['year'],
+        template=figure_template()
     )
     
     # Highlight selected city if provided
     if selected_city:
-        city_data = latest_data[latest_data['city'] == selected_city]
+        if year_range is None:
+            city_data = panel.latest_city(selected_city)
+        else:
+            i = aggregates.city_index.get(selected_city)
+            city_data = latest_data.iloc[0:0] if i is None else latest_data.iloc[i:i + 1]
         if not city_data.empty:
             fig.add_trace(go.Scatter(
                 x=city_data['population'],
@@ -325,29 +630,84 @@ def plot_employment_vs_population(data, selected_city=None):
     fig.update_layout(height=600)
     return fig
 
-def plot_population_growth_boxplot(data):
-    """Create boxplots of population growth by year."""
-    # Drop NaN values for population growth
-    filtered_data = data.dropna(subset=['population_growth'])
+def plot_population_growth_boxplot(data, stats=None, outliers=None, year_range=None):
+    """Create boxplots of population growth by year from precomputed statistics (data is only read without them)."""
+    if stats is None or outliers is None:
+        stats, outliers = calculate_boxplot_stats(data, 'population_growth')
+    stats = filter_years(stats, year_range)
+    outliers = filter_years(outliers, year_range)
     
-    fig = px.box(
-        filtered_data,
-        x='year',
-        y='population_growth',
+    fig = go.Figure()
+    
+    # A single box trace for all years, built from q1/median/q3/fences
+    fig.add_trace(go.Box(
+        x=stats['year'],
+        q1=stats['q1'],
+        median=stats['median'],
+        q3=stats['q3'],
+        lowerfence=stats['lowerfence'],
+        upperfence=stats['upperfence'],
+        name='Population Growth',
+        showlegend=False
+    ))
+    
+    # Points beyond the fences, as px.box would draw them
+    fig.add_trace(go.Scatter(
+        x=outliers['year'],
+        y=outliers['population_growth'],
+        mode='markers',
+        hovertext=outliers['city'],
+        marker=dict(color='#636efa'),
+        showlegend=False
+    ))
+    
+    fig.update_layout(
         title="Population Growth Boxplots by Year",
-        labels={
-            'year': 'Year',
-            'population_growth': 'Population Growth (%)'
-        }
+        xaxis_title='Year',
+        yaxis_title='Population Growth (%)',
+        height=600
     )
-    
-    fig.update_layout(height=600)
     return fig
 
-def plot_population_growth_vs_real_wages(data, selected_city=None):
-    """Create a scatter plot of population growth vs. real wages."""
+# Above this many points the all-years scatter switches to a single WebGL trace
+SCATTERGL_THRESHOLD = 1000
+
+def add_fit_line(fig, x, fit, name, trace=go.Scatter):
+    """Draw a fitted line (a dict with intercept and slope) across the range of x."""
+    if fit is None or x.empty or np.isnan(fit['slope']):
+        return
+    x_range = np.array([x.min(), x.max()])
+    fig.add_trace(trace(
+        x=x_range,
+        y=fit['intercept'] + fit['slope'] * x_range,
+        mode='lines',
+        line=dict(color='black', dash='dot'),
+        name=name
+    ))
+
+def panel_fit_name(fit):
+    """Legend entry of the two-way fixed-effects fit of figure 3."""
+    return f"City & year FE fit (slope {fit['slope']:.3g}, SE {fit['slope_se']:.2g})"
+
+def selected_panel_residuals(regression, city_data):
+    """The selected city's rows with their residual from the fixed-effects fit of population growth on real wages."""
+    residuals = regression.panel()['residuals'][['city', 'year', 'avg_real_wage_residual']]
+    return city_data.merge(residuals, on=['city', 'year'], how='left')
+
+def plot_population_growth_vs_real_wages(panel, selected_city=None, high_volume=None, year_range=None,
+                                         wage_label='Real Wages (Monthly Salary / Housing Index)', regression=None):
+    """Create a scatter plot of population growth vs. real wages, with the city and year fixed-effects fit."""
+    import plotly.express as px
+    if regression is None:
+        regression = growth_regression
+    
     # Drop NaN values
-    filtered_data = data.dropna(subset=['population_growth', 'avg_real_wage'])
+    filtered_data = filter_years(panel.frame, year_range).dropna(subset=['population_growth', 'avg_real_wage'])
+    
+    if high_volume is None:
+        high_volume = len(filtered_data) > SCATTERGL_THRESHOLD
+    if high_volume:
+        return plot_population_growth_vs_real_wages_gl(panel, selected_city, year_range, wage_label, regression)
     
     fig = px.scatter(
         filtered_data,
@@ -357,53 +717,153 @@ def plot_population_growth_vs_real_wages(data, selected_city=None):
         hover_data=['year'],
         title="Population Growth vs. Real Wages",
         labels={
-            'avg_real_wage': 'Real Wages (Monthly Salary / Housing Index)',
+            'avg_real_wage': wage_label,
             'population_growth': 'Population Growth (%)'
-        }
+        },
+        template=figure_template()
     )
     
-    # Highlight selected city if provided
+    fit = regression.panel_fit('avg_real_wage')
+    if fit is not None:
+        add_fit_line(fig, filtered_data['avg_real_wage'], fit, panel_fit_name(fit))
+    
+    # Highlight selected city if provided, with its residuals from the fit
     if selected_city:
-        city_data = filtered_data[filtered_data['city'] == selected_city]
+        city_data = filter_years(panel.city(selected_city), year_range).dropna(subset=['population_growth', 'avg_real_wage'])
         if not city_data.empty:
+            city_data = selected_panel_residuals(regression, city_data)
             fig.add_trace(go.Scatter(
                 x=city_data['avg_real_wage'],
                 y=city_data['population_growth'],
                 mode='markers',
                 marker=dict(color='red', size=15, line=dict(width=2, color='black')),
+                customdata=city_data[['year', 'avg_real_wage_residual']],
+                hovertemplate="%{customdata[0]}<br>Real wage: %{x}<br>Population growth: %{y}%"
+                              "<br>Residual: %{customdata[1]:+.2f} pp<extra>" + selected_city + "</extra>",
                 name=selected_city
             ))
     
     fig.update_layout(height=600)
     return fig
 
-def plot_cagr_real_wages_vs_population(data, selected_city=None):
-    """Create a scatter plot of real wage CAGR vs. population CAGR."""
+def plot_population_growth_vs_real_wages_gl(panel, selected_city=None, year_range=None,
+                                            wage_label='Real Wages (Monthly Salary / Housing Index)', regression=None):
+    """WebGL version of the population growth vs. real wages scatter for large panels.
+    
+    All cities share one Scattergl trace colored by a city code array, and city
+    names only appear on hover, so the figure size grows with the number of
+    points rather than with the number of traces and labels.
+    """
+    filtered_data = filter_years(panel.frame, year_range).dropna(subset=['population_growth', 'avg_real_wage'])
+    city_codes, city_names = pd.factorize(filtered_data['city'], sort=True)
+    from plotly.colors import qualitative
+    palette = qualitative.Plotly
+    colorscale = [[i / (len(palette) - 1), color] for i, color in enumerate(palette)]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=filtered_data['avg_real_wage'],
+        y=filtered_data['population_growth'],
+        mode='markers',
+        marker=dict(color=city_codes % len(palette), colorscale=colorscale, cmin=0, cmax=len(palette) - 1, size=6),
+        hovertext=filtered_data['city'],
+        customdata=filtered_data['year'],
+        hovertemplate="%{hovertext}<br>Year: %{customdata}<br>Real wage: %{x}<br>Population growth: %{y}%<extra></extra>",
+        showlegend=False
+    ))
+    
+    if regression is None:
+        regression = growth_regression
+    fit = regression.panel_fit('avg_real_wage')
+    if fit is not None:
+        add_fit_line(fig, filtered_data['avg_real_wage'], fit, panel_fit_name(fit), go.Scattergl)
+    
+    # Highlight selected city, the only points with a visible label
+    if selected_city:
+        city_data = filter_years(panel.city(selected_city), year_range).dropna(subset=['population_growth', 'avg_real_wage'])
+        if not city_data.empty:
+            city_data = selected_panel_residuals(regression, city_data)
+            fig.add_trace(go.Scattergl(
+                x=city_data['avg_real_wage'],
+                y=city_data['population_growth'],
+                mode='markers+text',
+                text=city_data['year'],
+                textposition='top center',
+                marker=dict(color='red', size=15, line=dict(width=2, color='black')),
+                customdata=city_data['avg_real_wage_residual'],
+                hovertemplate="%{text}<br>Real wage: %{x}<br>Population growth: %{y}%"
+                              "<br>Residual: %{customdata:+.2f} pp<extra>" + selected_city + "</extra>",
+                name=selected_city
+            ))
+    
+    fig.update_layout(
+        title="Population Growth vs. Real Wages",
+        xaxis_title=wage_label,
+        yaxis_title='Population Growth (%)',
+        height=600
+    )
+    return fig
+
+def plot_cagr_real_wages_vs_population(panel, selected_city=None, start_year=start_year, end_year=end_year,
+                                        quadrants=None, regression=None):
+    """Create a scatter plot of real wage CAGR vs. population CAGR, colored by diagnostic quadrant, with the cross-city fit."""
+    import plotly.express as px
+    if regression is None:
+        regression = growth_regression
+    
     # Drop NaN values
-    filtered_data = data.dropna(subset=['real_wage_cagr', 'population_cagr'])
+    filtered_data = panel.frame.dropna(subset=['real_wage_cagr', 'population_cagr'])
+    
+    # Keep the cities of the selected quadrants
+    color = 'real_wage_quadrant' if 'real_wage_quadrant' in filtered_data.columns else None
+    if color and quadrants is not None:
+        filtered_data = filtered_data[filtered_data[color].isin(quadrants)]
+    
+    # Bootstrap confidence intervals of both CAGRs as error bars
+    errors = {}
+    if 'real_wage_cagr_low' in filtered_data.columns:
+        filtered_data = error_bars(filtered_data, ['population_cagr', 'real_wage_cagr'])
+        errors = dict(error_x='population_cagr_plus', error_x_minus='population_cagr_minus',
+                      error_y='real_wage_cagr_plus', error_y_minus='real_wage_cagr_minus')
     
     fig = px.scatter(
         filtered_data,
         x='population_cagr',
         y='real_wage_cagr',
         text='city',
+        color=color,
+        color_discrete_map=QUADRANT_COLORS,
+        category_orders={color: list(QUADRANTS.values())} if color else None,
         title=f"CAGR of Real Wages vs. Population Growth ({start_year}-{end_year})",
         labels={
             'population_cagr': 'Population CAGR (%)',
-            'real_wage_cagr': 'Real Wage CAGR (%)'
-        }
+            'real_wage_cagr': 'Real Wage CAGR (%)',
+            'real_wage_quadrant': 'Quadrant'
+        },
+        template=figure_template(),
+        **errors
     )
     
-    # Highlight selected city if provided
+    # OLS fit across all cities of the window, not only the selected quadrants
+    fit = regression.fit(start_year, end_year, 'real_wage')
+    if fit is not None:
+        add_fit_line(fig, filtered_data['population_cagr'], fit,
+                     f"OLS fit (slope {fit['slope']:.2f}, SE {fit['slope_se']:.2f}, R² {fit['r2']:.2f})")
+    
+    # Highlight selected city if provided, with its residual from the fit
     if selected_city:
-        city_data = filtered_data[filtered_data['city'] == selected_city]
+        city_data = panel.city(selected_city).dropna(subset=['real_wage_cagr', 'population_cagr'])
+        if color and quadrants is not None:
+            city_data = city_data[city_data[color].isin(quadrants)]
         if not city_data.empty:
+            residuals = regression.residuals(start_year, end_year).set_index('city')['real_wage_residual']
+            residual = residuals.get(selected_city, np.nan)
             fig.add_trace(go.Scatter(
                 x=city_data['population_cagr'],
                 y=city_data['real_wage_cagr'],
                 mode='markers',
                 marker=dict(color='red', size=15, line=dict(width=2, color='black')),
-                name=selected_city
+                name=selected_city if np.isnan(residual) else f"{selected_city} (residual {residual:+.2f} pp)"
             ))
     
     # Add a horizontal line at y=0
@@ -416,33 +876,66 @@ def plot_cagr_real_wages_vs_population(data, selected_city=None):
     fig.update_layout(height=600)
     return fig
 
-def plot_cagr_nominal_wages_vs_population(data, selected_city=None):
-    """Create a scatter plot of nominal wage CAGR vs. population CAGR."""
+def plot_cagr_nominal_wages_vs_population(panel, selected_city=None, start_year=start_year, end_year=end_year,
+                                        quadrants=None, regression=None):
+    """Create a scatter plot of nominal wage CAGR vs. population CAGR, colored by diagnostic quadrant, with the cross-city fit."""
+    import plotly.express as px
+    if regression is None:
+        regression = growth_regression
+    
     # Drop NaN values
-    filtered_data = data.dropna(subset=['nominal_wage_cagr', 'population_cagr'])
+    filtered_data = panel.frame.dropna(subset=['nominal_wage_cagr', 'population_cagr'])
+    
+    # Keep the cities of the selected quadrants
+    color = 'nominal_wage_quadrant' if 'nominal_wage_quadrant' in filtered_data.columns else None
+    if color and quadrants is not None:
+        filtered_data = filtered_data[filtered_data[color].isin(quadrants)]
+    
+    # Bootstrap confidence intervals of both CAGRs as error bars
+    errors = {}
+    if 'nominal_wage_cagr_low' in filtered_data.columns:
+        filtered_data = error_bars(filtered_data, ['population_cagr', 'nominal_wage_cagr'])
+        errors = dict(error_x='population_cagr_plus', error_x_minus='population_cagr_minus',
+                      error_y='nominal_wage_cagr_plus', error_y_minus='nominal_wage_cagr_minus')
     
     fig = px.scatter(
         filtered_data,
         x='population_cagr',
         y='nominal_wage_cagr',
         text='city',
+        color=color,
+        color_discrete_map=QUADRANT_COLORS,
+        category_orders={color: list(QUADRANTS.values())} if color else None,
         title=f"CAGR of Nominal Wages vs. Population Growth ({start_year}-{end_year})",
         labels={
             'population_cagr': 'Population CAGR (%)',
-            'nominal_wage_cagr': 'Nominal Wage CAGR (%)'
-        }
+            'nominal_wage_cagr': 'Nominal Wage CAGR (%)',
+            'nominal_wage_quadrant': 'Quadrant'
+        },
+        template=figure_template(),
+        **errors
     )
     
-    # Highlight selected city if provided
+    # OLS fit across all cities of the window, not only the selected quadrants
+    fit = regression.fit(start_year, end_year, 'monthly_salary')
+    if fit is not None:
+        add_fit_line(fig, filtered_data['population_cagr'], fit,
+                     f"OLS fit (slope {fit['slope']:.2f}, SE {fit['slope_se']:.2f}, R² {fit['r2']:.2f})")
+    
+    # Highlight selected city if provided, with its residual from the fit
     if selected_city:
-        city_data = filtered_data[filtered_data['city'] == selected_city]
+        city_data = panel.city(selected_city).dropna(subset=['nominal_wage_cagr', 'population_cagr'])
+        if color and quadrants is not None:
+            city_data = city_data[city_data[color].isin(quadrants)]
         if not city_data.empty:
+            residuals = regression.residuals(start_year, end_year).set_index('city')['nominal_wage_residual']
+            residual = residuals.get(selected_city, np.nan)
             fig.add_trace(go.Scatter(
                 x=city_data['population_cagr'],
                 y=city_data['nominal_wage_cagr'],
                 mode='markers',
                 marker=dict(color='red', size=15, line=dict(width=2, color='black')),
-                name=selected_city
+                name=selected_city if np.isnan(residual) else f"{selected_city} (residual {residual:+.2f} pp)"
             ))
     
     # Add a horizontal line at y=0
@@ -455,86 +948,260 @@ def plot_cagr_nominal_wages_vs_population(data, selected_city=None):
     fig.update_layout(height=600)
     return fig
 
-def plot_nominal_wages_over_time(data, selected_city):
-    """Create a line graph of nominal wages over time."""
-    # Filter data for the selected city
-    city_data = data[data['city'] == selected_city]
+def plot_time_series(panel, selected_city, value_col, value_label, title, bands=None, year_range=None,
+                     geography=None, uncertainty=None, benchmark=None, forecast=None):
+    """Create a quarterly line graph of a city against the distribution of all cities, its state and the nation.
     
-    # Group by year to get yearly averages
-    yearly_data = city_data.groupby('year').agg({
-        'monthly_salary': 'mean'
-    }).reset_index()
+    The bootstrap confidence interval of the cross-city median is drawn around it,
+    unless a benchmark (the median of the city's peers) replaces that median. When
+    the years run to the end of the panel, the city's line continues with its
+    forecast and prediction interval.
+    """
+    if bands is None:
+        bands = time_series_bands[value_col]
+    if geography is None:
+        geography = geography_cube
+    if uncertainty is None:
+        uncertainty = bootstrap
+    if forecast is None:
+        forecast = panel_forecasts
+    show_forecast = year_range is None or year_range[1] >= bands['year'].max()
+    bands = filter_years(bands, year_range)
     
-    fig = px.line(
-        yearly_data,
-        x='year',
-        y='monthly_salary',
-        title=f"Nominal Wages Over Time for {selected_city}",
-        labels={
-            'year': 'Year',
-            'monthly_salary': 'Monthly Nominal Salary'
-        },
-        markers=True
-    )
+    # Rows of the selected city, already in time order
+    city_data = filter_years(panel.city(selected_city), year_range)
     
-    fig.update_layout(height=500)
-    return fig
-
-def plot_real_wages_over_time(data, selected_city):
-    """Create a line graph of real wages over time."""
-    # Filter data for the selected city
-    city_data = data[data['city'] == selected_city]
+    fig = go.Figure()
     
-    # Group by year to get yearly averages
-    yearly_data = city_data.groupby('year').agg({
-        'real_wage': 'mean'
-    }).reset_index()
+    # Shaded p10-p90 and p25-p75 bands across all cities
+    for lower, upper, opacity in [('p10', 'p90', 0.15), ('p25', 'p75', 0.3)]:
+        fig.add_trace(go.Scatter(
+            x=bands['time_point'],
+            y=bands[upper],
+            mode='lines',
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=bands['time_point'],
+            y=bands[lower],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor=f'rgba(128, 128, 128, {opacity})',
+            name=f'All Cities ({lower}-{upper})',
+            hoverinfo='skip'
+        ))
     
-    fig = px.line(
-        yearly_data,
-        x='year',
-        y='real_wage',
-        title=f"Real Wages Over Time for {selected_city}",
-        labels={
-            'year': 'Year',
-            'real_wage': 'Real Wage (Monthly Salary / Housing Index)'
-        },
-        markers=True
-    )
+    if benchmark is not None:
+        benchmark = filter_years(benchmark, year_range)
+        fig.add_trace(go.Scatter(
+            x=benchmark['time_point'],
+            y=benchmark['p50'],
+            mode='lines',
+            name='Median of Similar Cities',
+            line=dict(color='purple')
+        ))
+    else:
+        fig.add_trace(go.Scatter(
+            x=bands['time_point'],
+            y=bands['p50'],
+            mode='lines',
+            name='Median of All Cities',
+            line=dict(color='gray')
+        ))
+    
+    if uncertainty is not None and benchmark is None:
+        median_ci = filter_years(uncertainty.median_bands(value_col), year_range)
+        fig.add_trace(go.Scatter(
+            x=median_ci['time_point'],
+            y=median_ci['p50_high'],
+            mode='lines',
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False
+        ))
+        fig.add_trace(go.Scatter(
+            x=median_ci['time_point'],
+            y=median_ci['p50_low'],
+            mode='lines',
+            line=dict(width=0),
+            fill='tonexty',
+            fillcolor='rgba(31, 119, 180, 0.25)',
+            name=f'Median {uncertainty.confidence:.0%} CI (bootstrap)',
+            hoverinfo='skip'
+        ))
+    
+    # The city's state and the nation, averaged over their cities weighted by population
+    for level, dash in [('state', 'dash'), ('national', 'dot')]:
+        name = geography.parent('metro', selected_city, level)
+        reference = geography.series(level, name, value_col) if name is not None else None
+        if reference is None:
+            continue
+        reference = filter_years(reference, year_range)
+        fig.add_trace(go.Scatter(
+            x=reference['time_point'],
+            y=reference[value_col],
+            mode='lines',
+            name=f"{name} ({level}, population-weighted)",
+            line=dict(color='black', dash=dash)
+        ))
+    
+    # Seasonally adjusted panels carry the quarter-on-quarter growth of each series
+    qoq_col = f'{value_col}_qoq'
+    hover = {}
+    if qoq_col in city_data.columns:
+        hover = dict(
+            customdata=city_data[qoq_col],
+            hovertemplate='%{x}<br>%{y:,.2f}<br>QoQ growth: %{customdata:.2f}%<extra>' + selected_city + '</extra>'
+        )
     
-    fig.update_layout(height=500)
+    fig.add_trace(go.Scatter(
+        x=city_data['time_point'],
+        y=city_data[value_col],
+        mode='lines+markers',
+        name=selected_city,
+        line=dict(color='red'),
+        **hover
+    ))
+    
+    # Forecast segment, joined to the city's last observation
+    time_points = list(bands['time_point'])
+    predicted = forecast.city(selected_city) if show_forecast else None
+    if predicted is not None and value_col in predicted.columns:
+        predicted = predicted.dropna(subset=[value_col])
+        observed = city_data.dropna(subset=[value_col]).tail(1)
+        if len(predicted):
+            fig.add_trace(go.Scatter(
+                x=predicted['time_point'],
+                y=predicted[f'{value_col}_high'],
+                mode='lines',
+                line=dict(width=0),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+            fig.add_trace(go.Scatter(
+                x=predicted['time_point'],
+                y=predicted[f'{value_col}_low'],
+                mode='lines',
+                line=dict(width=0),
+                fill='tonexty',
+                fillcolor='rgba(255, 0, 0, 0.15)',
+                name=f"{getattr(forecast, 'confidence', FORECAST_CONFIDENCE):.0%} forecast interval",
+                hoverinfo='skip'
+            ))
+            fig.add_trace(go.Scatter(
+                x=pd.concat([observed['time_point'], predicted['time_point']]),
+                y=pd.concat([observed[value_col], predicted[value_col]]),
+                mode='lines',
+                name='Forecast',
+                line=dict(color='red', dash='dash')
+            ))
+            time_points += [point for point in predicted['time_point'] if point not in set(time_points)]
+    
+    fig.update_layout(
+        title=title,
+        xaxis_title='Time Period',
+        yaxis_title=value_label,
+        xaxis=dict(tickmode='array', tickvals=time_points[::4], tickangle=45),
+        height=500
+    )
     return fig
 
-def plot_housing_costs_over_time(data, selected_city):
+def plot_nominal_wages_over_time(panel, selected_city, year_range=None, bands=None, geography=None, uncertainty=None,
+                                 benchmark=None, forecast=None):
+    """Create a line graph of nominal wages over time."""
+    return plot_time_series(panel, selected_city, 'monthly_salary', 'Monthly Nominal Salary',
+                            f"Nominal Wages Over Time for {selected_city}", bands, year_range, geography, uncertainty,
+                            benchmark, forecast)
+
+def plot_real_wages_over_time(panel, selected_city, year_range=None, bands=None,
+                              wage_label='Real Wage (Monthly Salary / Housing Index)', geography=None,
+                              uncertainty=None, benchmark=None, forecast=None):
+    """Create a line graph of real wages over time."""
+    return plot_time_series(panel, selected_city, 'real_wage', wage_label,
+                            f"Real Wages Over Time for {selected_city}", bands, year_range, geography, uncertainty,
+                            benchmark, forecast)
+
+def plot_housing_costs_over_time(panel, selected_city, year_range=None, bands=None, geography=None, uncertainty=None,
+                                 benchmark=None, forecast=None):
     """Create a line graph of housing costs over time."""
-    # Filter data for the selected city
-    city_data = data[data['city'] == selected_city]
+    return plot_time_series(panel, selected_city, 'housing_index', 'Housing Cost Index',
+                            f"Housing Cost Index Over Time for {selected_city}", bands, year_range, geography,
+                            uncertainty, benchmark, forecast)
+
+# Create a dash app
+# Background callbacks run outside the web worker, with results memoized on disk
+# by (data version, callback arguments); no Redis or Celery needed
+CALLBACK_CACHE_DIR = os.path.join("cache", "callbacks")
+CALLBACK_CACHE_EXPIRE = 24 * 60 * 60
+
+class ForkSafeDiskcacheManager(DiskcacheManager):
+    """DiskcacheManager that never forks a background job while this process uses SQLite.
     
-    # Group by year to get yearly averages
-    yearly_data = city_data.groupby('year').agg({
-        'housing_index': 'mean'
-    }).reset_index()
+    Jobs are forked from a threaded web server whose other threads keep polling
+    the callback cache; a fork in the middle of one of those queries leaves the
+    job deadlocked on SQLite's mutexes, and a job that inherits an open
+    connection corrupts the store when it closes it. Every access to the store
+    goes through mexico_city_cache.sqlite_session, which closes its connection
+    afterwards, and every fork holds the same lock.
+    """
     
-    fig = px.line(
-        yearly_data,
-        x='year',
-        y='housing_index',
-        title=f"Housing Cost Index Over Time for {selected_city}",
-        labels={
-            'year': 'Year',
-            'housing_index': 'Housing Cost Index'
-        },
-        markers=True
-    )
+    def __init__(self, cache, *args, **kwargs):
+        super().__init__(cache, *args, **kwargs)
+        # Opening the store connected this thread
+        with sqlite_session(cache):
+            pass
     
-    fig.update_layout(height=500)
-    return fig
+    def call_job_fn(self, key, job_fn, args, context):
+        with sqlite_lock:
+            # Jobs started at once would all create the metrics cache's store, so it is
+            # created before the first fork
+            metrics_cache.disk
+            return super().call_job_fn(key, job_fn, args, context)
+    
+    def terminate_job(self, job):
+        with sqlite_session(self.handle):
+            return super().terminate_job(job)
+    
+    def get_progress(self, key):
+        with sqlite_session(self.handle):
+            return super().get_progress(key)
+    
+    def get_result(self, key, job):
+        with sqlite_session(self.handle):
+            return super().get_result(key, job)
+    
+    def result_ready(self, key):
+        with sqlite_session(self.handle):
+            return super().result_ready(key)
+    
+    def clear_cache_entry(self, key):
+        with sqlite_session(self.handle):
+            return super().clear_cache_entry(key)
 
-# Create a dash app
-app = dash.Dash(__name__, title="Mexico City Growth Dashboard")
+background_manager = ForkSafeDiskcacheManager(
+    diskcache.Cache(CALLBACK_CACHE_DIR),
+    cache_by=[lambda: data_version],
+    expire=CALLBACK_CACHE_EXPIRE
+)
+
+app = dash.Dash(__name__, title="Mexico City Growth Dashboard", background_callback_manager=background_manager)
+
+# Progress steps reported by prepare_tables: the derived tables, then the analyses
+TABLE_STEPS = 2
+
+# Compress callback, layout and asset responses
+enable_compression(app.server)
+
+# Read-only JSON/CSV endpoints over the compiled tables, pre-serialized for this data version
+# (queried from the store when one is configured, serialized on first request)
+data_api = DataAPI({'panel': city_panel, 'yearly': yearly_panel, 'cagr': cagr_panel}, period_aggregates,
+                   version=data_version, preload=store is None).register(app.server)
 
 # Get list of cities
-cities = sorted(city_data_df['city'].unique())
+cities = period_aggregates.cities
 default_city = cities[0] if cities else "Ciudad de México"
 
 # Create app layout
@@ -551,50 +1218,120 @@ app.layout = html.Div([
     ], style={'width': '30%', 'margin': '20px auto'}),
     
     html.Div([
-        html.H2("Overview - All Cities", style={'textAlign': 'center'}),
-        
-        html.Div([
-            html.H3("1. Employment Rate vs. Population by City"),
-            dcc.Graph(id='employment-vs-population')
-        ]),
-        
-        html.Div([
-            html.H3("2. Population Growth Boxplots by Year"),
-            dcc.Graph(id='population-growth-boxplot')
-        ]),
-        
-        html.Div([
-            html.H3("3. Population Growth vs. Real Wages"),
-            dcc.Graph(id='population-growth-vs-real-wages')
-        ]),
-        
-        html.H2("CAGR Analysis", style={'textAlign': 'center'}),
-        
-        html.Div([
-            html.H3(f"4. CAGR of Real Wages vs. Population Growth ({start_year}-{end_year})"),
-            dcc.Graph(id='cagr-real-wages-vs-population')
-        ]),
-        
-        html.Div([
-            html.H3(f"5. CAGR of Nominal Wages vs. Population Growth ({start_year}-{end_year})"),
-            dcc.Graph(id='cagr-nominal-wages-vs-population')
-        ]),
-        
-        html.H2("Time Series for Selected City", style={'textAlign': 'center'}),
-        
-        html.Div([
-            html.H3("6. Nominal Wages Over Time"),
-            dcc.Graph(id='nominal-wages-over-time')
+        html.Label("Deflate Wages By:"),
+        dcc.Dropdown(
+            id='deflator-dropdown',
+            options=[{'label': name, 'value': name} for name in deflator_names],
+            value=SHF_HOUSING,
+            clearable=False
+        )
+    ], style={'width': '30%', 'margin': '20px auto'}),
+    
+    html.Div([
+        html.Label("Select Period:"),
+        dcc.RangeSlider(
+            id='year-range',
+            min=int(period_aggregates.years.min()),
+            max=int(period_aggregates.years.max()),
+            step=1,
+            value=[start_year, end_year],
+            marks={int(year): str(year) for year in period_aggregates.years},
+            allowCross=False
+        )
+    ], style={'width': '60%', 'margin': '20px auto'}),
+    
+    html.Div([
+        dcc.RadioItems(
+            id='seasonal-adjustment',
+            options=[
+                {'label': 'Raw quarterly data', 'value': 'raw'},
+                {'label': 'Seasonally adjusted', 'value': 'adjusted'}
+            ],
+            value='raw',
+            inline=True
+        )
+    ], style={'width': '60%', 'margin': '20px auto', 'textAlign': 'center'}),
+    
+    html.Div([
+        html.H4("Similar Cities"),
+        html.Div(id='similar-cities'),
+        dcc.RadioItems(
+            id='benchmark',
+            options=[
+                {'label': 'Compare with all cities', 'value': 'all'},
+                {'label': f'Compare with the {min(PEERS, len(cities) - 1)} most similar cities', 'value': 'peers'}
+            ],
+            value='all',
+            inline=True
+        )
+    ], style={'width': '60%', 'margin': '20px auto', 'textAlign': 'center'}),
+    
+    html.Div([
+        html.Progress(id='figure-progress', value='0', max=str(TABLE_STEPS))
+    ], id='figure-progress-container', style={'width': '30%', 'margin': '10px auto', 'visibility': 'hidden'}),
+    
+    # Tabs are rendered lazily: only the figures of the visible tab are computed
+    dcc.Store(id='rendered-sections', data={}),
+    
+    # Deflator and adjustment whose tables are requested from, and were built by, prepare_tables
+    dcc.Store(id='tables-request'),
+    dcc.Store(id='tables-ready'),
+    dcc.Tabs(id='section-tabs', value='overview', children=[
+        dcc.Tab(label="Overview - All Cities", value='overview', children=[
+            html.Div([
+                html.H3("1. Employment Rate vs. Population by City"),
+                dcc.Graph(id='employment-vs-population')
+            ]),
+            
+            html.Div([
+                html.H3("2. Population Growth Boxplots by Year"),
+                dcc.Graph(id='population-growth-boxplot')
+            ]),
+            
+            html.Div([
+                html.H3("3. Population Growth vs. Real Wages"),
+                dcc.Graph(id='population-growth-vs-real-wages')
+            ])
         ]),
         
-        html.Div([
-            html.H3("7. Real Wages Over Time"),
-            dcc.Graph(id='real-wages-over-time')
+        dcc.Tab(label="CAGR Analysis", value='cagr', children=[
+            html.Div([
+                html.H3("4. CAGR of Real Wages vs. Population Growth"),
+                dcc.Graph(id='cagr-real-wages-vs-population')
+            ]),
+            
+            html.Div([
+                html.H3("5. CAGR of Nominal Wages vs. Population Growth"),
+                dcc.Graph(id='cagr-nominal-wages-vs-population')
+            ]),
+            
+            html.Div([
+                html.Label("Show Quadrants:"),
+                dcc.Checklist(
+                    id='quadrant-filter',
+                    options=[{'label': name, 'value': name} for name in QUADRANTS.values()],
+                    value=list(QUADRANTS.values()),
+                    inline=True
+                ),
+                html.Div(id='quadrant-counts')
+            ], style={'margin': '20px'})
         ]),
         
-        html.Div([
-            html.H3("8. Housing Costs Over Time"),
-            dcc.Graph(id='housing-costs-over-time')
+        dcc.Tab(label="Time Series for Selected City", value='time-series', children=[
+            html.Div([
+                html.H3("6. Nominal Wages Over Time"),
+                dcc.Graph(id='nominal-wages-over-time')
+            ]),
+            
+            html.Div([
+                html.H3("7. Real Wages Over Time"),
+                dcc.Graph(id='real-wages-over-time')
+            ]),
+            
+            html.Div([
+                html.H3("8. Housing Costs Over Time"),
+                dcc.Graph(id='housing-costs-over-time')
+            ])
         ])
     ]),
     
@@ -602,52 +1339,382 @@ app.layout = html.Div([
         html.H4("Notes:"),
         html.Ul([
             html.Li("Monthly nominal salary is calculated as hourly salary × 160 hours."),
-            html.Li("Real wages are calculated as monthly salary divided by the housing cost index."),
-            html.Li(f"CAGR values are calculated for the period {start_year}-{end_year}.")
+            html.Li("Real wages are calculated as monthly salary divided by the selected deflator (the SHF housing cost index by default)."),
+            html.Li("CAGR values and all charts cover the period selected with the year slider."),
+            html.Li("CAGR charts are colored by growth-diagnostic quadrant: the signs of population and wage growth over the period."),
+            html.Li("Shaded bands in the time series show the 10th-90th and 25th-75th percentiles across all cities."),
+            html.Li("Similar cities are the nearest by their yearly population, wage, real-wage, housing and employment trajectories, each standardized across cities; their median can replace the median of all cities in the time series."),
+            html.Li(f"Dashed red lines continue each city's series with Holt-Winters exponential smoothing forecasts {FORECAST_HORIZON} quarters past the panel (and nowcasts of quarters it has not reported yet), with their {FORECAST_CONFIDENCE:.0%} prediction intervals; they are shown when the years run to the end of the panel."),
+            html.Li("Seasonally adjusted series use a classical multiplicative decomposition; hovering a city's series shows its quarter-on-quarter growth.")
         ])
     ], style={'margin': '40px 20px'})
 ])
 
 # Define callbacks
+# Figures of each dashboard tab, in the order of the callback outputs
+SECTION_FIGURES = {
+    'overview': ['employment-vs-population', 'population-growth-boxplot', 'population-growth-vs-real-wages'],
+    'cagr': ['cagr-real-wages-vs-population', 'cagr-nominal-wages-vs-population'],
+    'time-series': ['nominal-wages-over-time', 'real-wages-over-time', 'housing-costs-over-time']
+}
+FIGURE_IDS = [figure_id for figures in SECTION_FIGURES.values() for figure_id in figures]
+
+@app.callback(
+    [Output(figure_id, 'figure') for figure_id in FIGURE_IDS] + [Output('rendered-sections', 'data'),
+                                                                 Output('tables-request', 'data')],
+    [Input('section-tabs', 'value'),
+     Input('city-dropdown', 'value'),
+     Input('year-range', 'value'),
+     Input('deflator-dropdown', 'value'),
+     Input('seasonal-adjustment', 'value'),
+     Input('quadrant-filter', 'value'),
+     Input('benchmark', 'value'),
+     Input('tables-ready', 'data')],
+    [State('rendered-sections', 'data'),
+     State('tables-request', 'data')]
+)
+def update_graphs(section, selected_city, year_range, deflator=SHF_HOUSING, adjustment='raw', quadrants=None,
+                  benchmark='all', ready=None, rendered=None, requested=None):
+    """Update the graphs of the visible tab based on the selected city, period, deflator, seasonal adjustment,
+    quadrants and benchmark.
+    
+    Hidden tabs are left alone, and a tab whose figures were already rendered for
+    the current selection is not recomputed when the user comes back to it.
+    Figures are drawn here from built tables and analyses, which is fast; when
+    the selection needs tables or analyses no process has built yet (including
+    the default view's bootstrap intervals, regressions, peers and forecasts),
+    they are requested from prepare_tables instead, which fires this callback
+    again once they are in the metrics cache.
+    """
+    # Only the CAGR tab depends on the quadrant filter, and only the time series on the benchmark
+    params = [selected_city, year_range, deflator, adjustment, quadrants if section == 'cagr' else None,
+              benchmark if section == 'time-series' else None]
+    rendered = rendered or {}
+    if rendered.get(section) == params:
+        raise PreventUpdate
+    
+    # Tables just prepared but already evicted from the cache are built here rather than requested again
+    seasonal = adjustment == 'adjusted'
+    request = [deflator, adjustment, year_range]
+    if ready != request and not (tables_built(deflator, seasonal)
+                                 and analyses_built(deflated_tables(deflator, seasonal), section, year_range)):
+        # Requesting the build already running again would restart it
+        return [no_update] * len(FIGURE_IDS) + [no_update, request if request != requested else no_update]
+    
+    # Figures are sent rounded to display precision to keep the callback payload small
+    with profiler.stage(f"update_graphs_{section}"):
+        figures = build_figures(selected_city, year_range, deflator, adjustment, quadrants, None, [section],
+                                benchmark)
+        outputs = dict(zip(SECTION_FIGURES[section], (compact_figure(fig) for fig in figures)))
+    return ([outputs.get(figure_id, no_update) for figure_id in FIGURE_IDS]
+            + [dict(rendered, **{section: params}), no_update])
+
+@app.callback(
+    Output('tables-ready', 'data'),
+    [Input('tables-request', 'data')],
+    background=True,
+    progress=[Output('figure-progress', 'value'), Output('figure-progress', 'max')],
+    running=[(Output('figure-progress-container', 'style'),
+              {'width': '30%', 'margin': '10px auto', 'visibility': 'visible'},
+              {'width': '30%', 'margin': '10px auto', 'visibility': 'hidden'})]
+)
+def prepare_tables(set_progress, request):
+    """Build the derived tables of a deflator and adjustment, and their analyses for a period, in a background job.
+    
+    Only these builds run in the background: they go to the metrics cache, which
+    outlives the job's process, and a new request cancels the job still running
+    for the previous one.
+    """
+    if not request:
+        raise PreventUpdate
+    deflator, adjustment, year_range = request
+    set_progress(('0', str(TABLE_STEPS)))
+    tables = deflated_tables(deflator, adjustment == 'adjusted')
+    set_progress(('1', str(TABLE_STEPS)))
+    build_analyses(tables, year_range)
+    set_progress((str(TABLE_STEPS), str(TABLE_STEPS)))
+    return request
+
+def build_figures(selected_city, year_range, deflator=SHF_HOUSING, adjustment='raw', quadrants=None,
+                  set_progress=None, sections=tuple(SECTION_FIGURES), benchmark='all'):
+    """Create the dashboard figures of some tabs for a city, period, deflator, seasonal adjustment and quadrants.
+    
+    With benchmark 'peers', the time series compare the city with the median of
+    its most similar cities instead of the median of all cities.
+    
+    set_progress, if given, receives (step, steps) as the derived tables and then
+    each tab are built.
+    
+    Returns:
+        tuple: Figures of the requested tabs, in SECTION_FIGURES order
+    """
+    steps = 1 + len(sections)
+    step = 0
+    def advance():
+        nonlocal step
+        step += 1
+        if set_progress is not None:
+            set_progress((str(step), str(steps)))
+    
+    period_start, period_end = year_range
+    tables = deflated_tables(deflator, adjustment == 'adjusted')
+    advance()
+    
+    figures = []
+    if 'overview' in sections:
+        figures += [
+            plot_employment_vs_population(tables['city_panel'], selected_city, year_range, tables['aggregates']),
+            plot_population_growth_boxplot(None, *tables['boxplot'], year_range),
+            plot_population_growth_vs_real_wages(tables['yearly_panel'], selected_city, year_range=year_range,
+                                                 wage_label=real_wage_label(deflator), regression=tables['regression'])
+        ]
+        advance()
+    if 'cagr' in sections:
+        window_cagr = window_cagr_table(tables, period_start, period_end)
+        figures += [
+            plot_cagr_real_wages_vs_population(window_cagr, selected_city, period_start, period_end, quadrants,
+                                               tables['regression']),
+            plot_cagr_nominal_wages_vs_population(window_cagr, selected_city, period_start, period_end, quadrants,
+                                                  tables['regression'])
+        ]
+        advance()
+    if 'time-series' in sections:
+        def peer_median(metric):
+            return tables['peers'].benchmark(selected_city, metric) if benchmark == 'peers' else None
+        figures += [
+            plot_nominal_wages_over_time(tables['city_panel'], selected_city, year_range, tables['bands']['monthly_salary'],
+                                         tables['geography'], tables['uncertainty'], peer_median('monthly_salary'),
+                                         tables['forecasts']),
+            plot_real_wages_over_time(tables['city_panel'], selected_city, year_range, tables['bands']['real_wage'],
+                                      real_wage_label(deflator), tables['geography'], tables['uncertainty'],
+                                      peer_median('real_wage'), tables['forecasts']),
+            plot_housing_costs_over_time(tables['city_panel'], selected_city, year_range, tables['bands']['housing_index'],
+                                         tables['geography'], tables['uncertainty'], peer_median('housing_index'),
+                                         tables['forecasts'])
+        ]
+        advance()
+    
+    return tuple(figures)
+
+@app.callback(
+    Output('quadrant-counts', 'children'),
+    [Input('year-range', 'value'),
+     Input('deflator-dropdown', 'value'),
+     Input('seasonal-adjustment', 'value'),
+     Input('tables-ready', 'data')]
+)
+def update_quadrant_counts(year_range, deflator=SHF_HOUSING, adjustment='raw', ready=None):
+    """Count the cities of each diagnostic quadrant for the selected period (once its tables are built)."""
+    if not tables_built(deflator, adjustment == 'adjusted') and not prepared(ready, deflator, adjustment):
+        raise PreventUpdate
+    period_start, period_end = year_range
+    cube = deflated_tables(deflator, adjustment == 'adjusted')['quadrants']
+    rows = []
+    for measure, label in [('real_wage', 'Real wages'), ('monthly_salary', 'Nominal wages')]:
+        counts = cube.counts(period_start, period_end, measure)
+        rows.append(html.Li(f"{label}: " + ", ".join(f"{name} {count}" for name, count in counts.items())))
+    return html.Ul(rows)
+
 @app.callback(
-    [Output('employment-vs-population', 'figure'),
-     Output('population-growth-boxplot', 'figure'),
-     Output('population-growth-vs-real-wages', 'figure'),
-     Output('cagr-real-wages-vs-population', 'figure'),
-     Output('cagr-nominal-wages-vs-population', 'figure'),
-     Output('nominal-wages-over-time', 'figure'),
-     Output('real-wages-over-time', 'figure'),
-     Output('housing-costs-over-time', 'figure')],
-    [Input('city-dropdown', 'value')]
+    Output('similar-cities', 'children'),
+    [Input('city-dropdown', 'value'),
+     Input('deflator-dropdown', 'value'),
+     Input('seasonal-adjustment', 'value'),
+     Input('tables-ready', 'data')]
 )
-def update_graphs(selected_city):
-    """Update all graphs based on the selected city."""
-    fig1 = plot_employment_vs_population(city_data_df, selected_city)
-    fig2 = plot_population_growth_boxplot(yearly_data_df)
-    fig3 = plot_population_growth_vs_real_wages(yearly_data_df, selected_city)
-    fig4 = plot_cagr_real_wages_vs_population(cagr_data_df, selected_city)
-    fig5 = plot_cagr_nominal_wages_vs_population(cagr_data_df, selected_city)
-    fig6 = plot_nominal_wages_over_time(city_data_df, selected_city)
-    fig7 = plot_real_wages_over_time(city_data_df, selected_city)
-    fig8 = plot_housing_costs_over_time(city_data_df, selected_city)
-    
-    return fig1, fig2, fig3, fig4, fig5, fig6, fig7, fig8
+def update_similar_cities(selected_city, deflator=SHF_HOUSING, adjustment='raw', ready=None):
+    """List the cities most similar to the selected one, nearest first (once its tables and peers are built)."""
+    seasonal = adjustment == 'adjusted'
+    if not prepared(ready, deflator, adjustment) and not (tables_built(deflator, seasonal)
+                                                          and deflated_tables(deflator, seasonal)['peers'].built()):
+        raise PreventUpdate
+    similar = deflated_tables(deflator, seasonal)['peers'].similar(selected_city)
+    if similar.empty:
+        return html.P("No similar cities for this selection.")
+    return html.Ol([html.Li(f"{row.city} (distance {row.distance:.2f})") for row in similar.itertuples()])
+
+# Batch HTML export
+# Bump when the figure functions change so previously exported files are re-rendered
+EXPORT_VERSION = 6
+EXPORT_MANIFEST = "export_manifest.json"
+PLOTLY_JS_BUNDLE = "plotly.min.js"
+# Figures that are the same for every city, written once at the root of the export
+SHARED_EXPORTS = ["2_population_growth_boxplot.html"]
+# Manifest entry of the shared figures (not a city name)
+SHARED_MANIFEST_KEY = "*"
+
+def export_input_digests(cagr_tables):
+    """Map each exported file name to the digest of the whole table it is drawn from.
+    
+    Every figure compares the city against the other cities, so each one depends
+    on the whole table; the digests are the same for every city (and for the
+    shared figures) and computed once per export. With a store, the data version it was written with stands for the
+    panel and the yearly table derived from it, so neither is read to hash it.
+    """
+    if store is None:
+        panel_digest = frame_digest(city_data_df)
+        yearly_digest = frame_digest(yearly_data_df)
+    else:
+        panel_digest = yearly_digest = data_version
+    
+    digests = {
+        "1_employment_vs_population.html": panel_digest,
+        "2_population_growth_boxplot.html": yearly_digest,
+        "3_population_growth_vs_real_wages.html": yearly_digest,
+        "6_nominal_wages_over_time.html": panel_digest,
+        "7_real_wages_over_time.html": panel_digest,
+        "8_housing_costs_over_time.html": panel_digest
+    }
+    for (period_start, period_end), cagr_table in cagr_tables.items():
+        cagr_digest = frame_digest(cagr_table.frame)
+        digests[f"4_cagr_real_wages_vs_population_{period_start}_{period_end}.html"] = cagr_digest
+        digests[f"5_cagr_nominal_wages_vs_population_{period_start}_{period_end}.html"] = cagr_digest
+    return digests
+
+def city_export_digests(city, input_digests):
+    """Map each exported file of a city to the hash of the inputs it is built from (see export_input_digests)."""
+    version = f"v{EXPORT_VERSION}|{city}|"
+    return {name: hashlib.sha256((version + value).encode('utf-8')).hexdigest()
+            for name, value in input_digests.items() if name not in SHARED_EXPORTS}
+
+def shared_export_digests(input_digests):
+    """Map each shared figure to the hash of the inputs it is built from (see export_input_digests)."""
+    version = f"v{EXPORT_VERSION}|"
+    return {name: hashlib.sha256((version + input_digests[name]).encode('utf-8')).hexdigest() for name in SHARED_EXPORTS}
+
+def export_shared_html(output_dir):
+    """Write the figures that don't depend on the city once, next to the shared plotly.js bundle."""
+    plot_population_growth_boxplot(None, population_growth_box_stats, population_growth_outliers).write_html(
+        os.path.join(output_dir, "2_population_growth_boxplot.html"), include_plotlyjs=PLOTLY_JS_BUNDLE)
+
+def export_city_html(city, output_dir, cagr_tables):
+    """Write the figures of one city into its own directory.
+    
+    All files reference a single plotly.js bundle at the root of output_dir
+    instead of embedding their own copy; the boxplot, the same for every city,
+    is written there once by export_shared_html.
+    """
+    city_dir = os.path.join(output_dir, city_slug(city))
+    os.makedirs(city_dir, exist_ok=True)
+    plotly_js = f"../{PLOTLY_JS_BUNDLE}"
+    
+    def write(fig, name):
+        fig.write_html(os.path.join(city_dir, name), include_plotlyjs=plotly_js)
+    
+    write(plot_employment_vs_population(city_panel, city), "1_employment_vs_population.html")
+    write(plot_population_growth_vs_real_wages(yearly_panel, city), "3_population_growth_vs_real_wages.html")
+    for (period_start, period_end), cagr_table in cagr_tables.items():
+        write(plot_cagr_real_wages_vs_population(cagr_table, city, period_start, period_end),
+              f"4_cagr_real_wages_vs_population_{period_start}_{period_end}.html")
+        write(plot_cagr_nominal_wages_vs_population(cagr_table, city, period_start, period_end),
+              f"5_cagr_nominal_wages_vs_population_{period_start}_{period_end}.html")
+    write(plot_nominal_wages_over_time(city_panel, city), "6_nominal_wages_over_time.html")
+    write(plot_real_wages_over_time(city_panel, city), "7_real_wages_over_time.html")
+    write(plot_housing_costs_over_time(city_panel, city), "8_housing_costs_over_time.html")
+    
+    return city
+
+def export_all_html(output_dir="html_export", periods=None, workers=None, force=False):
+    """Export the figures of every city and CAGR period across a process pool.
+    
+    Cities whose inputs are unchanged since the previous export (according to the
+    manifest kept in output_dir) are skipped unless force is set.
+    """
+    periods = periods or [(start_year, end_year)]
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Shared plotly.js asset, written once for all cities
+    bundle_path = os.path.join(output_dir, PLOTLY_JS_BUNDLE)
+    if not os.path.exists(bundle_path):
+        from plotly.offline import get_plotlyjs
+        with open(bundle_path, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+    
+    manifest_path = os.path.join(output_dir, EXPORT_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    cagr_tables = {period: CityPanel(period_aggregates.cagr(*period).merge(bootstrap.cagr(*period), on='city', how='left'), [])
+                   for period in periods}
+    
+    input_digests = export_input_digests(cagr_tables)
+    shared_digests = shared_export_digests(input_digests)
+    if manifest.get(SHARED_MANIFEST_KEY) != shared_digests or not all(
+        os.path.exists(os.path.join(output_dir, name)) for name in shared_digests
+    ):
+        print(f"Writing the figures shared by every city to {output_dir}...")
+        export_shared_html(output_dir)
+        manifest[SHARED_MANIFEST_KEY] = shared_digests
+    
+    pending = {}
+    for city in cities:
+        digests = city_export_digests(city, input_digests)
+        city_dir = os.path.join(output_dir, city_slug(city))
+        up_to_date = manifest.get(city) == digests and all(
+            os.path.exists(os.path.join(city_dir, name)) for name in digests
+        )
+        if not up_to_date:
+            pending[city] = digests
+    
+    print(f"Exporting {len(pending)} of {len(cities)} cities to {output_dir} "
+          f"({len(cities) - len(pending)} unchanged)...")
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(export_city_html, city, output_dir, cagr_tables) for city in pending]
+        for future in futures:
+            city = future.result()
+            manifest[city] = pending[city]
+    
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    
+    return list(pending)
 
 # Run the app
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mexico City Growth Diagnostics Dashboard")
+    parser.add_argument('--export-all', action='store_true',
+                        help="Export the figures of every city as HTML files and exit")
+    parser.add_argument('--output-dir', default="html_export",
+                        help="Directory for the batch HTML export")
+    parser.add_argument('--periods', nargs='+', default=[f"{start_year}-{end_year}"],
+                        help="CAGR periods to export, as START-END (e.g. 2015-2020 2010-2020)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of export processes (defaults to the number of CPUs)")
+    parser.add_argument('--force', action='store_true',
+                        help="Re-export every city even if its inputs are unchanged")
+    parser.add_argument('--measure-payloads', action='store_true',
+                        help="Print the callback payload size of a few cities before and after compaction and exit")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    
+    if args.measure_payloads:
+        measure_payloads(build_figures, [(city, [start_year, end_year]) for city in cities[:5]])
+        raise SystemExit(0)
+    
+    if args.export_all:
+        exported = export_all_html(args.output_dir, [parse_period(p) for p in args.periods],
+                                   args.workers, args.force)
+        print(f"Exported HTML files for {len(exported)} cities")
+        raise SystemExit(0)
+    
     # Save HTML output if running as script
     selected_city = default_city
     
-    # Generate individual HTML files for each graph
-    plot_employment_vs_population(city_data_df, selected_city).write_html("1_employment_vs_population.html")
-    plot_population_growth_boxplot(yearly_data_df).write_html("2_population_growth_boxplot.html")
-    plot_population_growth_vs_real_wages(yearly_data_df, selected_city).write_html("3_population_growth_vs_real_wages.html")
-    plot_cagr_real_wages_vs_population(cagr_data_df, selected_city).write_html("4_cagr_real_wages_vs_population.html")
-    plot_cagr_nominal_wages_vs_population(cagr_data_df, selected_city).write_html("5_cagr_nominal_wages_vs_population.html")
-    plot_nominal_wages_over_time(city_data_df, selected_city).write_html("6_nominal_wages_over_time.html")
-    plot_real_wages_over_time(city_data_df, selected_city).write_html("7_real_wages_over_time.html")
-    plot_housing_costs_over_time(city_data_df, selected_city).write_html("8_housing_costs_over_time.html")
+    # Generate individual HTML files for each graph, sharing one plotly.min.js
+    plot_employment_vs_population(city_panel, selected_city).write_html("1_employment_vs_population.html", include_plotlyjs='directory')
+    plot_population_growth_boxplot(None, population_growth_box_stats, population_growth_outliers).write_html("2_population_growth_boxplot.html", include_plotlyjs='directory')
+    plot_population_growth_vs_real_wages(yearly_panel, selected_city).write_html("3_population_growth_vs_real_wages.html", include_plotlyjs='directory')
+    cagr_intervals = CityPanel(cagr_panel.frame.merge(bootstrap.cagr(start_year, end_year), on='city', how='left'), [])
+    plot_cagr_real_wages_vs_population(cagr_intervals, selected_city).write_html("4_cagr_real_wages_vs_population.html", include_plotlyjs='directory')
+    plot_cagr_nominal_wages_vs_population(cagr_intervals, selected_city).write_html("5_cagr_nominal_wages_vs_population.html", include_plotlyjs='directory')
+    plot_nominal_wages_over_time(city_panel, selected_city).write_html("6_nominal_wages_over_time.html", include_plotlyjs='directory')
+    plot_real_wages_over_time(city_panel, selected_city).write_html("7_real_wages_over_time.html", include_plotlyjs='directory')
+    plot_housing_costs_over_time(city_panel, selected_city).write_html("8_housing_costs_over_time.html", include_plotlyjs='directory')
     
     print(f"Individual HTML files generated for {selected_city}")
     print("Starting dashboard server...")
-    app.run_server(debug=True) 
\ No newline at end of file
+    app.run_server(debug=True)
\ No newline at end of file
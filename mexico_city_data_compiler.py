@@ -10,21 +10,49 @@ and calculates derived metrics like growth rates and CAGR.
 import os
 import pandas as pd
 import numpy as np
-from bs4 import BeautifulSoup
 import re
+import argparse
+
+from mexico_city_cache import frame_digest, memoize, memoize_file, metrics_cache
+from mexico_city_profiling import add_profile_arguments, configure_from_args, profiler
 
 # Define paths to data files
 EMPLOYMENT_RATE_FILE = "Employment rate by city.xls"
 HOURLY_SALARY_FILE = "Mean hourly salary by city.xls"
 POPULATION_FILE = "Population by city.xls"
 HOUSING_COST_FILE = "Indice SHF datos abiertos 4_trim_2024(Indice SHF datos abiertos).csv"
+CROSSWALK_FILE = "zona_metropolitana2.csv"
 
-# Print working directory for debugging
-print(f"Working directory: {os.getcwd()}")
-print(f"Files in directory: {os.listdir('.')}")
+# Backend of compile_data, calculate_growth_rates and calculate_cagr: 'pandas', or
+# 'polars' to run them as Polars lazy queries (requires polars; same output)
+BACKENDS = ['pandas', 'polars']
+BACKEND = os.environ.get('MEXICO_CITY_BACKEND', 'pandas')
 
-def read_excel_html_table(file_path):
-    """Read HTML tables stored in .xls format and extract city data.
+def polars_backend():
+    """Return the mexico_city_polars module if BACKEND is 'polars', else None.
+    
+    Polars is only imported when that backend is selected.
+    """
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown backend {BACKEND!r}, expected one of {', '.join(BACKENDS)}")
+    if BACKEND == 'polars':
+        import mexico_city_polars
+        return mexico_city_polars
+    return None
+
+def current_backend():
+    """The selected backend, part of the memoize key of every function that dispatches on it.
+    
+    The backends agree on values but not always on dtypes or the last bits of
+    floating point sums, so their results are cached apart.
+    """
+    return BACKEND
+
+@memoize_file
+def parse_excel_html_table(file_path):
+    """Parse the HTML table stored in an .xls file into city series.
+    
+    Only successful parses are memoized; errors propagate to read_excel_html_table.
     
     Args:
         file_path (str): Path to the Excel file
@@ -34,51 +62,66 @@ def read_excel_html_table(file_path):
     """
     print(f"Reading {file_path}...")
     
-    try:
-        with open(file_path, 'r', encoding='latin-1') as f:
-            content = f.read()
-        
-        soup = BeautifulSoup(content, 'html.parser')
-        rows = soup.find_all('tr')
-        
-        # Extract years and quarters from header rows
-        header_row = rows[6]  # Zero-indexed, so 7th row
-        years = [th.text.strip() for th in header_row.find_all('td')[1:]]
-        
-        quarter_row = rows[7]  # 8th row
-        quarters = [td.text.strip() for td in quarter_row.find_all('td')[1:]]
-        
-        # Create time points
-        time_points = []
-        for i in range(len(years)):
-            if years[i] and quarters[i]:
-                time_points.append(f"{years[i]}Q{quarters[i].split()[0]}")
-        
-        # Extract data for each city
-        city_data = {}
-        for row in rows[8:]:  # Start from 9th row
-            cells = row.find_all('td')
-            if len(cells) > 1:
-                city_name = cells[0].text.strip()
-                if city_name and city_name != "Áreas metropolitanas":
-                    values = []
-                    for cell in cells[1:]:
-                        text = cell.text.strip()
-                        if text == "No aplica":
+    with open(file_path, 'r', encoding='latin-1') as f:
+        content = f.read()
+    
+    # bs4 is only needed when the parsed file isn't cached yet
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    rows = soup.find_all('tr')
+    
+    # Extract years and quarters from header rows
+    header_row = rows[6]  # Zero-indexed, so 7th row
+    years = [th.text.strip() for th in header_row.find_all('td')[1:]]
+    
+    quarter_row = rows[7]  # 8th row
+    quarters = [td.text.strip() for td in quarter_row.find_all('td')[1:]]
+    
+    # Create time points
+    time_points = []
+    for i in range(len(years)):
+        if years[i] and quarters[i]:
+            time_points.append(f"{years[i]}Q{quarters[i].split()[0]}")
+    
+    # Extract data for each city
+    city_data = {}
+    for row in rows[8:]:  # Start from 9th row
+        cells = row.find_all('td')
+        if len(cells) > 1:
+            city_name = cells[0].text.strip()
+            if city_name and city_name != "Áreas metropolitanas":
+                values = []
+                for cell in cells[1:]:
+                    text = cell.text.strip()
+                    if text == "No aplica":
+                        values.append(np.nan)
+                    else:
+                        try:
+                            values.append(float(text.replace(',', '.')))
+                        except (ValueError, TypeError):
                             values.append(np.nan)
-                        else:
-                            try:
-                                values.append(float(text.replace(',', '.')))
-                            except (ValueError, TypeError):
-                                values.append(np.nan)
-                    
-                    # Create a Series with time points as index
-                    if len(values) == len(time_points):
-                        city_data[city_name] = pd.Series(values, index=time_points)
-        
-        print(f"Extracted data for {len(city_data)} cities across {len(time_points)} time points")
-        return city_data, time_points
+                
+                # Create a Series with time points as index
+                if len(values) == len(time_points):
+                    city_data[city_name] = pd.Series(values, index=time_points)
+    
+    print(f"Extracted data for {len(city_data)} cities across {len(time_points)} time points")
+    return city_data, time_points
+
+def read_excel_html_table(file_path):
+    """Read HTML tables stored in .xls format and extract city data.
+    
+    Falls back to sample data when the file can't be read; the sample is never
+    cached, so the real file is read again on the next run.
     
+    Args:
+        file_path (str): Path to the Excel file
+        
+    Returns:
+        tuple: (city_data dictionary, time_points list)
+    """
+    try:
+        return parse_excel_html_table(file_path)
     except Exception as e:
         print(f"Error reading {file_path}: {str(e)}")
         # If real data can't be read, create sample data for testing
@@ -135,8 +178,11 @@ def create_sample_data(file_type):
     
     return city_data, time_points
 
-def read_housing_cost(file_path):
-    """Read housing cost data from CSV file.
+@memoize_file
+def parse_housing_cost(file_path):
+    """Parse SHF's housing price index CSV into metro zone series.
+    
+    Only successful parses are memoized; errors propagate to read_housing_cost.
     
     Args:
         file_path (str): Path to the CSV file
@@ -146,64 +192,84 @@ def read_housing_cost(file_path):
     """
     print(f"Reading {file_path}...")
     
-    try:
-        # Read CSV file with semicolon separator
-        data = pd.read_csv(file_path, sep=';', encoding='latin-1')
-        
-        # Filter for ZM (zona metropolitana) entries
-        zm_data = data[data['Global'].str.contains('^ZM', regex=True)]
-        
-        # Create a lookup from city name to index values
-        result = {}
-        zm_names = zm_data['Global'].unique()
-        
-        for zm in zm_names:
-            city_name = zm.replace('ZM ', '')
-            if city_name == 'Valle México':
-                city_name = 'Ciudad de México'
-            if city_name == 'PueblaTlax':
-                city_name = 'Ciudad de Puebla'
-            
-            # Get all rows for this ZM
-            zm_rows = zm_data[zm_data['Global'] == zm]
-            
-            # Create time series
-            years = zm_rows['Año'].astype(str)
-            quarters = zm_rows['Trimestre'].astype(str)
-            time_points = years + 'Q' + quarters
-            values = zm_rows['Indice'].values
-            
-            result[city_name] = pd.Series(values, index=time_points)
-        
-        print(f"Extracted housing cost data for {len(result)} cities")
-        return result
+    # Read CSV file with semicolon separator
+    data = pd.read_csv(file_path, sep=';', encoding='latin-1')
+    
+    # Filter for ZM (zona metropolitana) entries
+    zm_data = data[data['Global'].str.contains('^ZM', regex=True)]
     
+    # Create a lookup from city name to index values
+    result = {}
+    zm_names = zm_data['Global'].unique()
+    
+    for zm in zm_names:
+        city_name = zm.replace('ZM ', '')
+        if city_name == 'Valle México':
+            city_name = 'Ciudad de México'
+        if city_name == 'PueblaTlax':
+            city_name = 'Ciudad de Puebla'
+        
+        # Get all rows for this ZM
+        zm_rows = zm_data[zm_data['Global'] == zm]
+        
+        # Create time series
+        years = zm_rows['Año'].astype(str)
+        quarters = zm_rows['Trimestre'].astype(str)
+        time_points = years + 'Q' + quarters
+        values = zm_rows['Indice'].values
+        
+        result[city_name] = pd.Series(values, index=time_points)
+    
+    print(f"Extracted housing cost data for {len(result)} cities")
+    return result
+
+def read_housing_cost(file_path):
+    """Read housing cost data from CSV file.
+    
+    Falls back to sample data when the file can't be read; the sample is never
+    cached, so the real file is read again on the next run.
+    
+    Args:
+        file_path (str): Path to the CSV file
+        
+    Returns:
+        dict: Dictionary mapping city names to price index series
+    """
+    try:
+        return parse_housing_cost(file_path)
     except Exception as e:
         print(f"Error reading {file_path}: {str(e)}")
-        # Create sample housing cost data
         print("Creating sample housing cost data for testing...")
-        cities = ["México", "Guadalajara", "Monterrey", "Puebla", "León"]
-        years = list(range(2015, 2021))
-        quarters = list(range(1, 5))
-        time_points = [f"{year}Q{quarter}" for year in years for quarter in quarters]
-        
-        result = {}
-        for city in cities:
-            # Base values by city
-            if city == "México":
-                base = 150
-            elif city in ["Guadalajara", "Monterrey"]:
-                base = 120
-            else:
-                base = 90
-            
-            # Add growth trend
-            values = [base * (1 + 0.05 * (i/len(time_points))) * (1 + np.random.uniform(-0.01, 0.01)) 
-                     for i in range(len(time_points))]
-            
-            result[city] = pd.Series(values, index=time_points)
+        return create_sample_housing_data()
+
+def create_sample_housing_data():
+    """Create sample housing cost data for testing when the SHF file can't be read.
+    
+    Returns:
+        dict: Dictionary mapping city names to price index series
+    """
+    cities = ["México", "Guadalajara", "Monterrey", "Puebla", "León"]
+    years = list(range(2015, 2021))
+    quarters = list(range(1, 5))
+    time_points = [f"{year}Q{quarter}" for year in years for quarter in quarters]
+    
+    result = {}
+    for city in cities:
+        # Base values by city
+        if city == "México":
+            base = 150
+        elif city in ["Guadalajara", "Monterrey"]:
+            base = 120
+        else:
+            base = 90
+        
+        # Add growth trend
+        values = [base * (1 + 0.05 * (i/len(time_points))) * (1 + np.random.uniform(-0.01, 0.01)) 
+                 for i in range(len(time_points))]
         
-        return result
+        result[city] = pd.Series(values, index=time_points)
+    
+    return result
 
 def compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points):
     """Compile data into a single DataFrame.
@@ -218,6 +284,10 @@ def compile_data(employment_data, salary_data, population_data, housing_cost_dat
     Returns:
         pd.DataFrame: Combined dataset with all metrics
     """
+    polars = polars_backend()
+    if polars is not None:
+        return polars.compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
+    
     print("Compiling data into a unified dataset...")
     
     # Get all city names
@@ -277,6 +347,7 @@ def compile_data(employment_data, salary_data, population_data, housing_cost_dat
     print(f"Created dataframe with {len(df)} rows and {len(df.columns)} columns")
     return df
 
+@memoize(context=current_backend)
 def calculate_growth_rates(data):
     """Calculate year-over-year growth rates.
     
@@ -286,6 +357,10 @@ def calculate_growth_rates(data):
     Returns:
         pd.DataFrame: Dataset with yearly growth rates
     """
+    polars = polars_backend()
+    if polars is not None:
+        return polars.calculate_growth_rates(data)
+    
     print("Calculating year-over-year growth rates...")
     
     # Group by city and year, taking the average for each year
@@ -328,6 +403,7 @@ def calculate_growth_rates(data):
     print(f"Created growth rates dataframe with {len(df)} rows")
     return df
 
+@memoize(context=current_backend)
 def calculate_cagr(data, start_year, end_year):
     """Calculate CAGR for the specified time period.
     
@@ -339,6 +415,10 @@ def calculate_cagr(data, start_year, end_year):
     Returns:
         pd.DataFrame: Dataset with CAGR metrics
     """
+    polars = polars_backend()
+    if polars is not None:
+        return polars.calculate_cagr(data, start_year, end_year)
+    
     print(f"Calculating CAGR for period {start_year}-{end_year}...")
     
     # Filter data for the specified time period
@@ -379,27 +459,333 @@ def calculate_cagr(data, start_year, end_year):
     print(f"Created CAGR dataframe with {len(df)} rows")
     return df
 
-def main():
-    """Main function to run the data compilation and processing."""
+def calculate_boxplot_stats(yearly_data, value_col='population_growth'):
+    """Calculate boxplot summary statistics of a metric for every year at once.
+    
+    Uses the same convention as plotly's box traces: whiskers (fences) extend to
+    the most extreme values within 1.5 IQR of the quartiles, and anything beyond
+    them is an outlier.
+    
+    Args:
+        yearly_data (pd.DataFrame): Dataset with yearly growth rates
+        value_col (str): Column to summarize
+        
+    Returns:
+        tuple: (stats DataFrame with one row per year and columns q1, median, q3,
+            lowerfence, upperfence and count; outliers DataFrame with the city,
+            year and value of every point beyond the fences)
+    """
+    values = yearly_data.dropna(subset=[value_col])
+    grouped = values.groupby('year')[value_col]
+    
+    # One groupby-quantile for all years
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+    
+    # Fences are the most extreme values inside 1.5 IQR of the quartiles
+    lower_limit = values['year'].map(stats['q1'] - 1.5 * iqr)
+    upper_limit = values['year'].map(stats['q3'] + 1.5 * iqr)
+    inside = (values[value_col] >= lower_limit) & (values[value_col] <= upper_limit)
+    inside_values = values[inside].groupby('year')[value_col]
+    stats['lowerfence'] = inside_values.min()
+    stats['upperfence'] = inside_values.max()
+    stats['count'] = grouped.size()
+    
+    outliers = values.loc[~inside, ['city', 'year', value_col]].reset_index(drop=True)
+    return stats.reset_index(), outliers
+
+class CityPanel:
+    """A city panel sorted by (city, period) with O(1) access to each city's rows.
+    
+    Attributes:
+        frame (pd.DataFrame): The panel, sorted by city and then by period
+        rows (dict): City name mapped to its (start, stop) row range in frame
+        latest (pd.DataFrame): The latest observation of every city
+    """
+    
+    def __init__(self, data, period_cols=('year', 'quarter')):
+        """Sort the panel and index the row range of every city.
+        
+        Args:
+            data (pd.DataFrame): Panel with a 'city' column
+            period_cols (sequence): Columns that order the rows within a city
+        """
+        self.period_cols = [col for col in period_cols if col in data.columns]
+        self.frame = data.sort_values(['city'] + self.period_cols, kind='mergesort').reset_index(drop=True)
+        
+        # Each city occupies one contiguous block of rows
+        city_values = self.frame['city'].to_numpy()
+        boundaries = np.flatnonzero(city_values[1:] != city_values[:-1]) + 1
+        starts = np.r_[0, boundaries] if len(city_values) else boundaries
+        stops = np.r_[boundaries, len(city_values)] if len(city_values) else boundaries
+        self.rows = {city: (start, stop) for city, start, stop in zip(city_values[starts], starts, stops)}
+        
+        self.latest = self.frame.iloc[stops - 1].reset_index(drop=True)
+        self._latest_rows = {city: i for i, city in enumerate(self.latest['city'])}
+    
+    @property
+    def cities(self):
+        return list(self.rows)
+    
+    @property
+    def columns(self):
+        return self.frame.columns
+    
+    def city(self, city):
+        """Return the rows of a city, or an empty frame if the city is unknown."""
+        start, stop = self.rows.get(city, (0, 0))
+        return self.frame.iloc[start:stop]
+    
+    def latest_city(self, city):
+        """Return the latest observation of a city as a one-row frame."""
+        i = self._latest_rows.get(city)
+        return self.latest.iloc[0:0] if i is None else self.latest.iloc[i:i + 1]
+    
+    def __len__(self):
+        return len(self.frame)
+
+WINDOW_METRICS = ['population', 'real_wage', 'monthly_salary', 'employment_rate', 'housing_index']
+
+# Column prefixes used by calculate_cagr for each metric
+CAGR_PREFIXES = {'population': 'population', 'real_wage': 'real_wage', 'monthly_salary': 'nominal_wage'}
+
+class PeriodAggregates:
+    """Prefix sums of yearly city averages for O(1) queries over any year window.
+    
+    Every array has one row per city and one column per year (plus a leading
+    zero column for the prefix sums), with metrics on the last axis, so the mean,
+    first/last value and CAGR of any window are differences or lookups.
+    
+    Attributes:
+        cities (list): Cities in the row order of every array
+        years (np.ndarray): Consecutive years covered by the arrays
+        metrics (list): Metrics on the last axis of every array
+        values (np.ndarray): Yearly averages, shape (cities, years, metrics)
+    """
+    
+    def __init__(self, data, metrics=WINDOW_METRICS):
+        """Build the yearly averages and their prefix sums and counts.
+        
+        Args:
+            data (pd.DataFrame): Combined dataset with all metrics
+            metrics (list): Metrics to aggregate
+        """
+        self.metrics = [metric for metric in metrics if metric in data.columns]
+        yearly = data.groupby(['city', 'year'])[self.metrics].mean()
+        
+        self.cities = sorted(yearly.index.get_level_values('city').unique())
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        years = yearly.index.get_level_values('year')
+        self.years = np.arange(years.min(), years.max() + 1) if len(years) else np.array([], dtype=int)
+        n_cities, n_years = len(self.cities), len(self.years)
+        
+        grid = pd.MultiIndex.from_product([self.cities, self.years], names=['city', 'year'])
+        self.values = yearly.reindex(grid).to_numpy(dtype=float).reshape(n_cities, n_years, len(self.metrics))
+        present = grid.isin(yearly.index).reshape(n_cities, n_years)
+        valid = ~np.isnan(self.values)
+        
+        # Prefix sums over years, with a leading zero so window sums are cum[end] - cum[start]
+        self.cumsum = np.concatenate([np.zeros((n_cities, 1, len(self.metrics))),
+                                      np.cumsum(np.where(valid, self.values, 0), axis=1)], axis=1)
+        self.cumcount = np.concatenate([np.zeros((n_cities, 1, len(self.metrics))),
+                                        np.cumsum(valid, axis=1)], axis=1)
+        self.rowcount = np.concatenate([np.zeros((n_cities, 1)), np.cumsum(present, axis=1)], axis=1)
+        
+        # Nearest year with data at or before / at or after each year, for first/last lookups
+        positions = np.arange(n_years)
+        self.prev_row = np.maximum.accumulate(np.where(present, positions, -1), axis=1)
+        self.next_row = np.minimum.accumulate(np.where(present, positions, n_years)[:, ::-1], axis=1)[:, ::-1]
+    
+    def _bounds(self, start_year, end_year):
+        """Convert a year window into [i0, i1) column positions."""
+        if not len(self.years):
+            return 0, 0
+        i0 = int(np.clip(start_year - self.years[0], 0, len(self.years)))
+        i1 = int(np.clip(end_year - self.years[0] + 1, 0, len(self.years)))
+        return i0, max(i0, i1)
+    
+    def window_means(self, start_year, end_year):
+        """Average of each metric over the window, one row per city.
+        
+        Args:
+            start_year (int): First year of the window
+            end_year (int): Last year of the window
+            
+        Returns:
+            pd.DataFrame: city column plus one column per metric
+        """
+        i0, i1 = self._bounds(start_year, end_year)
+        sums = self.cumsum[:, i1] - self.cumsum[:, i0]
+        counts = self.cumcount[:, i1] - self.cumcount[:, i0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        
+        frame = pd.DataFrame(means, columns=self.metrics)
+        frame.insert(0, 'city', self.cities)
+        return frame
+    
+    def cagr(self, start_year, end_year):
+        """Calculate CAGR for the window, with the same output as calculate_cagr.
+        
+        Args:
+            start_year (int): Start year for CAGR calculation
+            end_year (int): End year for CAGR calculation
+            
+        Returns:
+            pd.DataFrame: Dataset with CAGR metrics
+        """
+        i0, i1 = self._bounds(start_year, end_year)
+        columns = ['city', 'start_year', 'end_year']
+        for prefix in CAGR_PREFIXES.values():
+            columns += [f'start_{prefix}', f'end_{prefix}']
+        columns += ['years'] + [f'{prefix}_cagr' for prefix in CAGR_PREFIXES.values()]
+        
+        if i1 <= i0:
+            # No year of the window has data: no rows, with the same columns and dtypes
+            selected = np.array([], dtype=int)
+            first = last = np.empty((0, len(self.metrics)))
+        else:
+            # Cities need at least two years with data in the window
+            rows = self.rowcount[:, i1] - self.rowcount[:, i0]
+            selected = np.flatnonzero(rows >= 2)
+            first = self.values[selected, self.next_row[selected, i0]]
+            last = self.values[selected, self.prev_row[selected, i1 - 1]]
+        
+        years = end_year - start_year if end_year > start_year else 1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            growth = np.where(first > 0, (last / first) ** (1 / years) - 1, np.nan) * 100
+        
+        result = {
+            'city': np.array(self.cities, dtype=object)[selected],
+            'start_year': start_year,
+            'end_year': end_year
+        }
+        for metric, prefix in CAGR_PREFIXES.items():
+            k = self.metrics.index(metric)
+            result[f'start_{prefix}'] = first[:, k]
+            result[f'end_{prefix}'] = last[:, k]
+        result['years'] = years
+        for metric, prefix in CAGR_PREFIXES.items():
+            result[f'{prefix}_cagr'] = growth[:, self.metrics.index(metric)]
+        
+        return pd.DataFrame(result, columns=columns)
+    
+    def cagr_cube(self, windows):
+        """CAGR (%) of every metric for many windows at once, as cagr computes it for one.
+        
+        Args:
+            windows (list): (start_year, end_year) windows
+            
+        Returns:
+            np.ndarray: Shape (cities, windows, metrics); NaN for cities with fewer
+                than two years of data in a window or a non-positive first year
+        """
+        n_cities, n_years = len(self.cities), len(self.years)
+        if not len(windows) or not n_years:
+            return np.full((n_cities, len(windows), len(self.metrics)), np.nan)
+        
+        starts = np.array([start for start, _ in windows])
+        ends = np.array([end for _, end in windows])
+        i0 = np.clip(starts - self.years[0], 0, n_years)
+        i1 = np.maximum(np.clip(ends - self.years[0] + 1, 0, n_years), i0)
+        
+        rows = self.rowcount[:, i1] - self.rowcount[:, i0]
+        first_row = np.minimum(self.next_row[:, np.minimum(i0, n_years - 1)], n_years - 1)
+        last_row = np.maximum(self.prev_row[:, np.maximum(i1 - 1, 0)], 0)
+        
+        city_rows = np.arange(n_cities)[:, np.newaxis]
+        first = self.values[city_rows, first_row]
+        last = self.values[city_rows, last_row]
+        
+        years = np.where(ends > starts, ends - starts, 1)[np.newaxis, :, np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            growth = np.where(first > 0, (last / first) ** (1 / years) - 1, np.nan) * 100
+        growth[rows < 2] = np.nan
+        return growth
+
+TIME_SERIES_METRICS = ['monthly_salary', 'real_wage', 'housing_index']
+BAND_QUANTILES = {'p10': 0.10, 'p25': 0.25, 'p50': 0.50, 'p75': 0.75, 'p90': 0.90}
+
+def calculate_time_series_bands(city_data, metrics=TIME_SERIES_METRICS):
+    """Calculate the cross-city distribution of each metric for every quarter.
+    
+    Args:
+        city_data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Columns to summarize
+        
+    Returns:
+        dict: Metric name mapped to a DataFrame with one row per quarter and
+            columns year, quarter, time_point, p10, p25, p50, p75 and p90
+    """
+    print("Calculating cross-city quantile bands...")
+    
+    # One groupby-quantile for every metric and quarter
+    quantiles = city_data.groupby(['year', 'quarter'])[metrics].quantile(list(BAND_QUANTILES.values()))
+    quantiles.index = quantiles.index.set_levels(list(BAND_QUANTILES), level=2)
+    
+    bands = {}
+    for metric in metrics:
+        band = quantiles[metric].unstack().reset_index()
+        band.columns.name = None
+        band.insert(2, 'time_point', band['year'].astype(str) + 'Q' + band['quarter'].astype(str))
+        bands[metric] = band
+    
+    return bands
+
+def main(store_path=None):
+    """Main function to run the data compilation and processing.
+    
+    Args:
+        store_path (str): Also write the tables, raw sources and crosswalk into this DuckDB file
+    """
     try:
+        # Print working directory for debugging
+        print(f"Working directory: {os.getcwd()}")
+        
         # 1. Read data files
-        employment_data, time_points = read_excel_html_table(EMPLOYMENT_RATE_FILE)
-        salary_data, _ = read_excel_html_table(HOURLY_SALARY_FILE)
-        population_data, _ = read_excel_html_table(POPULATION_FILE)
-        housing_cost_data = read_housing_cost(HOUSING_COST_FILE)
+        with profiler.stage('read'):
+            employment_data, time_points = read_excel_html_table(EMPLOYMENT_RATE_FILE)
+            salary_data, _ = read_excel_html_table(HOURLY_SALARY_FILE)
+            population_data, _ = read_excel_html_table(POPULATION_FILE)
+            housing_cost_data = read_housing_cost(HOUSING_COST_FILE)
         
         # 2. Compile data
-        city_data = compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
+        with profiler.stage('compile'):
+            city_data = compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
         
         # 3. Calculate growth rates and CAGR
-        yearly_growth = calculate_growth_rates(city_data)
+        with profiler.stage('growth_rates'):
+            yearly_growth = calculate_growth_rates(city_data)
         
         # 4. Calculate CAGR for a specific period
         start_year = 2015
         end_year = 2020
-        cagr_data = calculate_cagr(city_data, start_year, end_year)
-        
-        # 5. Display the first 5 rows of each dataset
+        with profiler.stage('cagr'):
+            cagr_data = calculate_cagr(city_data, start_year, end_year)
+        
+        # 5. Precompute boxplot statistics and quantile bands for the figures
+        with profiler.stage('figure_stats'):
+            boxplot_stats, boxplot_outliers = calculate_boxplot_stats(yearly_growth, 'population_growth')
+            time_series_bands = calculate_time_series_bands(city_data)
+        
+        # State and national rollups (imported here as mexico_city_geography depends on this module)
+        from mexico_city_geography import GeographyCube, load_geography
+        with profiler.stage('geography'):
+            geography, shf_levels, crosswalk = load_geography(city_data['city'].unique())
+            geography_data = GeographyCube(city_data, geography, shf_levels, crosswalk).frame()
+        
+        # Seasonally adjusted panel (imported here as mexico_city_seasonal depends on this module)
+        from mexico_city_seasonal import adjust_panel
+        with profiler.stage('seasonal_adjustment'):
+            seasonal_data = adjust_panel(city_data)
+        
+        # Nowcasts and forecasts with intervals (imported here as mexico_city_forecast depends on this module)
+        from mexico_city_forecast import FORECAST_FILE, forecast_panel
+        with profiler.stage('forecast'):
+            forecasts = forecast_panel(city_data)
+        
+        # 6. Display the first 5 rows of each dataset
         print("\n===== CITY DATA (First 5 rows) =====")
         print(city_data.head().to_string())
         
@@ -409,23 +795,54 @@ def main():
         print("\n===== CAGR DATA (First 5 rows) =====")
         print(cagr_data.head().to_string())
         
-        # 6. Save to CSV files for further analysis
+        # 7. Save to CSV files for further analysis
         print("\nSaving datasets to CSV files...")
-        city_data.to_csv("city_data_compiled.csv", index=False)
-        yearly_growth.to_csv("yearly_growth_data.csv", index=False)
-        cagr_data.to_csv("cagr_data.csv", index=False)
+        with profiler.stage('save'):
+            city_data.to_csv("city_data_compiled.csv", index=False)
+            yearly_growth.to_csv("yearly_growth_data.csv", index=False)
+            cagr_data.to_csv("cagr_data.csv", index=False)
+            boxplot_stats.to_csv("population_growth_boxplot_stats.csv", index=False)
+            boxplot_outliers.to_csv("population_growth_boxplot_outliers.csv", index=False)
+            pd.concat(time_series_bands, names=['metric']).reset_index(level=0).to_csv("time_series_bands.csv", index=False)
+            seasonal_data.to_csv("city_data_seasonally_adjusted.csv", index=False)
+            geography_data.to_csv("geography_cube.csv", index=False)
+            forecasts.to_csv(FORECAST_FILE, index=False)
         print("Data saved successfully.")
         
-        # 7. Return statistics on the data
+        if store_path:
+            # Imported here as duckdb is optional and mexico_city_duckdb depends on this module
+            from mexico_city_duckdb import write_store
+            with profiler.stage('store'):
+                write_store(store_path, {
+                    'city_data': city_data,
+                    'yearly_growth': yearly_growth,
+                    'cagr': cagr_data,
+                    'geography': geography_data,
+                    'forecasts': forecasts
+                }, sources={
+                    'employment_rate': employment_data,
+                    'hourly_salary': salary_data,
+                    'population': population_data,
+                    'housing_index': housing_cost_data
+                }, crosswalk_file=CROSSWALK_FILE)
+        
+        # 8. Return statistics on the data
         print("\n===== DATA SUMMARY =====")
         print(f"Total cities: {city_data['city'].nunique()}")
         print(f"Time period: {city_data['year'].min()}-{city_data['year'].max()}")
         print(f"Total data points: {len(city_data)}")
+        print(f"Metrics cache: {metrics_cache.stats()}")
         
         return {
             "city_data": city_data,
             "yearly_growth": yearly_growth,
-            "cagr_data": cagr_data
+            "cagr_data": cagr_data,
+            "boxplot_stats": boxplot_stats,
+            "boxplot_outliers": boxplot_outliers,
+            "time_series_bands": time_series_bands,
+            "seasonal_data": seasonal_data,
+            "geography_data": geography_data,
+            "forecasts": forecasts
         }
         
     except Exception as e:
@@ -433,4 +850,13 @@ def main():
         return None
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compile the Mexico City growth datasets")
+    parser.add_argument('--backend', choices=BACKENDS, default=BACKEND,
+                        help="Run compile, growth rates and CAGR with pandas or as Polars lazy queries")
+    parser.add_argument('--store', metavar='PATH',
+                        help="Also write the compiled tables into a DuckDB file for the dashboard (needs duckdb)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+    BACKEND = args.backend
+    main(args.store) 
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Deflators
+This module loads local price series (the SHF housing index, a CPI/INPC file,
+regional price levels, ...), rebases them to a common base quarter and computes
+real wages against all of them at once as a cities x quarters x deflators array.
+"""
+
+import os
+import pandas as pd
+import numpy as np
+
+SHF_HOUSING = "SHF housing index"
+
+def load_price_series(file_path):
+    """Read a price series from a CSV file.
+
+    The file needs 'year', 'quarter' and 'value' columns (or a 'time_point' column
+    in YYYYQN format instead of year/quarter). An optional 'city' column gives one
+    series per city; without it the series is national and applies to every city.
+
+    Args:
+        file_path (str): Path to the CSV file
+
+    Returns:
+        pd.DataFrame: Columns time_point, value and, for local series, city
+    """
+    print(f"Reading price series {file_path}...")
+    data = pd.read_csv(file_path, encoding='utf-8')
+    data.columns = [col.strip().lower() for col in data.columns]
+
+    if 'time_point' not in data.columns:
+        data['time_point'] = data['year'].astype(int).astype(str) + 'Q' + data['quarter'].astype(int).astype(str)
+
+    columns = ['city', 'time_point', 'value'] if 'city' in data.columns else ['time_point', 'value']
+    return data[columns]
+
+def housing_index_series(city_data):
+    """Return the SHF housing index already matched to each city by compile_data.
+
+    Args:
+        city_data (pd.DataFrame): Combined dataset with all metrics
+
+    Returns:
+        pd.DataFrame: Columns city, time_point and value
+    """
+    return city_data[['city', 'time_point', 'housing_index']].rename(columns={'housing_index': 'value'})
+
+class DeflatorSet:
+    """Price series aligned on the cities and quarters of the compiled panel.
+
+    Attributes:
+        cities (list): Cities on the first axis of every array
+        time_points (list): Quarters on the second axis of every array
+        names (list): Deflators on the third axis of every array
+        index (np.ndarray): Rebased price indices, shape (cities, quarters, deflators)
+        real_wages (np.ndarray): Monthly salary divided by every deflator, same shape
+    """
+
+    def __init__(self, city_data, base_quarter=None):
+        """Align the panel's monthly salaries on a cities x quarters grid.
+
+        Args:
+            city_data (pd.DataFrame): Combined dataset with all metrics
+            base_quarter (str): Quarter (YYYYQN) set to 100 in every deflator, or
+                None to keep each series on its own scale
+
+        Raises:
+            ValueError: If base_quarter is not one of the panel's quarters
+        """
+        self.city_data = city_data
+        self.base_quarter = base_quarter
+        self.cities = sorted(city_data['city'].unique())
+        order = city_data[['year', 'quarter', 'time_point']].drop_duplicates().sort_values(['year', 'quarter'])
+        self.time_points = list(order['time_point'])
+        if base_quarter is not None and base_quarter not in self.time_points:
+            available = f"{self.time_points[0]} to {self.time_points[-1]}" if self.time_points else "no quarters"
+            raise ValueError(f"Base quarter {base_quarter!r} is not in the panel, which covers {available}")
+        self.salary = self._align(city_data[['city', 'time_point', 'monthly_salary']].rename(columns={'monthly_salary': 'value'}))
+        self.names = []
+        self._series = []
+        self.index = np.empty((len(self.cities), len(self.time_points), 0))
+        self.real_wages = self.index.copy()
+
+    def _align(self, series):
+        """Pivot a (city, time_point, value) series onto the cities x quarters grid.
+
+        National series (without a city column) are broadcast to every city.
+        """
+        if 'city' not in series.columns:
+            values = series.groupby('time_point')['value'].mean().reindex(self.time_points).to_numpy(dtype=float)
+            return np.broadcast_to(values, (len(self.cities), len(self.time_points))).copy()
+        grid = series.pivot_table(index='city', columns='time_point', values='value', aggfunc='mean')
+        return grid.reindex(index=self.cities, columns=self.time_points).to_numpy(dtype=float)
+
+    def add(self, name, series):
+        """Register a price series under a display name."""
+        self.names.append(name)
+        self._series.append(self._align(series))
+        return self
+
+    def build(self):
+        """Stack, rebase and apply every registered deflator in one broadcast."""
+        print(f"Computing real wages against {len(self.names)} deflators...")
+        index = np.stack(self._series, axis=2) if self._series else np.empty((len(self.cities), len(self.time_points), 0))
+
+        if self.base_quarter is not None:
+            base = index[:, self.time_points.index(self.base_quarter), :]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                index = index / base[:, np.newaxis, :] * 100
+
+        self.index = index
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.real_wages = self.salary[:, :, np.newaxis] / index
+        return self
+
+    def panel(self, name):
+        """Return the compiled panel with real_wage computed against one deflator.
+
+        Args:
+            name (str): Name of a registered deflator
+
+        Returns:
+            pd.DataFrame: Copy of the compiled panel with 'real_wage' replaced and
+                the deflator's (rebased) value in 'deflator_index'
+        """
+        k = self.names.index(name)
+        city_positions = self.city_data['city'].map({city: i for i, city in enumerate(self.cities)}).to_numpy()
+        time_positions = self.city_data['time_point'].map({tp: i for i, tp in enumerate(self.time_points)}).to_numpy()
+
+        data = self.city_data.copy()
+        data['real_wage'] = self.real_wages[city_positions, time_positions, k]
+        data['deflator_index'] = self.index[city_positions, time_positions, k]
+        return data
+
+def load_deflators(city_data, price_files=None, base_quarter=None):
+    """Build a DeflatorSet with the SHF housing index plus any local price files.
+
+    Args:
+        city_data (pd.DataFrame): Combined dataset with all metrics
+        price_files (dict): Display name mapped to a CSV path readable by
+            load_price_series; missing files are skipped
+        base_quarter (str): Quarter (YYYYQN) to rebase every deflator to
+
+    Returns:
+        DeflatorSet: Deflators with real wages computed
+    """
+    deflators = DeflatorSet(city_data, base_quarter)
+    deflators.add(SHF_HOUSING, housing_index_series(city_data))
+
+    for name, file_path in (price_files or {}).items():
+        if not os.path.exists(file_path):
+            continue
+        try:
+            deflators.add(name, load_price_series(file_path))
+        except Exception as e:
+            print(f"Error reading {file_path}: {str(e)}")
+
+    return deflators.build()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Diagnostic Quadrants
+This module classifies every city into a growth-diagnostic quadrant, from the
+sign of its population CAGR against the sign of its real or nominal wage CAGR,
+for every CAGR window at once. The result is stored as an int8 cube so the
+dashboard can filter, count and color cities by quadrant with array lookups.
+"""
+
+import numpy as np
+import pandas as pd
+
+from mexico_city_data_compiler import CAGR_PREFIXES
+
+# Quadrant codes, indexed by 2 * (population shrinking) + (wages falling)
+DEMAND_DRIVEN = 0
+SUPPLY_DRIVEN = 1
+SUPPLY_CONSTRAINED = 2
+DECLINING = 3
+UNCLASSIFIED = -1
+
+QUADRANTS = {
+    DEMAND_DRIVEN: "Demand-driven growth",
+    SUPPLY_DRIVEN: "Supply-driven growth",
+    SUPPLY_CONSTRAINED: "Supply-constrained",
+    DECLINING: "Declining",
+    UNCLASSIFIED: "Not enough data"
+}
+
+QUADRANT_COLORS = {
+    "Demand-driven growth": '#2ca02c',
+    "Supply-driven growth": '#1f77b4',
+    "Supply-constrained": '#ff7f0e',
+    "Declining": '#d62728',
+    "Not enough data": '#c7c7c7'
+}
+
+# Wage measures compared against population growth (metrics of PeriodAggregates)
+QUADRANT_MEASURES = ['real_wage', 'monthly_salary']
+
+def classify(population, wages):
+    """Quadrant codes from population and wage growth (same shapes; only signs matter).
+
+    Cities missing either growth are UNCLASSIFIED.
+    """
+    with np.errstate(invalid='ignore'):
+        codes = 2 * (population <= 0) + (wages <= 0)
+    valid = ~np.isnan(population) & ~np.isnan(wages)
+    return np.where(valid, codes, UNCLASSIFIED).astype(np.int8)
+
+def all_windows(years):
+    """List every (start_year, end_year) window with start_year < end_year."""
+    return [(int(start), int(end)) for start in years for end in years if start < end]
+
+class QuadrantCube:
+    """Growth-diagnostic quadrant of every city for every CAGR window.
+
+    Attributes:
+        cities (list): Cities on the first axis of the cube
+        windows (list): (start_year, end_year) windows on the second axis
+        measures (list): Wage metrics on the third axis
+        codes (np.ndarray): int8 quadrant codes, shape (cities, windows, measures)
+    """
+
+    def __init__(self, aggregates, windows=None, measures=QUADRANT_MEASURES):
+        """Classify all cities for all windows in one vectorized pass.
+
+        Args:
+            aggregates (PeriodAggregates): Yearly averages of the panel
+            windows (list): (start_year, end_year) windows, all of them by default
+            measures (list): Wage metrics to compare against population growth
+        """
+        self.cities = aggregates.cities
+        self.city_index = aggregates.city_index
+        self.windows = windows if windows is not None else all_windows(aggregates.years)
+        self.window_index = {window: w for w, window in enumerate(self.windows)}
+        self.measures = [measure for measure in measures if measure in aggregates.metrics]
+
+        growth = aggregates.cagr_cube(self.windows)
+        population = growth[:, :, [aggregates.metrics.index('population')]]
+        wages = growth[:, :, [aggregates.metrics.index(measure) for measure in self.measures]]
+
+        self.codes = classify(population, wages)
+
+    def window(self, start_year, end_year):
+        """Quadrant codes of every city for one window, shape (cities, measures).
+
+        Windows outside the cube (e.g. a single year) leave every city unclassified.
+        """
+        w = self.window_index.get((start_year, end_year))
+        if w is None:
+            return np.full((len(self.cities), len(self.measures)), UNCLASSIFIED, dtype=np.int8)
+        return self.codes[:, w]
+
+    def frame(self, start_year, end_year):
+        """Quadrant names of every city for one window.
+
+        Returns:
+            pd.DataFrame: city column plus a '<prefix>_quadrant' column per measure,
+                named like the CAGR columns ('real_wage_quadrant', 'nominal_wage_quadrant')
+        """
+        codes = self.window(start_year, end_year)
+        frame = pd.DataFrame({'city': self.cities})
+        for k, measure in enumerate(self.measures):
+            frame[f'{CAGR_PREFIXES[measure]}_quadrant'] = pd.Series(codes[:, k]).map(QUADRANTS).to_numpy()
+        return frame
+
+    def counts(self, start_year, end_year, measure='real_wage'):
+        """Number of cities in each quadrant for one window and wage measure.
+
+        Returns:
+            dict: Quadrant name mapped to its number of cities
+        """
+        codes = self.window(start_year, end_year)[:, self.measures.index(measure)]
+        counts = np.bincount(codes[codes >= 0], minlength=4)
+        result = {QUADRANTS[code]: int(counts[code]) for code in range(4)}
+        result[QUADRANTS[UNCLASSIFIED]] = int((codes < 0).sum())
+        return result
+
+    def cities_in(self, quadrant, start_year, end_year, measure='real_wage'):
+        """Cities classified in a quadrant (code or name) for one window and wage measure."""
+        if isinstance(quadrant, str):
+            quadrant = {name: code for code, name in QUADRANTS.items()}[quadrant]
+        codes = self.window(start_year, end_year)[:, self.measures.index(measure)]
+        return [self.cities[i] for i in np.flatnonzero(codes == quadrant)]
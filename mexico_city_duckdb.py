@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth DuckDB Store
+This module writes the compiled panel, yearly growth and CAGR tables, the raw
+source series and the municipality crosswalk into one local DuckDB file, each
+table sorted by city and period so a city's rows are read from a few row
+groups. The dashboard can query the file for what each figure needs (a city's
+rows, the latest period of every city, cross-city quantile bands, CAGR over
+any window) instead of holding every table in memory; DuckDB spills to disk
+beyond its memory limit, so panels larger than memory work too.
+
+Requires the optional duckdb package.
+"""
+
+import os
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import duckdb
+
+from mexico_city_data_compiler import BAND_QUANTILES, CAGR_PREFIXES, TIME_SERIES_METRICS, WINDOW_METRICS, frame_digest
+from mexico_city_diagnostics import QUADRANT_MEASURES, QuadrantCube, classify
+from mexico_city_geography import GeographyCube
+
+STORE_FILE = "mexico_city.duckdb"
+
+# Memory DuckDB may use per process before spilling to disk
+STORE_MEMORY_LIMIT = "256MB"
+
+# Sort order of every table, which is also the order of its query results
+TABLE_ORDER = {
+    'city_data': ['city', 'year', 'quarter'],
+    'yearly_growth': ['city', 'year'],
+    'cagr': ['city'],
+    'geography': ['level', 'geography', 'year', 'quarter'],
+    'forecasts': ['city', 'year', 'quarter'],
+    'raw_sources': ['source', 'city', 'time_point'],
+    'crosswalk': ['codeZM', 'geocode']
+}
+
+def quote(name):
+    """Quote an identifier for SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+def sources_frame(sources):
+    """Long (source, city, time_point, value) table of the raw source series.
+
+    Args:
+        sources (dict): Source name mapped to a dict of Series indexed by time point
+
+    Returns:
+        pd.DataFrame: One row per source, city and time point
+    """
+    frames = []
+    for source, data in sources.items():
+        for city, series in data.items():
+            frames.append(pd.DataFrame({'source': source, 'city': city,
+                                        'time_point': series.index.astype(str),
+                                        'value': series.to_numpy(dtype=float)}))
+    if not frames:
+        return pd.DataFrame({'source': [], 'city': [], 'time_point': [], 'value': []})
+    return pd.concat(frames, ignore_index=True)
+
+def write_store(path, tables, sources=None, crosswalk_file=None):
+    """Write the compiled tables, raw sources and crosswalk into a DuckDB file.
+
+    The file is built next to path and moved into place when complete, so
+    dashboards reading the previous version are never served a partial store.
+
+    Args:
+        path (str): DuckDB file to write
+        tables (dict): Table name ('city_data', 'yearly_growth', 'cagr', ...) mapped to its DataFrame
+        sources (dict): Source name mapped to the dict of city Series read from it
+        crosswalk_file (str): CSV mapping municipalities (geocode) to metropolitan zones, if present
+
+    Returns:
+        str: The data version of the stored panel
+    """
+    print(f"Writing DuckDB store {path}...")
+    frames = dict(tables)
+    if sources:
+        frames['raw_sources'] = sources_frame(sources)
+    if crosswalk_file and os.path.exists(crosswalk_file):
+        crosswalk = pd.read_csv(crosswalk_file, dtype={'geocode': str, 'ENTIDAD': str})
+        frames['crosswalk'] = crosswalk.drop(columns=[col for col in crosswalk.columns if col.startswith('Unnamed')])
+
+    version = frame_digest(tables['city_data'])[:16]
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    with duckdb.connect(temp_path) as con:
+        for name, frame in frames.items():
+            order = [col for col in TABLE_ORDER.get(name, ['city']) if col in frame.columns]
+            con.register('frame_view', frame)
+            order_by = f" ORDER BY {', '.join(map(quote, order))}" if order else ''
+            con.execute(f"CREATE TABLE {quote(name)} AS SELECT * FROM frame_view{order_by}")
+            con.unregister('frame_view')
+            print(f"  {name}: {len(frame)} rows")
+        con.execute("CREATE TABLE metadata (key VARCHAR, value VARCHAR)")
+        con.executemany("INSERT INTO metadata VALUES (?, ?)", [
+            ['data_version', version],
+            ['created', datetime.now().isoformat(timespec='seconds')]
+        ])
+        con.execute("CHECKPOINT")
+
+    os.replace(temp_path, path)
+    return version
+
+class PanelStore:
+    """Read-only queries over a DuckDB store written by write_store.
+
+    Every process and thread opens its own connection on first use, so the store
+    can be shared by the web server's threads and the background jobs it forks.
+
+    Attributes:
+        path (str): The DuckDB file
+        memory_limit (str): DuckDB memory limit per process, e.g. '256MB'
+    """
+
+    def __init__(self, path=STORE_FILE, memory_limit=STORE_MEMORY_LIMIT, threads=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"DuckDB store {path} not found; write it with mexico_city_data_compiler.py --store")
+        self.path = path
+        self.memory_limit = memory_limit
+        self.threads = threads
+        self._local = threading.local()
+        self._frames = {}
+        self._frames_lock = threading.Lock()
+
+    @property
+    def con(self):
+        """The connection of the current process and thread."""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            config = {'memory_limit': self.memory_limit}
+            if self.threads:
+                config['threads'] = self.threads
+            self._local.con = duckdb.connect(self.path, read_only=True, config=config)
+            self._local.pid = os.getpid()
+        return self._local.con
+
+    def query(self, sql, params=None):
+        """Run a query and return the result as a DataFrame (NULL becomes NaN)."""
+        return self.con.execute(sql, params or []).df()
+
+    @property
+    def version(self):
+        """Data version of the stored panel (frame_digest of city_data when it was written)."""
+        return self.con.execute("SELECT value FROM metadata WHERE key = 'data_version'").fetchone()[0]
+
+    def tables(self):
+        """Names of the stored tables."""
+        return [row[0] for row in self.con.execute("SHOW TABLES").fetchall()]
+
+    def table(self, name):
+        """A whole table, in its sort order."""
+        return self.query(f"SELECT * FROM {quote(name)} ORDER BY {', '.join(map(quote, TABLE_ORDER.get(name, ['city'])))}")
+
+    def frame(self, name):
+        """A whole table, read into memory once and shared by every object built from it (see StoreLoaded)."""
+        with self._frames_lock:
+            if name not in self._frames:
+                print(f"Reading {name} from {self.path}...")
+                self._frames[name] = self.table(name)
+            return self._frames[name]
+
+    def cities(self, table='city_data'):
+        return [row[0] for row in self.con.execute(f"SELECT DISTINCT city FROM {quote(table)} ORDER BY city").fetchall()]
+
+    def city(self, table, city):
+        """Rows of one city, in period order."""
+        order = ', '.join(map(quote, TABLE_ORDER.get(table, ['city'])))
+        return self.query(f"SELECT * FROM {quote(table)} WHERE city = ? ORDER BY {order}", [city])
+
+    def latest(self, table='city_data', city=None):
+        """The latest period of every city (or of one city), one row per city."""
+        periods = [col for col in TABLE_ORDER.get(table, []) if col != 'city']
+        latest_first = ', '.join(f"{quote(col)} DESC" for col in periods) or 'city'
+        where = "WHERE city = ?" if city is not None else ""
+        return self.query(f"""
+            SELECT * FROM {quote(table)} {where}
+            QUALIFY row_number() OVER (PARTITION BY city ORDER BY {latest_first}) = 1
+            ORDER BY city
+        """, [city] if city is not None else [])
+
+    def bands(self, metrics=TIME_SERIES_METRICS):
+        """Cross-city quantiles of each metric for every quarter, as calculate_time_series_bands returns them."""
+        bands = {}
+        for metric in metrics:
+            quantiles = ', '.join(f"quantile_cont({quote(metric)}, {q}) AS {name}" for name, q in BAND_QUANTILES.items())
+            bands[metric] = self.query(f"""
+                SELECT year, quarter, year || 'Q' || quarter AS time_point, {quantiles}
+                FROM city_data GROUP BY year, quarter ORDER BY year, quarter
+            """)
+        return bands
+
+    def years(self, table='city_data'):
+        """First and last year of a table."""
+        return self.con.execute(f"SELECT min(year), max(year) FROM {quote(table)}").fetchone()
+
+    def boxplot_stats(self, table='yearly_growth', value_col='population_growth'):
+        """Boxplot statistics of a metric for every year, as calculate_boxplot_stats returns them.
+
+        Returns:
+            tuple: (stats with year, q1, median, q3, lowerfence, upperfence and count;
+                outliers with the city, year and value of every point beyond the fences)
+        """
+        value = quote(value_col)
+        fenced = f"""
+            WITH stats AS (
+                SELECT year, quantile_cont({value}, 0.25) AS q1, quantile_cont({value}, 0.5) AS median,
+                       quantile_cont({value}, 0.75) AS q3, count({value}) AS count
+                FROM {quote(table)} WHERE {value} IS NOT NULL GROUP BY year
+            ), points AS (
+                SELECT city, year, {value} AS value,
+                       {value} BETWEEN q1 - 1.5 * (q3 - q1) AND q3 + 1.5 * (q3 - q1) AS inside
+                FROM {quote(table)} JOIN stats USING (year) WHERE {value} IS NOT NULL
+            )
+        """
+        stats = self.query(fenced + """
+            SELECT year, q1, median, q3, lowerfence, upperfence, count
+            FROM stats JOIN (
+                SELECT year, min(value) FILTER (WHERE inside) AS lowerfence, max(value) FILTER (WHERE inside) AS upperfence
+                FROM points GROUP BY year
+            ) USING (year) ORDER BY year
+        """)
+        outliers = self.query(fenced + f"SELECT city, year, value AS {value} FROM points WHERE NOT inside ORDER BY city, year")
+        return stats, outliers
+
+    def window_means(self, start_year, end_year, metrics=WINDOW_METRICS):
+        """Average of each metric's yearly averages over a window, one row per city, as PeriodAggregates.window_means."""
+        averages = ', '.join(f"avg({quote(metric)}) AS {quote(metric)}" for metric in metrics)
+        return self.query(f"""
+            WITH yearly AS (
+                SELECT city, year, {averages}
+                FROM city_data WHERE year BETWEEN ? AND ? GROUP BY city, year
+            ), means AS (
+                SELECT city, {averages} FROM yearly GROUP BY city
+            )
+            SELECT cities.city, {', '.join(f"means.{quote(metric)}" for metric in metrics)}
+            FROM (SELECT DISTINCT city FROM city_data) AS cities LEFT JOIN means USING (city)
+            ORDER BY cities.city
+        """, [start_year, end_year])
+
+    def cagr(self, start_year, end_year):
+        """CAGR of every city over any window, with the same columns and rules as calculate_cagr.
+
+        Yearly averages are taken over the window; cities need at least two years
+        in it, and growth is only computed from a positive first year.
+        """
+        years = end_year - start_year if end_year > start_year else 1
+        endpoints, rates = [], []
+        for metric, prefix in CAGR_PREFIXES.items():
+            endpoints += [f"first({quote(metric)} ORDER BY year) AS start_{prefix}",
+                          f"last({quote(metric)} ORDER BY year) AS end_{prefix}"]
+            rates.append(f"CASE WHEN start_{prefix} > 0 THEN (pow(end_{prefix} / start_{prefix}, 1.0 / {years}) - 1) * 100 "
+                         f"END AS {prefix}_cagr")
+        averages = ', '.join(f"avg({quote(metric)}) AS {quote(metric)}" for metric in CAGR_PREFIXES)
+        columns = ', '.join(f"start_{prefix}, end_{prefix}" for prefix in CAGR_PREFIXES.values())
+
+        return self.query(f"""
+            WITH yearly AS (
+                SELECT city, year, {averages}
+                FROM city_data WHERE year BETWEEN ? AND ? GROUP BY city, year
+            ), ends AS (
+                SELECT city, count(*) AS n_years, {', '.join(endpoints)}
+                FROM yearly GROUP BY city
+            )
+            SELECT city, ?::BIGINT AS start_year, ?::BIGINT AS end_year, {columns}, {years}::BIGINT AS years,
+                   {', '.join(rates)}
+            FROM ends WHERE n_years >= 2 ORDER BY city
+        """, [start_year, end_year, start_year, end_year])
+
+class StorePanel:
+    """A stored table with the interface of CityPanel, queried on every access.
+
+    Nothing is kept in memory: figures that need one city read that city's rows,
+    and only figures over all cities read the whole table.
+    """
+
+    def __init__(self, store, table):
+        self.store = store
+        self.table = table
+
+    @property
+    def frame(self):
+        return self.store.table(self.table)
+
+    @property
+    def latest(self):
+        return self.store.latest(self.table)
+
+    @property
+    def cities(self):
+        return self.store.cities(self.table)
+
+    def city(self, city):
+        return self.store.city(self.table, city)
+
+    def latest_city(self, city):
+        return self.store.latest(self.table, city)
+
+    @property
+    def columns(self):
+        return self.store.query(f"SELECT * FROM {quote(self.table)} LIMIT 0").columns
+
+    def __len__(self):
+        return self.store.con.execute(f"SELECT count(*) FROM {quote(self.table)}").fetchone()[0]
+
+    def built(self):
+        """Always true: a stored table needs no computing (it stands in for Forecasts)."""
+        return True
+
+class StoreAggregates:
+    """Window means and CAGR over any window, computed by the store (the methods of PeriodAggregates)."""
+
+    def __init__(self, store):
+        self.store = store
+        self.cities = store.cities()
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        first_year, last_year = store.years()
+        self.years = np.arange(first_year, last_year + 1)
+
+    def window_means(self, start_year, end_year):
+        return self.store.window_means(start_year, end_year)
+
+    def cagr(self, start_year, end_year):
+        return self.store.cagr(start_year, end_year)
+
+class StoreQuadrants(QuadrantCube):
+    """Diagnostic quadrants of any window, classified from the store's CAGR.
+
+    Has the frame, counts and cities_in methods of QuadrantCube, but classifies
+    one window per call instead of holding the cube of every window.
+    """
+
+    def __init__(self, store, measures=QUADRANT_MEASURES):
+        self.store = store
+        self.cities = store.cities()
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self.measures = list(measures)
+
+    def window(self, start_year, end_year):
+        cagr = self.store.cagr(start_year, end_year).set_index('city').reindex(self.cities)
+        population = cagr['population_cagr'].to_numpy(dtype=float)[:, np.newaxis]
+        wages = cagr[[f'{CAGR_PREFIXES[measure]}_cagr' for measure in self.measures]].to_numpy(dtype=float)
+        return classify(population, wages)
+
+class StoreGeography(GeographyCube):
+    """The geography rollups written by the compiler, queried one series at a time.
+
+    Has the parent, series and compare methods of GeographyCube without
+    holding the cube in memory.
+    """
+
+    def __init__(self, store, geography, shf_levels=None, crosswalk=None):
+        """Index the stored geographies and place the cities in the hierarchy.
+
+        Args:
+            store (PanelStore): Store with a 'geography' table
+            geography (pd.DataFrame): city_geography result
+            shf_levels (pd.DataFrame): read_shf_levels result, if available
+            crosswalk (pd.DataFrame): read_crosswalk result, if available
+        """
+        self.store = store
+        self.keys = [tuple(row) for row in store.con.execute(
+            "SELECT DISTINCT level, geography FROM geography ORDER BY level, geography").fetchall()]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.parents = self._parents(geography, shf_levels, crosswalk)
+
+    def series(self, level, geography, metric):
+        if (level, geography) not in self.index:
+            return None
+        return self.store.query(f"""
+            SELECT year, quarter, time_point, {quote(metric)} FROM geography
+            WHERE level = ? AND geography = ? ORDER BY year, quarter
+        """, [level, geography])
+
+class StoreLoaded:
+    """An in-memory table object built from whole stored tables when it is first used.
+
+    Stands in for what the store can't compute by query (bootstrap intervals,
+    regressions, peers, deflators): nothing is read until a figure needs the
+    object, and each table is read once for all of them (see PanelStore.frame).
+    """
+
+    def __init__(self, store, build, *tables):
+        """
+        Args:
+            store (PanelStore): The store
+            build (callable): Builds the object from the tables, in order
+            tables (str): Names of the stored tables it is built from
+        """
+        self.store = store
+        self.build = build
+        self.tables = tables
+        self._value = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only reached for attributes of the built object
+        with self._lock:
+            if self._value is None:
+                self._value = self.build(*[self.store.frame(table) for table in self.tables])
+        return getattr(self._value, name)
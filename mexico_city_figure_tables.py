@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Figure Tables
+This module loads the tables the dashboard figures are drawn from (the panel,
+the yearly growth table, the CAGR prefix sums, the boxplot statistics and the
+quantile bands) without building the Dash app, for scripts that draw the same
+figures elsewhere such as mexico_city_static_report.py.
+"""
+
+import os
+import re
+import pandas as pd
+
+from mexico_city_data_compiler import (
+    EMPLOYMENT_RATE_FILE, HOURLY_SALARY_FILE, HOUSING_COST_FILE, POPULATION_FILE, CityPanel, PeriodAggregates,
+    calculate_boxplot_stats, calculate_growth_rates, calculate_time_series_bands, compile_data, read_excel_html_table,
+    read_housing_cost
+)
+
+# Panel saved by mexico_city_data_compiler.py
+COMPILED_PANEL_FILE = "city_data_compiled.csv"
+
+# Default CAGR window of the figures
+START_YEAR = 2015
+END_YEAR = 2020
+
+def parse_period(period):
+    """Parse a 'START-END' string into a (start_year, end_year) tuple."""
+    start, end = period.split('-')
+    return int(start), int(end)
+
+def city_slug(city):
+    """Return a filesystem-friendly directory name for a city."""
+    return re.sub(r'[^\w]+', '_', city).strip('_')
+
+def load_city_data(panel_file=COMPILED_PANEL_FILE):
+    """Read the compiled panel, or compile it from the source files if it hasn't been saved.
+
+    Args:
+        panel_file (str): CSV written by mexico_city_data_compiler.py
+
+    Returns:
+        pd.DataFrame: Combined dataset with all metrics
+    """
+    if os.path.exists(panel_file):
+        print(f"Reading compiled data from {panel_file}...")
+        return pd.read_csv(panel_file, encoding='utf-8')
+
+    print(f"{panel_file} not found; compiling the source files...")
+    employment_data, time_points = read_excel_html_table(EMPLOYMENT_RATE_FILE)
+    salary_data, _ = read_excel_html_table(HOURLY_SALARY_FILE)
+    population_data, _ = read_excel_html_table(POPULATION_FILE)
+    housing_cost_data = read_housing_cost(HOUSING_COST_FILE)
+    return compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points)
+
+class FigureTables:
+    """The tables of the dashboard's default view, loaded without the dashboard.
+
+    Attributes:
+        city_panel (CityPanel): Quarterly panel (or StorePanel over a DuckDB store)
+        yearly_panel (CityPanel): Yearly averages and growth rates
+        period_aggregates (PeriodAggregates): Prefix sums serving CAGR for any window
+        cities (list): Cities of the panel
+        start_year (int): First year of the default CAGR window
+        end_year (int): Last year of the default CAGR window
+        population_growth_box_stats (pd.DataFrame): Boxplot statistics of population growth by year
+        population_growth_outliers (pd.DataFrame): Population growth outliers by year
+        time_series_bands (dict): Metric mapped to its cross-city quantile bands per quarter
+    """
+
+    def __init__(self, store_file=None, panel_file=COMPILED_PANEL_FILE, start_year=START_YEAR, end_year=END_YEAR):
+        """Load the tables from a DuckDB store, or from the compiled panel.
+
+        Args:
+            store_file (str): DuckDB file written by the compiler's --store, or None
+                to read panel_file (compiling the source files if it is missing)
+            panel_file (str): CSV written by mexico_city_data_compiler.py
+            start_year (int): First year of the default CAGR window
+            end_year (int): Last year of the default CAGR window
+        """
+        self.start_year = start_year
+        self.end_year = end_year
+        if store_file:
+            # duckdb is optional, so the store module is only imported when it is used
+            from mexico_city_duckdb import PanelStore, StoreAggregates, StorePanel
+            print(f"Using compiled data from {store_file}...")
+            store = PanelStore(store_file)
+            self.city_panel = StorePanel(store, 'city_data')
+            self.yearly_panel = StorePanel(store, 'yearly_growth')
+            self.period_aggregates = StoreAggregates(store)
+            self.population_growth_box_stats, self.population_growth_outliers = store.boxplot_stats(
+                'yearly_growth', 'population_growth')
+            self.time_series_bands = store.bands()
+        else:
+            city_data = load_city_data(panel_file)
+            yearly_data = calculate_growth_rates(city_data)
+            self.city_panel = CityPanel(city_data, ['year', 'quarter'])
+            self.yearly_panel = CityPanel(yearly_data, ['year'])
+            self.period_aggregates = PeriodAggregates(city_data)
+            self.population_growth_box_stats, self.population_growth_outliers = calculate_boxplot_stats(
+                yearly_data, 'population_growth')
+            self.time_series_bands = calculate_time_series_bands(city_data)
+        self.cities = self.period_aggregates.cities
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Forecasts
+This module nowcasts the quarters between each series' last observation and
+the end of the panel, and forecasts the following quarters, for every city x
+metric series with additive Holt-Winters exponential smoothing (level, trend and
+quarterly seasonality) on the log scale. All series are stacked into one
+(series x quarters) array and smoothed together, for a grid of smoothing
+parameters at once, looping only over quarters; each series keeps the
+parameters with the smallest one-step-ahead error. Forecasts come with
+prediction intervals and are cached like the other derived tables.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+from mexico_city_cache import MISSING, memoize
+from mexico_city_data_compiler import CityPanel
+
+FORECAST_METRICS = ['employment_rate', 'monthly_salary', 'population', 'housing_index', 'real_wage']
+FORECAST_HORIZON = 8
+FORECAST_CONFIDENCE = 0.90
+FORECAST_FILE = "city_data_forecasts.csv"
+
+SEASON_LENGTH = 4
+
+# Series with fewer observations are not forecast
+MIN_OBSERVATIONS = 2 * SEASON_LENGTH
+
+# Smoothing parameters searched for every series (error-correction form:
+# level += alpha * error, trend += beta * error, season += gamma * error)
+ALPHAS = [0.1, 0.3, 0.5, 0.7, 0.9]
+BETAS = [0.0, 0.02, 0.05, 0.1, 0.2]
+GAMMAS = [0.0, 0.1, 0.2, 0.3]
+
+# Below this many series the smoothing runs in the calling process
+POOL_MIN_SERIES = 2000
+
+def parameter_grid(alphas=ALPHAS, betas=BETAS, gammas=GAMMAS):
+    """Admissible (alpha, beta, gamma) combinations, as three arrays.
+
+    The trend and seasonal gains are kept within the level gain's bounds
+    (beta <= alpha, gamma <= 1 - alpha), which keeps the smoothing stable.
+    """
+    grid = [(alpha, beta, gamma) for alpha in alphas for beta in betas for gamma in gammas
+            if beta <= alpha and gamma <= 1 - alpha]
+    return tuple(np.array(values) for values in zip(*grid))
+
+def smooth_block(values, quarters, horizon, confidence):
+    """Fit Holt-Winters smoothing to a block of series and forecast past their last observation.
+
+    Args:
+        values (np.ndarray): Array of shape (series, quarters) on a regular quarterly
+            grid, NaN for missing values
+        quarters (np.ndarray): Quarter number (1-4) of every column
+        horizon (int): Quarters to forecast past the last column
+        confidence (float): Coverage of the prediction intervals
+
+    Returns:
+        tuple: (point, low, high), each of shape (series, quarters + horizon), set
+            from the quarter after each series' last observation onwards and NaN
+            elsewhere (and for series with too few observations)
+    """
+    n_series, n_quarters = values.shape
+    alpha, beta, gamma = [param[:, np.newaxis] for param in parameter_grid()]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = np.where(values > 0, np.log(values), np.nan)
+
+    # State of every (parameter set, series), NaN until the series' first observation
+    shape = (len(alpha), n_series)
+    level = np.full(shape, np.nan)
+    trend = np.zeros(shape)
+    season = np.zeros(shape + (SEASON_LENGTH,))
+    sse = np.zeros(shape)
+    errors = np.zeros(n_series)
+    seen = np.zeros(n_series)
+    last = np.full(n_series, -1)
+
+    for t in range(n_quarters):
+        obs = observed[:, t]
+        q = quarters[t] - 1
+        valid = ~np.isnan(obs)
+        started = ~np.isnan(level[0])
+
+        update = started & valid
+        error = np.where(update, obs - (level + trend + season[:, :, q]), 0.0)
+
+        # One-step errors count once the first year has seeded the seasonal states
+        scored = update & (seen >= SEASON_LENGTH)
+        sse += np.where(scored, error ** 2, 0.0)
+        errors += scored
+
+        level = np.where(started, level + trend + alpha * error, np.where(valid, obs, np.nan))
+        trend = trend + beta * error
+        season[:, :, q] += gamma * error
+        seen += valid
+        last = np.where(valid, t, last)
+
+    # Parameters with the smallest one-step mean squared error of each series
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mse = sse / errors
+    best = np.argmin(np.where(np.isnan(mse), np.inf, mse), axis=0)
+    series = np.arange(n_series)
+    level, trend, season = level[best, series], trend[best, series], season[best, series]
+    alpha, beta, gamma, sigma2 = alpha[best, 0], beta[best, 0], gamma[best, 0], mse[best, series]
+
+    # The state was carried to the end of the panel through the missing quarters, so every
+    # column is reached from it; the error variance grows with the steps since the last observation
+    total = n_quarters + horizon
+    ahead = np.arange(total) - (n_quarters - 1)
+    steps = np.arange(total)[np.newaxis, :] - last[:, np.newaxis]
+    future_quarters = np.concatenate([quarters, (quarters[-1] + np.arange(horizon)) % SEASON_LENGTH + 1])
+    point = level[:, np.newaxis] + ahead[np.newaxis, :] * trend[:, np.newaxis] + season[:, future_quarters - 1]
+
+    # Variance of the h-step error of additive Holt-Winters:
+    # sigma2 * (1 + sum over j < h of (alpha + beta * j + gamma * [j is a multiple of the season])^2)
+    j = np.arange(1, total)[np.newaxis, :]
+    gains = (alpha[:, np.newaxis] + beta[:, np.newaxis] * j + gamma[:, np.newaxis] * (j % SEASON_LENGTH == 0)) ** 2
+    cumulative = np.hstack([np.zeros((n_series, 1)), np.cumsum(gains, axis=1)])
+    index = np.clip(steps - 1, 0, total - 1)
+    variance = sigma2[:, np.newaxis] * (1 + np.take_along_axis(cumulative, index, axis=1))
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    usable = (seen >= MIN_OBSERVATIONS)[:, np.newaxis] & (steps >= 1) & ~np.isnan(variance)
+    with np.errstate(over='ignore', invalid='ignore'):
+        margin = z * np.sqrt(variance)
+        return tuple(np.where(usable, np.exp(log_values), np.nan)
+                     for log_values in (point, point - margin, point + margin))
+
+def smooth_series(values, quarters, horizon=FORECAST_HORIZON, confidence=FORECAST_CONFIDENCE, workers=None):
+    """Forecast many series at once, in blocks across a process pool.
+
+    Args:
+        values (np.ndarray): Array of shape (series, quarters)
+        quarters (np.ndarray): Quarter number (1-4) of every column
+        horizon (int): Quarters to forecast past the last column
+        confidence (float): Coverage of the prediction intervals
+        workers (int): Number of processes; None uses one process for small
+            inputs and the number of CPUs otherwise
+
+    Returns:
+        tuple: (point, low, high) as returned by smooth_block
+    """
+    if workers is None:
+        workers = 1 if len(values) < POOL_MIN_SERIES else os.cpu_count()
+    if workers <= 1:
+        return smooth_block(values, quarters, horizon, confidence)
+
+    blocks = np.array_split(values, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(smooth_block, blocks, [quarters] * len(blocks), [horizon] * len(blocks),
+                                    [confidence] * len(blocks)))
+    return tuple(np.vstack([result[k] for result in results]) for k in range(3))
+
+@memoize
+def forecast_panel(city_data, metrics=FORECAST_METRICS, horizon=FORECAST_HORIZON, confidence=FORECAST_CONFIDENCE,
+                   workers=None):
+    """Nowcast and forecast every city's quarterly series.
+
+    Args:
+        city_data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Quarterly metrics to forecast
+        horizon (int): Quarters to forecast past the end of the panel
+        confidence (float): Coverage of the prediction intervals
+        workers (int): Number of processes for the smoothing
+
+    Returns:
+        pd.DataFrame: One row per city and quarter after the city's last
+            observation of some metric: city, year, quarter, time_point, kind
+            ('nowcast' within the panel's quarters, 'forecast' after them) and
+            '<metric>', '<metric>_low' and '<metric>_high' for every metric
+    """
+    metrics = [metric for metric in metrics if metric in city_data.columns]
+    print(f"Forecasting {len(metrics)} metrics for {city_data['city'].nunique()} cities, {horizon} quarters ahead...")
+
+    # Stack every city x metric series into one (series x quarters) array on a regular quarterly grid
+    wide = city_data.pivot_table(index='city', columns=['year', 'quarter'], values=metrics, aggfunc='mean', dropna=False)
+    period_keys = city_data['year'].astype(int) * SEASON_LENGTH + city_data['quarter'].astype(int) - 1
+    grid = np.arange(period_keys.min(), period_keys.max() + horizon + 1)
+    n_quarters = len(grid) - horizon
+    years, quarters = grid // SEASON_LENGTH, grid % SEASON_LENGTH + 1
+    panel_periods = pd.MultiIndex.from_arrays([years[:n_quarters], quarters[:n_quarters]])
+    cities = wide.index
+    values = np.vstack([wide[metric].reindex(columns=panel_periods).to_numpy(dtype=float) for metric in metrics])
+
+    point, low, high = smooth_series(values, quarters[:n_quarters], horizon, confidence, workers)
+
+    # Back to long format, keeping the quarters with any forecast
+    n_cities = len(cities)
+    result = pd.DataFrame({
+        'city': np.repeat(cities.to_numpy(), len(grid)),
+        'year': np.tile(years, n_cities),
+        'quarter': np.tile(quarters, n_cities),
+        'kind': np.tile(np.where(np.arange(len(grid)) < n_quarters, 'nowcast', 'forecast'), n_cities)
+    })
+    result.insert(3, 'time_point', result['year'].astype(str) + 'Q' + result['quarter'].astype(str))
+    for k, metric in enumerate(metrics):
+        block = slice(k * n_cities, (k + 1) * n_cities)
+        result[metric] = point[block].ravel()
+        result[f'{metric}_low'] = low[block].ravel()
+        result[f'{metric}_high'] = high[block].ravel()
+
+    result = result[result[metrics].notna().any(axis=1)].reset_index(drop=True)
+    print(f"Created forecasts dataframe with {len(result)} rows")
+    return result
+
+class Forecasts:
+    """Forecasts of one panel with the interface of CityPanel, computed on first use and cached.
+
+    Attributes:
+        data (pd.DataFrame): The panel
+        confidence (float): Coverage of the prediction intervals
+    """
+
+    def __init__(self, data, confidence=FORECAST_CONFIDENCE):
+        self.data = data
+        self.confidence = confidence
+        self._panel = None
+
+    @property
+    def panel(self):
+        """The forecasts as a CityPanel."""
+        if self._panel is None:
+            self._panel = CityPanel(forecast_panel(self.data, FORECAST_METRICS, FORECAST_HORIZON, self.confidence),
+                                    ['year', 'quarter'])
+        return self._panel
+
+    def built(self):
+        """Whether the forecasts are computed, here or in the metrics cache, without computing them."""
+        if self._panel is None:
+            forecasts = forecast_panel.cached(self.data, FORECAST_METRICS, FORECAST_HORIZON, self.confidence)
+            if forecasts is MISSING:
+                return False
+            self._panel = CityPanel(forecasts, ['year', 'quarter'])
+        return True
+
+    @property
+    def frame(self):
+        return self.panel.frame
+
+    def city(self, city):
+        """Forecast rows of one city, in time order."""
+        return self.panel.city(city)
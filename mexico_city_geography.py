@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Geography Hierarchy
+This module places every city of the panel in the geography hierarchy
+(municipality -> metropolitan zone -> state -> national) with the crosswalk in
+zona_metropolitana2.csv, and pre-aggregates every metric at every level for
+every quarter: employment rate, wages and housing costs are averaged over the
+cities of a state or of the country weighted by population, and population is
+summed. SHF's own housing price index is added at every level it publishes
+(municipal, metro zone, state and national rows). Figures compare a city with
+its state or the nation by lookup instead of aggregating the whole panel.
+"""
+
+import os
+import unicodedata
+import numpy as np
+import pandas as pd
+
+from mexico_city_cache import memoize_file
+from mexico_city_data_compiler import CROSSWALK_FILE, HOUSING_COST_FILE
+
+# Levels of the hierarchy, finest first; the cities of the panel are metro zones
+LEVELS = ['municipality', 'metro', 'state', 'national']
+NATIONAL = "Nacional"
+
+# Averaged over the cities of a state or the country, weighted by population
+WEIGHTED_METRICS = ['employment_rate', 'hourly_salary', 'monthly_salary', 'real_wage', 'housing_index']
+# Summed over the cities of a state or the country
+SUMMED_METRICS = ['population']
+# SHF housing price index published for the geography itself
+SHF_METRIC = 'shf_housing_index'
+
+# Official state names of the crosswalk that SHF publishes under a short name
+STATE_NAMES = {
+    'Coahuila de Zaragoza': 'Coahuila',
+    'Michoacán de Ocampo': 'Michoacán',
+    'Querétaro de Arteaga': 'Querétaro',
+    'Veracruz de Ignacio de la Llave': 'Veracruz'
+}
+
+# Cities whose metropolitan zone can't be found by name, with their zone and state
+CITY_ZONES = {
+    'Ciudad de México': ('Valle de Mexico', 'Ciudad de México'),
+    'Ciudad Juárez': ('Juarez', 'Chihuahua')
+}
+
+# SHF metro zone rows named differently from the panel's cities (as in read_housing_cost)
+SHF_ZONES = {'Valle México': 'Ciudad de México', 'PueblaTlax': 'Ciudad de Puebla'}
+
+def plain(name):
+    """Lowercase name without accents, with inverted articles restored ('Paz, La' -> 'la paz')."""
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii').lower().strip()
+    if ', ' in name:
+        name, article = name.split(', ', 1)
+        name = f"{article} {name}"
+    return name
+
+def city_name(city):
+    """Plain name of a city without its 'Ciudad de' prefix."""
+    name = plain(city)
+    for prefix in ['ciudad de ', 'ciudad del ', 'ciudad ']:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+def read_crosswalk(file_path=CROSSWALK_FILE):
+    """Read the municipality to metropolitan zone crosswalk.
+
+    Returns:
+        pd.DataFrame: geocode, zone_code, zone, municipality and state (SHF's state names)
+    """
+    crosswalk = pd.read_csv(file_path, dtype={'geocode': str, 'ENTIDAD': str})
+    crosswalk = crosswalk.rename(columns={'codeZM': 'zone_code', 'ZM': 'zone', 'nombre_municipio': 'municipality',
+                                          'nombre_entidad': 'state'})
+    crosswalk['state'] = crosswalk['state'].replace(STATE_NAMES)
+    return crosswalk[['geocode', 'zone_code', 'zone', 'municipality', 'state']]
+
+@memoize_file
+def read_shf_levels(file_path):
+    """Read SHF's housing price index at every geography level it publishes.
+
+    The national series, the metro zone ('ZM ...'), state and municipal rows are
+    kept; national sub-indices by housing type ('Nueva', 'Usada', ...) are not.
+
+    Returns:
+        pd.DataFrame: level, geography, state, year, quarter and shf_housing_index
+    """
+    data = pd.read_csv(file_path, sep=';', encoding='latin-1', decimal=',')
+    data = data.rename(columns={data.columns[5]: 'year', 'Trimestre': 'quarter', 'Indice': SHF_METRIC})
+    state = data['Estado'].str.strip()
+    municipality = data['Municipio'].str.strip()
+    zone = data['Global'].str.extract(r'^ZM (.+)$', expand=False)
+
+    data['level'] = np.select(
+        [data['Global'] == NATIONAL, zone.notna(), state.notna() & municipality.isna(), municipality.notna()],
+        ['national', 'metro', 'state', 'municipality'], default='')
+    data['geography'] = np.select(
+        [data['level'] == 'national', data['level'] == 'metro', data['level'] == 'state'],
+        [NATIONAL, zone.map(lambda name: SHF_ZONES.get(name, f"Ciudad de {name}")), state],
+        default=municipality + ', ' + state)
+    data['state'] = state
+    return data.loc[data['level'] != '', ['level', 'geography', 'state', 'year', 'quarter', SHF_METRIC]]
+
+def city_geography(cities, crosswalk=None):
+    """Find the metropolitan zone and state of every city.
+
+    A city is matched to a zone of the same name, else to the municipality of the
+    same name (or starting with it, e.g. 'Oaxaca de Juárez'); among several
+    matches the zone with most municipalities wins. Cities that aren't matched
+    (or every city without a crosswalk) only roll up into the national level.
+
+    Args:
+        cities (list): City names of the panel
+        crosswalk (pd.DataFrame): read_crosswalk result, or None
+
+    Returns:
+        pd.DataFrame: city, zone_code, zone and state of every city
+    """
+    if crosswalk is None:
+        return pd.DataFrame({'city': list(cities), 'zone_code': np.nan, 'zone': None, 'state': None})
+
+    rows = []
+    zone_sizes = crosswalk['zone_code'].map(crosswalk['zone_code'].value_counts())
+    zones, municipalities = crosswalk['zone'].map(plain), crosswalk['municipality'].map(plain)
+    for city in cities:
+        name = city_name(city)
+        if city in CITY_ZONES:
+            zone, state = CITY_ZONES[city]
+            members = crosswalk[crosswalk['zone'] == zone]
+            rows.append({'city': city, 'zone_code': members['zone_code'].iloc[0], 'zone': zone, 'state': state})
+            continue
+
+        candidates = crosswalk.iloc[0:0]
+        for matches in [zones == name, municipalities == name, municipalities.str.startswith(name + ' ')]:
+            if matches.any():
+                candidates = crosswalk[matches & (zone_sizes == zone_sizes[matches].max())]
+                break
+        if candidates.empty:
+            rows.append({'city': city, 'zone_code': np.nan, 'zone': None, 'state': None})
+            continue
+
+        # The state of the zone's municipality named like the city, else the zone's main state
+        members = crosswalk[crosswalk['zone_code'] == candidates['zone_code'].iloc[0]]
+        member_names = members['municipality'].map(plain)
+        named = members[(member_names == name) | member_names.str.startswith(name + ' ')]
+        state = (named if not named.empty else members)['state'].mode().iloc[0]
+        rows.append({'city': city, 'zone_code': members['zone_code'].iloc[0], 'zone': members['zone'].iloc[0],
+                     'state': state})
+    return pd.DataFrame(rows, columns=['city', 'zone_code', 'zone', 'state'])
+
+def load_geography(cities, crosswalk_file=CROSSWALK_FILE, shf_file=HOUSING_COST_FILE):
+    """Place the cities in the hierarchy and read SHF's index levels, skipping missing files.
+
+    Returns:
+        tuple: (city_geography result, read_shf_levels result or None, read_crosswalk result or None)
+    """
+    crosswalk = None
+    if os.path.exists(crosswalk_file):
+        crosswalk = read_crosswalk(crosswalk_file)
+    else:
+        print(f"Crosswalk {crosswalk_file} not found; cities only roll up to the national level")
+
+    shf_levels = None
+    if os.path.exists(shf_file):
+        try:
+            shf_levels = read_shf_levels(shf_file)
+        except Exception as e:
+            print(f"Error reading SHF index levels from {shf_file}: {str(e)}")
+    return city_geography(cities, crosswalk), shf_levels, crosswalk
+
+def rollup(panel, group):
+    """Population-weighted averages and population totals of the panel's cities per group and quarter."""
+    weights = panel['population'] if 'population' in panel.columns else pd.Series(np.nan, index=panel.index)
+    parts = panel[group + ['year', 'quarter']].copy()
+    weighted = [metric for metric in WEIGHTED_METRICS if metric in panel.columns]
+    for metric in weighted:
+        valid = panel[metric].notna() & weights.notna()
+        parts[f'{metric}__wx'] = (panel[metric] * weights).where(valid)
+        parts[f'{metric}__w'] = weights.where(valid)
+    for metric in SUMMED_METRICS:
+        if metric in panel.columns:
+            parts[metric] = panel[metric]
+
+    sums = parts.groupby(group + ['year', 'quarter']).sum(min_count=1)
+    result = sums[[metric for metric in SUMMED_METRICS if metric in sums.columns]].copy()
+    for metric in weighted:
+        result[metric] = sums[f'{metric}__wx'] / sums[f'{metric}__w']
+    return result.reset_index()
+
+class GeographyCube:
+    """Every metric of every geography in the hierarchy for every quarter.
+
+    Attributes:
+        keys (list): (level, geography) on the first axis, by level then name
+        periods (list): (year, quarter) on the second axis, in time order
+        metrics (list): Metrics on the last axis
+        values (np.ndarray): shape (geographies, periods, metrics), NaN where a level lacks a metric
+        parents (dict): (level, geography) mapped to its geography at each coarser level
+    """
+
+    def __init__(self, data, geography, shf_levels=None, crosswalk=None):
+        """Roll the panel up the hierarchy and index every level as one array.
+
+        Args:
+            data (pd.DataFrame): City panel, one metro zone per city
+            geography (pd.DataFrame): city_geography result
+            shf_levels (pd.DataFrame): read_shf_levels result, if available
+            crosswalk (pd.DataFrame): read_crosswalk result, to place SHF's municipalities in their zones
+        """
+        self.metrics = [metric for metric in SUMMED_METRICS + WEIGHTED_METRICS if metric in data.columns] + [SHF_METRIC]
+        panel = data.merge(geography[['city', 'state']], on='city', how='left')
+
+        metro = panel[['city', 'year', 'quarter'] + self.metrics[:-1]].rename(columns={'city': 'geography'})
+        state = rollup(panel[panel['state'].notna()], ['state']).rename(columns={'state': 'geography'})
+        national = rollup(panel.assign(geography=NATIONAL), ['geography'])
+        levels = [metro.assign(level='metro'), state.assign(level='state'), national.assign(level='national')]
+        if shf_levels is not None:
+            levels.append(shf_levels[['level', 'geography', 'year', 'quarter', SHF_METRIC]])
+
+        # SHF rows of a geography share its row with the rolled-up metrics
+        long = pd.concat(levels, ignore_index=True).groupby(['level', 'geography', 'year', 'quarter']).first()
+        long = long.reindex(columns=self.metrics)
+
+        level_order = {level: k for k, level in enumerate(LEVELS)}
+        self.keys = sorted(set(zip(long.index.get_level_values('level'), long.index.get_level_values('geography'))),
+                           key=lambda key: (level_order[key[0]], key[1]))
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.periods = sorted(set(zip(long.index.get_level_values('year'), long.index.get_level_values('quarter'))))
+
+        grid = pd.MultiIndex.from_tuples([key + period for key in self.keys for period in self.periods],
+                                         names=['level', 'geography', 'year', 'quarter'])
+        self.values = long.reindex(grid).to_numpy(dtype=float).reshape(len(self.keys), len(self.periods),
+                                                                        len(self.metrics))
+
+        self.parents = self._parents(geography, shf_levels, crosswalk)
+
+    def _parents(self, geography, shf_levels, crosswalk):
+        parents = {('state', name): {'national': NATIONAL} for level, name in self.keys if level == 'state'}
+        for row in geography.itertuples():
+            parents[('metro', row.city)] = {'state': row.state if pd.notna(row.state) else None, 'national': NATIONAL}
+        if shf_levels is None:
+            return parents
+
+        # SHF municipalities belong to the city of their zone, if it is in the panel
+        zone_cities = dict(zip(geography['zone_code'], geography['city']))
+        zone_codes = {}
+        if crosswalk is not None:
+            zone_codes = dict(zip(zip(crosswalk['state'], crosswalk['municipality'].map(plain)), crosswalk['zone_code']))
+        municipalities = shf_levels[shf_levels['level'] == 'municipality'].drop_duplicates('geography')
+        for row in municipalities.itertuples():
+            name = plain(row.geography.rsplit(', ', 1)[0])
+            parents[('municipality', row.geography)] = {
+                'metro': zone_cities.get(zone_codes.get((row.state, name))),
+                'state': row.state,
+                'national': NATIONAL
+            }
+        return parents
+
+    @property
+    def time_points(self):
+        return [f"{year}Q{quarter}" for year, quarter in self.periods]
+
+    def geographies(self, level):
+        """Names of the geographies of one level."""
+        return [name for key_level, name in self.keys if key_level == level]
+
+    def parent(self, level, geography, parent_level):
+        """The geography containing another one at a coarser level (None if unknown)."""
+        return self.parents.get((level, geography), {}).get(parent_level)
+
+    def series(self, level, geography, metric):
+        """Quarterly values of one metric for one geography.
+
+        Returns:
+            pd.DataFrame: year, quarter, time_point and the metric, in time order
+                (None if the geography is unknown)
+        """
+        if (level, geography) not in self.index:
+            return None
+        values = self.values[self.index[(level, geography)], :, self.metrics.index(metric)]
+        return pd.DataFrame({
+            'year': [year for year, _ in self.periods],
+            'quarter': [quarter for _, quarter in self.periods],
+            'time_point': self.time_points,
+            metric: values
+        })
+
+    def compare(self, city, metric, levels=('state', 'national')):
+        """A city's quarterly values next to those of the geographies containing it.
+
+        Returns:
+            pd.DataFrame: year, quarter, time_point, 'city' and one column per level found
+                (None if the city is unknown)
+        """
+        frame = self.series('metro', city, metric)
+        if frame is None:
+            return None
+        frame = frame.rename(columns={metric: 'city'})
+        for level in levels:
+            name = self.parent('metro', city, level)
+            reference = self.series(level, name, metric) if name is not None else None
+            if reference is not None:
+                frame = frame.merge(reference.rename(columns={metric: level}), on=['year', 'quarter', 'time_point'],
+                                    how='left')
+        return frame
+
+    def frame(self, level=None):
+        """Long table of the cube (one level or all), without quarters lacking every metric.
+
+        Returns:
+            pd.DataFrame: level, geography, year, quarter, time_point and one column per metric
+        """
+        keys = [k for k, key in enumerate(self.keys) if level is None or key[0] == level]
+        values = self.values[keys].reshape(-1, len(self.metrics))
+        frame = pd.DataFrame({
+            'level': np.repeat([self.keys[k][0] for k in keys], len(self.periods)),
+            'geography': np.repeat([self.keys[k][1] for k in keys], len(self.periods)),
+            'year': np.tile([year for year, _ in self.periods], len(keys)),
+            'quarter': np.tile([quarter for _, quarter in self.periods], len(keys)),
+            'time_point': np.tile(self.time_points, len(keys))
+        })
+        frame[self.metrics] = values
+        return frame[~np.isnan(values).all(axis=1)].reset_index(drop=True)
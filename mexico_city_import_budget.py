@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Import-Time Budget
+This module measures how long the compiler, the dashboard and the figure tables
+take to import, with python -X importtime in a fresh interpreter, and checks the
+result against the snapshot in import_budget.json. It also checks that heavy
+dependencies only used on some paths (matplotlib, bs4, plotly.express) are not
+imported at startup.
+Run it after changing imports; it exits with an error on a regression.
+test_import_budget.py runs the same checks under pytest.
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+BUDGET_FILE = "import_budget.json"
+
+# Measured time may exceed the snapshot by this factor before it counts as a regression
+TOLERANCE = 1.5
+
+# Modules that must not be imported by just importing each module
+FORBIDDEN_IMPORTS = {
+    'mexico_city_data_compiler': ['bs4', 'matplotlib', 'plotly', 'dash', 'polars', 'duckdb'],
+    'mexico_city_dashboard': ['bs4', 'matplotlib', 'plotly.express', 'plotly.offline', 'polars', 'duckdb'],
+    # Loads the figures' tables for scripts that must not build the Dash app
+    'mexico_city_figure_tables': ['bs4', 'matplotlib', 'plotly', 'dash', 'polars', 'duckdb']
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def measure_import(module, directory=None):
+    """Import a module in a fresh interpreter and parse its -X importtime report.
+
+    Args:
+        module (str): Module to import
+        directory (str): Directory to run from (the module's data files are looked up there)
+
+    Returns:
+        tuple: (cumulative import time of the module in ms, set of all imported modules)
+    """
+    directory = directory or os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                  os.environ.get('PYTHONPATH')])))
+    code = f"import sys; sys.argv = [sys.argv[0]]; import {module}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=directory, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    imported = set()
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        imported.add(match.group(4))
+        if match.group(4) == module and len(match.group(3)) == 1:
+            total = int(match.group(2)) / 1000
+    return total, imported
+
+def forbidden_imports(module, imported):
+    """The modules of FORBIDDEN_IMPORTS that importing module loaded."""
+    return [forbidden for forbidden in FORBIDDEN_IMPORTS.get(module, []) if forbidden in imported]
+
+def check_budget(budget, repeats=3, tolerance=TOLERANCE, directory=None):
+    """Measure every budgeted module and compare it with its snapshot.
+
+    The fastest of the repeats is compared, since the first import of a run is
+    slowed by cold disk and parse caches and the others by whatever else the
+    machine is doing. Forbidden imports are always checked.
+
+    Args:
+        budget (dict): Module name mapped to its snapshot import time in ms
+        repeats (int): Imports per module; the fastest is compared
+        tolerance (float): Allowed ratio of measured to snapshot time, None to only measure
+        directory (str): Directory to run the imports from
+
+    Returns:
+        tuple: (dict of the fastest measured times in ms, list of failure messages)
+    """
+    measured = {}
+    failures = []
+    for module in budget:
+        runs = [measure_import(module, directory) for _ in range(max(repeats, 2))]
+        measured[module] = min(total for total, _ in runs)
+
+        # The last run has a warm parse cache, so the source parsers shouldn't load bs4
+        for forbidden in forbidden_imports(module, runs[-1][1]):
+            failures.append(f"{module} imports {forbidden} at startup")
+
+        if tolerance is None:
+            print(f"{module}: {measured[module]:.0f} ms")
+            continue
+        limit = budget[module] * tolerance
+        status = "OK" if measured[module] <= limit else "OVER BUDGET"
+        print(f"{module}: {measured[module]:.0f} ms (snapshot {budget[module]:.0f} ms, limit {limit:.0f} ms) {status}")
+        if measured[module] > limit:
+            failures.append(f"{module} imports in {measured[module]:.0f} ms, over its {limit:.0f} ms limit")
+    return measured, failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the import time of the compiler, dashboard and figure tables.")
+    parser.add_argument('--budget', default=BUDGET_FILE,
+                        help=f"Snapshot of import times in ms (default: {BUDGET_FILE})")
+    parser.add_argument('--repeats', type=int, default=3, help="Imports per module; the fastest is used")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"Allowed ratio of measured to snapshot time (default: {TOLERANCE})")
+    parser.add_argument('--update', action='store_true', help="Rewrite the snapshot with the measured times")
+    args = parser.parse_args()
+
+    budget_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.budget)
+    with open(budget_path) as f:
+        budget = json.load(f)
+
+    measured, failures = check_budget(budget, args.repeats, None if args.update else args.tolerance)
+    if args.update:
+        with open(budget_path, 'w') as f:
+            json.dump({module: round(ms) for module, ms in measured.items()}, f, indent=2)
+            f.write("\n")
+        print(f"Updated {budget_path}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
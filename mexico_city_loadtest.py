@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Dashboard Load Test
+This module starts the dashboard locally (or targets a running instance) and
+simulates concurrent analyst sessions. Each session loads the page and layout,
+then fires the dashboard callbacks against /_dash-update-component with random
+cities, periods, tabs and other control values, polling background callbacks
+until their result arrives and firing the callbacks their outputs trigger, like
+the browser does. It reports throughput and
+p50/p95/p99 latency per callback.
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+import numpy as np
+
+DEFAULT_PORT = 8050
+STARTUP_TIMEOUT = 180
+
+# Seconds between two polls of a background callback (the browser polls every second)
+POLL_INTERVAL = 0.1
+
+# Seconds after which a callback call counts as failed
+CALL_TIMEOUT = 60
+
+# Rounds of callbacks triggered by the outputs of other callbacks followed after each action
+MAX_CHAIN = 5
+
+def http(url, body=None, timeout=120):
+    """Send a GET (or a JSON POST if body is given) and return (status, decoded JSON or bytes)."""
+    headers = {'Accept-Encoding': 'gzip'}
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            status, payload, encoding = response.status, response.read(), response.headers.get('Content-Encoding')
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    if encoding == 'gzip':
+        payload = gzip.decompress(payload)
+    if payload and response.headers.get_content_type() == 'application/json':
+        return status, json.loads(payload)
+    return status, payload
+
+def start_dashboard(port, cwd=None):
+    """Start the dashboard in a separate process and wait until it serves its layout.
+
+    The server runs in its own interpreter so the load generator's threads don't
+    compete with it for the GIL.
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    code = ("import sys; sys.argv = [sys.argv[0]]; import mexico_city_dashboard as d; "
+            f"d.app.run_server(host='127.0.0.1', port={port}, debug=False)")
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=cwd or here, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    print(f"Starting dashboard on port {port}...")
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Dashboard exited with code {process.returncode} during startup")
+        try:
+            if http(f"http://127.0.0.1:{port}/_dash-layout", timeout=5)[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Dashboard did not start within {STARTUP_TIMEOUT}s")
+
+def layout_components(node, components=None):
+    """Map the id of every component of a Dash layout to its props."""
+    components = {} if components is None else components
+    if isinstance(node, list):
+        for child in node:
+            layout_components(child, components)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if 'id' in props:
+            components[props['id']] = dict(props, type=node.get('type'))
+        layout_components(props.get('children'), components)
+    return components
+
+def option_values(props):
+    """Values of a component's options (dropdowns, radio items, checklists)."""
+    return [option['value'] if isinstance(option, dict) else option for option in props.get('options') or []]
+
+def random_value(rng, props, current):
+    """Draw a random value for a callback input, like an analyst changing that control.
+
+    Dropdowns and radio items get a random option, checklists and multi-select
+    dropdowns a random non-empty subset, range sliders a random period and tabs a
+    random tab. Other inputs keep their current value.
+    """
+    options = option_values(props)
+    if props.get('type') == 'Checklist' or (options and props.get('multi')):
+        return rng.sample(options, rng.randint(1, len(options))) if options else current
+    if options:
+        return rng.choice(options)
+    if props.get('type') == 'RangeSlider':
+        step = props.get('step') or 1
+        values = list(np.arange(props['min'], props['max'] + step, step).tolist())
+        start, end = sorted(rng.sample(values, 2)) if len(values) > 1 else (values[0], values[0])
+        return [start, end]
+    if props.get('type') == 'Tabs':
+        tabs = [child['props']['value'] for child in props.get('children') or []
+                if isinstance(child, dict) and 'value' in child.get('props', {})]
+        return rng.choice(tabs) if tabs else current
+    return current
+
+def parse_outputs(output):
+    """Split a Dash output spec ('id.prop' or '..a.prop...b.prop..') into output dicts."""
+    specs = output[2:-2].split('...') if output.startswith('..') else [output]
+    outputs = [{'id': spec.rsplit('.', 1)[0], 'property': spec.rsplit('.', 1)[1]} for spec in specs]
+    return outputs, output.startswith('..')
+
+def callback_name(dependency):
+    """Readable name of a callback: its first output component, e.g. 'employment-vs-population'."""
+    outputs, multi = parse_outputs(dependency['output'])
+    return outputs[0]['id'] + (f" (+{len(outputs) - 1})" if multi and len(outputs) > 1 else '')
+
+class Session:
+    """One simulated analyst: keeps the values of the controls and fires the callbacks they trigger.
+
+    Attributes:
+        values (dict): Current value of every component property, keyed by 'id.property'
+        latencies (dict): Callback name mapped to the latencies of its calls in seconds
+        errors (dict): Callback name mapped to its number of failed calls
+    """
+
+    def __init__(self, base_url, components, dependencies, rng, poll_interval=POLL_INTERVAL, timeout=CALL_TIMEOUT):
+        self.base_url = base_url
+        self.components = components
+        self.dependencies = dependencies
+        self.rng = rng
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.values = {f"{component_id}.{prop}": value for component_id, props in components.items()
+                       for prop, value in props.items()}
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def load_page(self):
+        """Load the page, layout and callback graph, as a new browser tab does."""
+        for path in ['/', '/_dash-layout', '/_dash-dependencies']:
+            start = time.perf_counter()
+            status, _ = http(self.base_url + path)
+            self.record(f"GET {path}", time.perf_counter() - start, status == 200)
+
+    def record(self, name, latency, ok):
+        if ok:
+            self.latencies[name].append(latency)
+        else:
+            self.errors[name] += 1
+
+    def request_body(self, dependency, changed):
+        outputs, multi = parse_outputs(dependency['output'])
+        def entries(specs):
+            return [{'id': spec['id'], 'property': spec['property'],
+                     'value': self.values.get(f"{spec['id']}.{spec['property']}")} for spec in specs]
+        return {
+            'output': dependency['output'],
+            'outputs': outputs if multi else outputs[0],
+            'inputs': entries(dependency['inputs']),
+            'state': entries(dependency.get('state', [])),
+            'changedPropIds': changed
+        }
+
+    def call(self, dependency, changed):
+        """Fire one callback and wait for its result, polling background callbacks.
+
+        Returns:
+            tuple: (latency in seconds, whether it succeeded within the timeout,
+                list of the 'id.property' values it updated)
+        """
+        url = self.base_url + '/_dash-update-component'
+        body = self.request_body(dependency, changed)
+        start = time.perf_counter()
+        try:
+            status, data = http(url, body, self.timeout)
+
+            # Background callbacks answer with a job to poll until the result is ready
+            if status == 200 and isinstance(data, dict) and 'cacheKey' in data:
+                query = f"?cacheKey={data['cacheKey']}&job={data['job']}"
+                while True:
+                    if time.perf_counter() - start > self.timeout:
+                        return time.perf_counter() - start, False, []
+                    time.sleep(self.poll_interval)
+                    status, data = http(url + query, body, self.timeout)
+                    if status != 200 or not isinstance(data, dict) or 'response' in data:
+                        break
+        except OSError:
+            return time.perf_counter() - start, False, []
+        latency = time.perf_counter() - start
+
+        updated = []
+        if status == 200 and isinstance(data, dict):
+            outputs, _ = parse_outputs(dependency['output'])
+            for spec in outputs:
+                value = data.get('response', {}).get(spec['id'], {}).get(spec['property'])
+                if value is not None:
+                    self.values[f"{spec['id']}.{spec['property']}"] = value
+                    updated.append(f"{spec['id']}.{spec['property']}")
+        return latency, status in (200, 204), updated
+
+    def step(self):
+        """Change one random control and fire every callback it is an input of, then the callbacks those trigger."""
+        # Stores are set by other callbacks, not by the analyst
+        inputs = sorted({f"{spec['id']}.{spec['property']}" for dependency in self.dependencies
+                         for spec in dependency['inputs']
+                         if self.components.get(spec['id'], {}).get('type') != 'Store'})
+        changed = self.rng.choice(inputs)
+        component_id = changed.rsplit('.', 1)[0]
+        self.values[changed] = random_value(self.rng, self.components.get(component_id, {}), self.values.get(changed))
+
+        changed_props = [changed]
+        for _ in range(MAX_CHAIN):
+            updated = []
+            for dependency in self.dependencies:
+                triggers = [f"{spec['id']}.{spec['property']}" for spec in dependency['inputs']
+                            if f"{spec['id']}.{spec['property']}" in changed_props]
+                if triggers:
+                    latency, ok, outputs = self.call(dependency, triggers)
+                    self.record(callback_name(dependency), latency, ok)
+                    updated += outputs
+            if not updated:
+                break
+            changed_props = updated
+
+def run_load_test(base_url, sessions=10, duration=60, think_time=0.0, poll_interval=POLL_INTERVAL,
+                  timeout=CALL_TIMEOUT, seed=None):
+    """Run concurrent sessions against a dashboard for a fixed duration.
+
+    Args:
+        base_url (str): URL of the dashboard, e.g. http://127.0.0.1:8050
+        sessions (int): Number of concurrent sessions
+        duration (float): Seconds to run for
+        think_time (float): Mean seconds a session waits between two actions
+        poll_interval (float): Seconds between two polls of a background callback
+        timeout (float): Seconds after which a callback call counts as an error
+        seed (int): Seed of the random selections
+
+    Returns:
+        dict: Callback name mapped to its count, errors, throughput and latency percentiles
+    """
+    _, layout = http(base_url + '/_dash-layout')
+    _, dependencies = http(base_url + '/_dash-dependencies')
+    components = layout_components(layout)
+    # Callbacks without inputs (e.g. clientside-only helpers) can't be triggered by a session
+    dependencies = [dependency for dependency in dependencies if dependency['inputs']]
+
+    master = random.Random(seed)
+    runs = [Session(base_url, components, dependencies, random.Random(master.random()), poll_interval, timeout)
+            for _ in range(sessions)]
+    deadline = time.time() + duration
+
+    def run(session):
+        session.load_page()
+        while time.time() < deadline:
+            session.step()
+            if think_time:
+                time.sleep(session.rng.expovariate(1 / think_time))
+
+    print(f"Running {sessions} sessions for {duration:.0f}s against {base_url}...")
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(session,)) for session in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    names = sorted({name for session in runs for name in list(session.latencies) + list(session.errors)})
+    for name in names:
+        latencies = np.array([latency for session in runs for latency in session.latencies[name]])
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else (np.nan,) * 3
+        results[name] = {
+            'count': len(latencies),
+            'errors': sum(session.errors[name] for session in runs),
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99)
+        }
+    return results
+
+def print_report(results):
+    """Print the per-callback results as a table."""
+    print(f"\n{'callback':<45} {'calls':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<45} {result['count']:>7} {result['errors']:>7} {result['throughput']:>8.2f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Mexico City growth dashboard.")
+    parser.add_argument('--url', help="URL of a running dashboard; by default one is started locally")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port of the locally started dashboard")
+    parser.add_argument('--sessions', type=int, default=10, help="Number of concurrent sessions")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run for")
+    parser.add_argument('--think-time', type=float, default=0.0,
+                        help="Mean seconds a session waits between two actions")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help="Seconds between two polls of a background callback")
+    parser.add_argument('--timeout', type=float, default=CALL_TIMEOUT,
+                        help="Seconds after which a callback call counts as an error")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the random selections")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = None if args.url else start_dashboard(args.port)
+    try:
+        results = run_load_test(args.url or f"http://127.0.0.1:{args.port}", args.sessions, args.duration,
+                                args.think_time, args.poll_interval, args.timeout, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.json}")
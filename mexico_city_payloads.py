@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Figure Payloads
+This module shrinks what the dashboard sends to the browser: figure arrays are
+rounded to display precision and kept as numpy arrays (plotly versions that
+support typed arrays then send them as binary buffers), callback and asset
+responses are compressed, and payload sizes can be measured before and after.
+"""
+
+import gzip
+import json
+import numpy as np
+from flask import request
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# Significant digits kept in figure arrays (plotly shows at most ~6 in hover labels)
+SIGNIFICANT_DIGITS = 6
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 500
+
+def round_array(values, digits=SIGNIFICANT_DIGITS):
+    """Round a numeric array to a number of significant digits of its largest value.
+
+    Rounding to a fixed number of decimals for the whole array keeps the JSON
+    representation short (e.g. 6530.1 instead of 6530.104227463127).
+    """
+    values = np.asarray(values, dtype=float)
+    finite = np.abs(values[np.isfinite(values)])
+    if not len(finite) or finite.max() == 0:
+        return values
+    decimals = max(0, digits - 1 - int(np.floor(np.log10(finite.max()))))
+    return np.round(values, decimals)
+
+def _compact(value, digits):
+    """Recursively round the numeric arrays of a figure dictionary."""
+    if isinstance(value, dict):
+        return {key: _compact(item, digits) for key, item in value.items()}
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'f':
+            return round_array(value, digits)
+        if value.dtype.kind == 'O':
+            return _compact(list(value), digits)
+        return value
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, float) for item in value):
+            return round_array(value, digits)
+        return [_compact(item, digits) for item in value]
+    if isinstance(value, float) and np.isfinite(value):
+        return float(round_array([value], digits)[0])
+    return value
+
+def compact_figure(fig, digits=SIGNIFICANT_DIGITS):
+    """Return a figure as a plain dictionary with its data rounded to display precision.
+
+    Layout values (ranges, positions, ...) are left untouched. Returning a dict
+    rather than a go.Figure also skips plotly's validation when Dash serializes it.
+
+    Args:
+        fig (go.Figure): Figure to compact
+        digits (int): Significant digits kept in each data array
+
+    Returns:
+        dict: Figure with 'data' and 'layout' keys
+    """
+    figure = fig.to_dict()
+    figure['data'] = [_compact(trace, digits) for trace in figure['data']]
+    return figure
+
+def payload_bytes(figures):
+    """Size of a callback's figures as Dash sends them, raw and gzip-compressed."""
+    body = json.dumps(list(figures), cls=PlotlyJSONEncoder).encode('utf-8')
+    return len(body), len(gzip.compress(body))
+
+def measure_payloads(build_figures, calls, digits=SIGNIFICANT_DIGITS):
+    """Compare callback payload sizes before and after compacting the figures.
+
+    Args:
+        build_figures (callable): Returns the tuple of go.Figure of one callback
+        calls (list): Argument tuples to call build_figures with
+        digits (int): Significant digits kept by compact_figure
+
+    Returns:
+        list: One dict of byte counts per call
+    """
+    results = []
+    for args in calls:
+        figures = build_figures(*args)
+        raw, raw_gzip = payload_bytes(figures)
+        compact, compact_gzip = payload_bytes([compact_figure(fig, digits) for fig in figures])
+        results.append({
+            'call': args,
+            'raw': raw,
+            'raw_gzip': raw_gzip,
+            'compact': compact,
+            'compact_gzip': compact_gzip
+        })
+        print(f"{args}: {raw:,} bytes raw, {raw_gzip:,} gzip -> {compact:,} compact, {compact_gzip:,} compact + gzip")
+    return results
+
+def enable_compression(server, min_size=MIN_COMPRESS_BYTES):
+    """Compress the responses of a Flask server (Dash callbacks, layout and assets).
+
+    Uses flask_compress when it is installed, otherwise gzips responses in an
+    after_request hook. Responses with an ETag are left alone, since their tag
+    describes the uncompressed bytes (the data API prepares its own encodings).
+    """
+    if Compress is not None:
+        server.config.setdefault('COMPRESS_MIN_SIZE', min_size)
+        Compress(server)
+        return server
+
+    @server.after_request
+    def gzip_response(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or 'ETag' in response.headers
+                or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+            return response
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    return server
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Polars Backend
+This module runs compile_data, calculate_growth_rates and calculate_cagr as
+Polars lazy queries: the joins, group-bys and window functions of each stage
+are optimized together and run multithreaded instead of looping over cities in
+Python. Results are returned as pandas DataFrames identical to the pandas
+implementations (same rows, row order, columns and dtypes), so the plotting
+functions and the dashboard consume them unchanged.
+
+Enabled with MEXICO_CITY_BACKEND=polars or the compiler's --backend polars;
+requires the optional polars package (pyarrow is not needed).
+"""
+
+import re
+import numpy as np
+import pandas as pd
+import polars as pl
+
+# Aggregate row of the source tables, not a city
+EXCLUDED_CITY = "Áreas metropolitanas"
+
+TIME_POINT_PATTERN = r'(\d{4})Q(\d)'
+
+# Monthly salary is the hourly salary times this many hours
+MONTHLY_HOURS = 160
+
+COMPILED_COLUMNS = ['city', 'time_point', 'year', 'quarter', 'employment_rate', 'hourly_salary',
+                    'population', 'housing_index', 'monthly_salary', 'real_wage']
+
+# Yearly averages used by the growth rates, with the name of their column in the output
+GROWTH_AVERAGES = {
+    'employment_rate': 'avg_employment_rate',
+    'monthly_salary': 'avg_monthly_salary',
+    'real_wage': 'avg_real_wage',
+    'population': 'avg_population',
+    'housing_index': 'avg_housing_index'
+}
+
+# Metric of every growth and CAGR column (nominal wages are the monthly salary)
+GROWTH_METRICS = {'population': 'population', 'real_wage': 'real_wage', 'nominal_wage': 'monthly_salary'}
+
+def to_polars(frame, columns):
+    """Convert pandas columns to a Polars DataFrame through numpy, with NaN as null.
+
+    The city column is typed as a string explicitly: numpy's object array of an
+    empty panel would otherwise become an unsortable Object column.
+    """
+    schema = {'city': pl.Utf8} if 'city' in columns else None
+    return pl.DataFrame({column: frame[column].to_numpy() for column in columns}, nan_to_null=True,
+                        schema_overrides=schema)
+
+def to_pandas(frame):
+    """Convert a Polars DataFrame to pandas through numpy (nulls become NaN).
+
+    An empty result becomes a DataFrame without columns, like pd.DataFrame([])
+    in the pandas implementations.
+    """
+    if frame.height == 0:
+        return pd.DataFrame([])
+    return pd.DataFrame({column: frame[column].to_numpy() for column in frame.columns})
+
+def series_frame(data, value_name):
+    """Long (city, time_point, value) LazyFrame of a dict of Series indexed by time point."""
+    lengths = [len(series) for series in data.values()]
+    return pl.LazyFrame({
+        'city': np.repeat(np.array(list(data.keys()), dtype=object), lengths).tolist(),
+        'time_point': [str(tp) for series in data.values() for tp in series.index],
+        value_name: np.concatenate([series.to_numpy(dtype=float) for series in data.values()]) if data else []
+    }, schema={'city': pl.Utf8, 'time_point': pl.Utf8, value_name: pl.Float64})
+
+def compile_data(employment_data, salary_data, population_data, housing_cost_data, time_points):
+    """Compile data into a single DataFrame with one lazy query.
+
+    Args:
+        employment_data (dict): Employment rate data by city
+        salary_data (dict): Hourly salary data by city
+        population_data (dict): Population data by city
+        housing_cost_data (dict): Housing cost index data by city
+        time_points (list): List of time points
+
+    Returns:
+        pd.DataFrame: Combined dataset with all metrics, as compile_data returns it
+    """
+    print("Compiling data into a unified dataset (polars)...")
+
+    # Same set as the pandas implementation, iterated in the same order
+    all_cities = set(list(employment_data.keys()) + list(salary_data.keys()) + list(population_data.keys()))
+    print(f"Found data for {len(all_cities)} unique cities")
+    cities = [city for city in all_cities if city != EXCLUDED_CITY and city]
+
+    # Housing index of 'Ciudad de X' is looked up as 'X' first, then under the full name
+    housing_keys = []
+    for city in cities:
+        simple_name = city.replace('Ciudad de ', '')
+        housing_keys.append(simple_name if simple_name in housing_cost_data
+                            else city if city in housing_cost_data else None)
+
+    city_frame = pl.LazyFrame({
+        'city': cities,
+        'city_order': list(range(len(cities))),
+        'housing_key': housing_keys
+    }, schema={'city': pl.Utf8, 'city_order': pl.Int64, 'housing_key': pl.Utf8})
+
+    matches = [re.match(TIME_POINT_PATTERN, tp) for tp in time_points]
+    period_frame = pl.LazyFrame({
+        'time_point': [tp for tp, match in zip(time_points, matches) if match],
+        'period_order': [k for k, match in enumerate(matches) if match],
+        'year': [int(match.group(1)) for match in matches if match],
+        'quarter': [int(match.group(2)) for match in matches if match]
+    }, schema={'time_point': pl.Utf8, 'period_order': pl.Int64, 'year': pl.Int64, 'quarter': pl.Int64})
+
+    housing = series_frame(housing_cost_data, 'housing_index').rename({'city': 'housing_key'})
+    query = (
+        city_frame.join(period_frame, how='cross')
+        .join(series_frame(employment_data, 'employment_rate'), on=['city', 'time_point'], how='left')
+        .join(series_frame(salary_data, 'hourly_salary'), on=['city', 'time_point'], how='left')
+        .join(series_frame(population_data, 'population'), on=['city', 'time_point'], how='left')
+        .join(housing, on=['housing_key', 'time_point'], how='left')
+        .with_columns((pl.col('hourly_salary') * MONTHLY_HOURS).alias('monthly_salary'))
+        .with_columns((pl.col('monthly_salary') / pl.col('housing_index')).alias('real_wage'))
+        .sort(['city_order', 'period_order'])
+        .select(COMPILED_COLUMNS)
+    )
+
+    df = to_pandas(query.collect())
+    print(f"Created dataframe with {len(df)} rows and {len(df.columns)} columns")
+    return df
+
+def yearly_means(data, metrics):
+    """LazyFrame of the yearly average of some metrics per city, sorted by city and year.
+
+    The averages are bit-identical to pandas' groupby mean, which sums the rows of
+    every group in their order with Kahan compensation: the values of each group
+    are spread over one column per position and summed the same way, column by
+    column (a year has as many positions as it has rows, four for quarterly data).
+    """
+    panel = to_polars(data, ['city', 'year'] + metrics).lazy()
+    positions = panel.group_by(['city', 'year']).len().select(pl.col('len').max()).collect().item() or 0
+
+    query = panel.group_by(['city', 'year']).agg([
+        pl.col(metric).slice(k, 1).first().alias(f'{metric}__{k}') for metric in metrics for k in range(positions)
+    ])
+    for metric in metrics:
+        query = query.with_columns([pl.lit(0.0).alias(f'{metric}__sum'), pl.lit(0.0).alias(f'{metric}__comp'),
+                                    pl.lit(0).alias(f'{metric}__count')])
+        for k in range(positions):
+            value, total, comp = pl.col(f'{metric}__{k}'), pl.col(f'{metric}__sum'), pl.col(f'{metric}__comp')
+            y = value - comp
+            t = total + y
+            present = value.is_not_null()
+            query = query.with_columns([
+                pl.when(present).then(t).otherwise(total).alias(f'{metric}__sum'),
+                pl.when(present).then((t - total) - y).otherwise(comp).alias(f'{metric}__comp'),
+                (pl.col(f'{metric}__count') + present.cast(pl.Int64)).alias(f'{metric}__count')
+            ])
+        query = query.with_columns(
+            pl.when(pl.col(f'{metric}__count') > 0)
+            .then(pl.col(f'{metric}__sum') / pl.col(f'{metric}__count')).otherwise(None).alias(metric)
+        )
+    return query.select(['city', 'year'] + metrics).sort(['city', 'year'])
+
+def growth(current, previous, exponent=None):
+    """Growth from previous to current (annualized by exponent), null unless previous is positive."""
+    ratio = current / previous
+    if exponent is not None:
+        ratio = ratio.pow(exponent)
+    return pl.when(previous.is_not_null() & (previous > 0)).then(ratio - 1).otherwise(None)
+
+def calculate_growth_rates(data):
+    """Calculate year-over-year growth rates with one lazy query.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+
+    Returns:
+        pd.DataFrame: Dataset with yearly growth rates, as calculate_growth_rates returns it
+    """
+    print("Calculating year-over-year growth rates (polars)...")
+
+    query = (
+        yearly_means(data, list(GROWTH_AVERAGES))
+        .with_columns([
+            (growth(pl.col(metric), pl.col(metric).shift(1).over('city')) * 100).alias(f'{name}_growth')
+            for name, metric in GROWTH_METRICS.items()
+        ])
+        # The first year of every city has no previous year
+        .filter(pl.int_range(pl.len()).over('city') > 0)
+        .rename(GROWTH_AVERAGES)
+        .select(['city', 'year'] + list(GROWTH_AVERAGES.values()) + [f'{name}_growth' for name in GROWTH_METRICS])
+    )
+
+    df = to_pandas(query.collect())
+    print(f"Created growth rates dataframe with {len(df)} rows")
+    return df
+
+def calculate_cagr(data, start_year, end_year, endpoints=False):
+    """Calculate CAGR for the specified time period with one lazy query.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        start_year (int): Start year for CAGR calculation
+        end_year (int): End year for CAGR calculation
+        endpoints (bool): Also return the first and last yearly averages of every
+            metric (the dashboard's start_/end_ columns)
+
+    Returns:
+        pd.DataFrame: Dataset with CAGR metrics, as calculate_cagr returns it
+    """
+    print(f"Calculating CAGR for period {start_year}-{end_year} (polars)...")
+
+    years = end_year - start_year if end_year > start_year else 1
+    endpoint_columns = [f'{edge}_{name}' for name in GROWTH_METRICS for edge in ['start', 'end']] if endpoints else []
+
+    query = (
+        yearly_means(data, list(GROWTH_METRICS.values()))
+        .filter((pl.col('year') >= start_year) & (pl.col('year') <= end_year))
+        .group_by('city', maintain_order=True)
+        .agg([pl.len().alias('rows')]
+             + [pl.col(metric).first().alias(f'start_{name}') for name, metric in GROWTH_METRICS.items()]
+             + [pl.col(metric).last().alias(f'end_{name}') for name, metric in GROWTH_METRICS.items()])
+        .filter(pl.col('rows') >= 2)
+        .with_columns([
+            pl.lit(start_year, dtype=pl.Int64).alias('start_year'),
+            pl.lit(end_year, dtype=pl.Int64).alias('end_year'),
+            pl.lit(years, dtype=pl.Int64).alias('years')
+        ] + [
+            (growth(pl.col(f'end_{name}'), pl.col(f'start_{name}'), 1 / years) * 100).alias(f'{name}_cagr')
+            for name in GROWTH_METRICS
+        ])
+        .select(['city', 'start_year', 'end_year'] + endpoint_columns + ['years']
+                + [f'{name}_cagr' for name in GROWTH_METRICS])
+    )
+
+    df = to_pandas(query.collect())
+    print(f"Created CAGR dataframe with {len(df)} rows")
+    return df
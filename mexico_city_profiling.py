@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Profiling
+This module profiles the compiler's pipeline stages and the dashboard's
+callbacks on demand (--profile). Each profiled invocation writes a pstats file
+from cProfile and a collapsed-stack file from a stack sampler, which
+flamegraph.pl, speedscope or inferno can draw as a flame graph. Only a fraction
+of the invocations is profiled, so it can stay on in a production replica.
+"""
+
+import os
+import sys
+import time
+import random
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = "profiles"
+
+# Fraction of invocations profiled, and seconds between two stack samples
+PROFILE_RATE = 1.0
+SAMPLE_INTERVAL = 0.005
+
+def frame_label(frame):
+    """Name of a stack frame in collapsed stacks, e.g. 'compile_data (mexico_city_data_compiler.py:209)'."""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+class StackSampler:
+    """Samples the call stack of one thread at a fixed interval from a background thread.
+
+    Attributes:
+        stacks (Counter): Collapsed stack (root first, ';'-separated) mapped to its number of samples
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def write(self, path):
+        """Write the samples in the collapsed-stack format ('frame;frame;frame count' per line)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class Profiler:
+    """Profiles named stages into per-invocation pstats and collapsed-stack files.
+
+    Disabled until configure() is called, in which case stage() costs one
+    attribute check. Stages nested in a profiled stage are part of its profile.
+
+    Attributes:
+        enabled (bool): Whether stages are profiled at all
+        output_dir (str): Directory of the profile files
+        rate (float): Fraction of stage invocations that are profiled
+        interval (float): Seconds between two stack samples
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output_dir = PROFILE_DIR
+        self.rate = PROFILE_RATE
+        self.interval = SAMPLE_INTERVAL
+        self._local = threading.local()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def configure(self, output_dir=PROFILE_DIR, rate=PROFILE_RATE, interval=SAMPLE_INTERVAL):
+        """Enable profiling.
+
+        Args:
+            output_dir (str): Directory of the profile files
+            rate (float): Fraction of stage invocations to profile, between 0 and 1
+            interval (float): Seconds between two stack samples
+        """
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Profile rate must be between 0 and 1, got {rate}")
+        self.enabled = True
+        self.output_dir = output_dir
+        self.rate = rate
+        self.interval = interval
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Profiling {rate:.0%} of stage invocations into {os.path.abspath(output_dir)}")
+        return self
+
+    def _base_path(self, name):
+        with self._lock:
+            self._count += 1
+            count = self._count
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        return os.path.join(self.output_dir, f"{safe_name}-{timestamp}-{os.getpid()}-{count}")
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the enclosed block as one invocation of a named stage (if it is sampled)."""
+        if not self.enabled or getattr(self._local, 'active', False) or random.random() >= self.rate:
+            yield
+            return
+
+        self._local.active = True
+        sampler = StackSampler(threading.get_ident(), self.interval).start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            sampler.stop()
+            self._local.active = False
+
+            base_path = self._base_path(name)
+            profile.dump_stats(base_path + ".pstats")
+            sampler.write(base_path + ".collapsed")
+            print(f"Profiled {name} in {elapsed:.3f}s: {base_path}.pstats, {base_path}.collapsed")
+
+def add_profile_arguments(parser):
+    """Add the --profile options to a script's argument parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Write pstats and collapsed-stack profiles of each stage")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help=f"Directory of the profile files (default: {PROFILE_DIR})")
+    parser.add_argument('--profile-rate', type=float, default=PROFILE_RATE,
+                        help="Fraction of invocations to profile, e.g. 0.05 on a production replica")
+    parser.add_argument('--profile-interval', type=float, default=SAMPLE_INTERVAL,
+                        help=f"Seconds between two stack samples (default: {SAMPLE_INTERVAL})")
+    return parser
+
+def configure_from_args(args):
+    """Enable the shared profiler if --profile was given."""
+    if args.profile:
+        profiler.configure(args.profile_dir, args.profile_rate, args.profile_interval)
+    return profiler
+
+# Profiler shared by the compiler and the dashboard
+profiler = Profiler()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Regressions
+This module fits the relationships the scatter plots invite: for every CAGR
+window, a cross-city OLS of each wage CAGR on population CAGR (figures 4 and 5),
+and on the yearly panel, two-way fixed-effects models of population growth on
+wages with city and year effects (figure 3). Each family of models is solved in
+one batched call on stacked normal equations, and the coefficients, standard
+errors and every city's residual are memoized by data version, so the dashboard
+looks fits up instead of running them on each request.
+"""
+
+import numpy as np
+import pandas as pd
+
+from mexico_city_cache import MISSING, memoize
+from mexico_city_data_compiler import CAGR_PREFIXES, PeriodAggregates
+from mexico_city_diagnostics import QUADRANT_MEASURES, all_windows
+
+# Outcome and regressors of the two-way fixed-effects models of the yearly panel
+PANEL_OUTCOME = 'population_growth'
+PANEL_REGRESSORS = ['avg_real_wage', 'real_wage_growth', 'nominal_wage_growth']
+
+def solve_batch(X, y):
+    """OLS of a batch of problems of the same shape, from stacked normal equations.
+
+    Observations with a NaN outcome or regressor are left out of their problem.
+    Collinear designs (e.g. a full set of fixed effects) are solved with the
+    pseudo-inverse, and degrees of freedom use the rank of the design.
+
+    Args:
+        X (np.ndarray): Designs, shape (problems, observations, regressors)
+        y (np.ndarray): Outcomes, shape (problems, observations)
+
+    Returns:
+        dict: coef and se of shape (problems, regressors), residuals of shape
+            (problems, observations) (NaN where left out), n, dof and r2 per problem
+    """
+    valid = ~np.isnan(y) & ~np.isnan(X).any(axis=-1)
+    X = np.where(valid[..., np.newaxis], X, 0.0)
+    y = np.where(valid, y, 0.0)
+
+    Xt = X.transpose(0, 2, 1)
+    xtx = Xt @ X
+    inverse = np.linalg.pinv(xtx)
+    coef = (inverse @ (Xt @ y[..., np.newaxis]))[..., 0]
+    residuals = np.where(valid, y - (X @ coef[..., np.newaxis])[..., 0], np.nan)
+
+    n = valid.sum(axis=-1)
+    dof = n - np.linalg.matrix_rank(xtx)
+    rss = np.nansum(residuals ** 2, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = np.where(dof > 0, rss / dof, np.nan)
+        se = np.sqrt(np.diagonal(inverse, axis1=-2, axis2=-1) * sigma2[:, np.newaxis])
+        mean = y.sum(axis=-1) / n
+        tss = (np.where(valid, y - mean[:, np.newaxis], 0.0) ** 2).sum(axis=-1)
+        r2 = np.where(tss > 0, 1 - rss / tss, np.nan)
+    return {'coef': coef, 'se': se, 'residuals': residuals, 'n': n, 'dof': dof, 'r2': r2}
+
+@memoize
+def fit_windows(data, windows=None, measures=QUADRANT_MEASURES):
+    """Cross-city OLS of each wage CAGR on population CAGR, for every window at once.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        windows (list): (start_year, end_year) windows, all of them by default
+        measures (list): Wage metrics regressed on population growth
+
+    Returns:
+        dict: cities, windows and measures, plus coef and se of shape
+            (windows, measures, 2) (intercept, slope), n and r2 of shape
+            (windows, measures) and residuals of shape (cities, windows, measures)
+    """
+    aggregates = PeriodAggregates(data)
+    windows = windows if windows is not None else all_windows(aggregates.years)
+    measures = [measure for measure in measures if measure in aggregates.metrics]
+    print(f"Fitting wage CAGR on population CAGR for {len(windows)} windows and {len(measures)} measures...")
+
+    growth = aggregates.cagr_cube(windows)
+    n_cities = len(aggregates.cities)
+    population = growth[:, :, aggregates.metrics.index('population')]
+    wages = growth[:, :, [aggregates.metrics.index(measure) for measure in measures]]
+
+    # One problem per (window, measure): observations are the cities
+    x = np.broadcast_to(population.T[:, np.newaxis, :], (len(windows), len(measures), n_cities))
+    X = np.stack([np.ones(x.shape), x], axis=-1).reshape(-1, n_cities, 2)
+    y = wages.transpose(1, 2, 0).reshape(-1, n_cities)
+    fit = solve_batch(X, y)
+
+    shape = (len(windows), len(measures))
+    return {
+        'cities': aggregates.cities,
+        'windows': windows,
+        'measures': measures,
+        'coef': fit['coef'].reshape(shape + (2,)),
+        'se': fit['se'].reshape(shape + (2,)),
+        'n': fit['n'].reshape(shape),
+        'r2': fit['r2'].reshape(shape),
+        'residuals': fit['residuals'].reshape(shape + (n_cities,)).transpose(2, 0, 1)
+    }
+
+# Alternating demeaning stops once no value moves by more than this fraction of the largest value
+DEMEAN_TOLERANCE = 1e-12
+DEMEAN_MAX_ITERATIONS = 1000
+
+def group_means(values, codes, n_groups, valid):
+    """Mean of every row of values within each group, over the valid entries, shape (rows, groups)."""
+    offsets = ((np.arange(len(values)) * n_groups)[:, np.newaxis] + codes).ravel()
+    size = len(values) * n_groups
+    sums = np.bincount(offsets, weights=np.where(valid, values, 0.0).ravel(), minlength=size)
+    counts = np.bincount(offsets, weights=valid.ravel().astype(float), minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (sums / counts).reshape(len(values), n_groups)
+
+def sweep_effects(values, city_codes, year_codes, n_cities, n_years, valid):
+    """City and year effects of each row of values, by alternating projections.
+
+    Subtracting city means and then year means until nothing changes is the
+    within transformation of the two-way fixed-effects model; balanced panels
+    converge after one pass, unbalanced ones after a few.
+
+    Args:
+        values (np.ndarray): Array of shape (problems, rows)
+        city_codes (np.ndarray): City of every row
+        year_codes (np.ndarray): Year of every row
+        n_cities (int): Number of cities
+        n_years (int): Number of years
+        valid (np.ndarray): Boolean array of shape (problems, rows) of the rows in each problem
+
+    Returns:
+        tuple: (city effects of shape (problems, cities), year effects of shape (problems, years))
+    """
+    values = np.where(valid, values, 0.0)
+    city_effects = np.zeros((len(values), n_cities))
+    year_effects = np.zeros((len(values), n_years))
+    tolerance = DEMEAN_TOLERANCE * max(np.abs(values).max(initial=0.0), 1.0)
+    for _ in range(DEMEAN_MAX_ITERATIONS):
+        city_step = np.nan_to_num(group_means(values - city_effects[:, city_codes] - year_effects[:, year_codes],
+                                              city_codes, n_cities, valid))
+        city_effects += city_step
+        year_step = np.nan_to_num(group_means(values - city_effects[:, city_codes] - year_effects[:, year_codes],
+                                              year_codes, n_years, valid))
+        year_effects += year_step
+        if max(np.abs(city_step).max(initial=0.0), np.abs(year_step).max(initial=0.0)) <= tolerance:
+            break
+    return city_effects, year_effects
+
+def effect_rank(city_codes, year_codes, n_cities, n_years):
+    """Rank of the city and year dummies of a sample: cities + years - connected groups of cities and years."""
+    labels = np.arange(n_cities)
+    while True:
+        year_labels = np.full(n_years, n_cities)
+        np.minimum.at(year_labels, year_codes, labels[city_codes])
+        updated = labels.copy()
+        np.minimum.at(updated, city_codes, year_labels[year_codes])
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    cities, years = np.unique(city_codes), np.unique(year_codes)
+    return len(cities) + len(years) - len(np.unique(labels[cities]))
+
+@memoize
+def fit_panel(yearly_data, outcome=PANEL_OUTCOME, regressors=PANEL_REGRESSORS):
+    """Two-way fixed-effects models of the yearly panel, one per regressor, in one batch.
+
+    Each model is outcome = slope * regressor + city effect + year effect, so the
+    slope only uses variation within a city relative to the same year elsewhere.
+    The effects are swept out of the outcome and regressor (within
+    transformation) rather than estimated as dummies, so memory grows with the
+    rows only, and the slope is the OLS of the demeaned outcome on the demeaned
+    regressor.
+
+    Args:
+        yearly_data (pd.DataFrame): Yearly averages and growth rates (calculate_growth_rates)
+        outcome (str): Outcome column
+        regressors (list): Regressor columns, each fitted in its own model
+
+    Returns:
+        dict: summary DataFrame (regressor, slope, slope_se, intercept, n, r2),
+            residuals DataFrame (city, year, '<regressor>_residual') and
+            city_effects DataFrame (city, '<regressor>_effect', relative to the
+            first year with observations)
+    """
+    regressors = [regressor for regressor in regressors if regressor in yearly_data.columns]
+    print(f"Fitting two-way fixed-effects models of {outcome} on {len(regressors)} regressors...")
+    rows = yearly_data[['city', 'year', outcome] + regressors].reset_index(drop=True)
+    city_codes, cities = pd.factorize(rows['city'], sort=True)
+    year_codes, years = pd.factorize(rows['year'], sort=True)
+    n_cities, n_years = len(cities), len(years)
+
+    x = rows[regressors].to_numpy(dtype=float).T
+    y = np.broadcast_to(rows[outcome].to_numpy(dtype=float), x.shape)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    n = valid.sum(axis=1)
+
+    # Within transformation of the outcome and every regressor on each model's sample
+    x_city, x_year = sweep_effects(x, city_codes, year_codes, n_cities, n_years, valid)
+    y_city, y_year = sweep_effects(y, city_codes, year_codes, n_cities, n_years, valid)
+    x_within = np.where(valid, x - x_city[:, city_codes] - x_year[:, year_codes], 0.0)
+    y_within = np.where(valid, y - y_city[:, city_codes] - y_year[:, year_codes], 0.0)
+
+    xx = (x_within ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(xx > 0, (x_within * y_within).sum(axis=1) / xx, np.nan)
+        residuals = np.where(valid, y_within - slope[:, np.newaxis] * x_within, np.nan)
+        rss = np.nansum(residuals ** 2, axis=1)
+
+        # Degrees of freedom left after the slope and the (non-collinear) city and year effects
+        ranks = np.array([effect_rank(city_codes[valid[k]], year_codes[valid[k]], n_cities, n_years)
+                          for k in range(len(regressors))])
+        dof = n - ranks - (xx > 0)
+        sigma2 = np.where(dof > 0, rss / dof, np.nan)
+        slope_se = np.sqrt(sigma2 / xx)
+
+        # The line through the sample means with the within slope, to draw over the pooled scatter
+        x_mean = np.where(valid, x, 0).sum(axis=1) / n
+        y_mean = np.where(valid, y, 0).sum(axis=1) / n
+        tss = (np.where(valid, y - y_mean[:, np.newaxis], 0.0) ** 2).sum(axis=1)
+        r2 = np.where(tss > 0, 1 - rss / tss, np.nan)
+
+    summary = pd.DataFrame({
+        'regressor': regressors,
+        'slope': slope,
+        'slope_se': slope_se,
+        'intercept': y_mean - slope * x_mean,
+        'n': n,
+        'r2': r2
+    })
+
+    # City effects of outcome - slope * regressor, with the first observed year's effect set to zero
+    partial = y - np.nan_to_num(slope)[:, np.newaxis] * x
+    city_effects_k, year_effects_k = sweep_effects(partial, city_codes, year_codes, n_cities, n_years, valid)
+    residuals_frame = rows[['city', 'year']].copy()
+    city_effects = pd.DataFrame({'city': list(cities)})
+    for k, regressor in enumerate(regressors):
+        residuals_frame[f'{regressor}_residual'] = residuals[k]
+        observed = np.bincount(city_codes, weights=valid[k], minlength=n_cities) > 0
+        observed_years = np.flatnonzero(np.bincount(year_codes, weights=valid[k], minlength=n_years) > 0)
+        base = year_effects_k[k, observed_years[0]] if len(observed_years) else 0.0
+        city_effects[f'{regressor}_effect'] = np.where(observed, city_effects_k[k] + base, np.nan)
+    return {'summary': summary, 'residuals': residuals_frame, 'city_effects': city_effects}
+
+class Regression:
+    """Fitted growth-vs-wage relationships of one panel, computed on first use and cached.
+
+    Attributes:
+        data (pd.DataFrame): The quarterly panel
+        yearly_data (pd.DataFrame): Its yearly averages and growth rates
+    """
+
+    def __init__(self, data, yearly_data):
+        self.data = data
+        self.yearly_data = yearly_data
+        self._windows = None
+        self._window_index = None
+        self._panel = None
+
+    def windows(self):
+        """Fits of every CAGR window (see fit_windows), kept after the first call to skip hashing the panel."""
+        if self._windows is None:
+            self._windows = fit_windows(self.data)
+            self._window_index = {window: w for w, window in enumerate(self._windows['windows'])}
+        return self._windows
+
+    def windows_built(self):
+        """Whether the window fits are computed, here or in the metrics cache, without computing them."""
+        if self._windows is None:
+            fits = fit_windows.cached(self.data)
+            if fits is MISSING:
+                return False
+            self._windows = fits
+            self._window_index = {window: w for w, window in enumerate(fits['windows'])}
+        return True
+
+    def window_position(self, start_year, end_year):
+        """Position of a window in the fits, None for windows outside the panel's years."""
+        self.windows()
+        return self._window_index.get((start_year, end_year))
+
+    def fit(self, start_year, end_year, measure='real_wage'):
+        """Cross-city fit of one wage CAGR on population CAGR for one window.
+
+        Returns:
+            dict: intercept, slope, their standard errors, n and r2, or None for
+                windows outside the panel's years
+        """
+        fits = self.windows()
+        w = self.window_position(start_year, end_year)
+        if w is None or measure not in fits['measures']:
+            return None
+        k = fits['measures'].index(measure)
+        intercept, slope = fits['coef'][w, k]
+        intercept_se, slope_se = fits['se'][w, k]
+        return {'intercept': intercept, 'slope': slope, 'intercept_se': intercept_se, 'slope_se': slope_se,
+                'n': int(fits['n'][w, k]), 'r2': fits['r2'][w, k]}
+
+    def residuals(self, start_year, end_year):
+        """Every city's residual (percentage points of wage CAGR) in one window.
+
+        Returns:
+            pd.DataFrame: city plus a '<prefix>_residual' column per wage measure,
+                named like the CAGR columns ('real_wage_residual', 'nominal_wage_residual')
+        """
+        fits = self.windows()
+        frame = pd.DataFrame({'city': fits['cities']})
+        w = self.window_position(start_year, end_year)
+        for k, measure in enumerate(fits['measures']):
+            frame[f'{CAGR_PREFIXES[measure]}_residual'] = fits['residuals'][:, w, k] if w is not None else np.nan
+        return frame
+
+    def panel(self):
+        """Two-way fixed-effects models of the yearly panel (see fit_panel), kept after the first call."""
+        if self._panel is None:
+            self._panel = fit_panel(self.yearly_data)
+        return self._panel
+
+    def panel_built(self):
+        """Whether the fixed-effects models are fitted, here or in the metrics cache, without fitting them."""
+        if self._panel is None:
+            models = fit_panel.cached(self.yearly_data)
+            if models is MISSING:
+                return False
+            self._panel = models
+        return True
+
+    def panel_fit(self, regressor='avg_real_wage'):
+        """Slope, intercept, standard error, n and r2 of one fixed-effects model, or None."""
+        summary = self.panel()['summary'].set_index('regressor')
+        if regressor not in summary.index:
+            return None
+        return summary.loc[regressor].to_dict()
+
+    def summary(self):
+        """Every window fit as a long table, e.g. to export or inspect.
+
+        Returns:
+            pd.DataFrame: start_year, end_year, measure, intercept, slope, their
+                standard errors, n and r2
+        """
+        fits = self.windows()
+        rows = []
+        for w, (start, end) in enumerate(fits['windows']):
+            for k, measure in enumerate(fits['measures']):
+                rows.append({'start_year': start, 'end_year': end, 'measure': measure,
+                             'intercept': fits['coef'][w, k, 0], 'slope': fits['coef'][w, k, 1],
+                             'intercept_se': fits['se'][w, k, 0], 'slope_se': fits['se'][w, k, 1],
+                             'n': fits['n'][w, k], 'r2': fits['r2'][w, k]})
+        return pd.DataFrame(rows)
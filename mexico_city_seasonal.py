@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Seasonal Adjustment
+This module seasonally adjusts every city x metric quarterly series with a
+classical multiplicative decomposition. All series are stacked into one
+(series x quarters) array and processed in blocks, across a process pool when
+there are many of them, and the adjusted panel is memoized in the metrics cache.
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import numpy as np
+
+from mexico_city_cache import memoize
+
+SEASONAL_METRICS = ['employment_rate', 'monthly_salary', 'population', 'real_wage']
+
+# Below this many series the adjustment runs in the calling process
+POOL_MIN_SERIES = 2000
+
+# Centered 2x4 moving average for quarterly data
+TREND_WEIGHTS = np.array([1, 2, 2, 2, 1]) / 8
+
+def decompose_block(values, quarters):
+    """Seasonally adjust a block of quarterly series.
+
+    Args:
+        values (np.ndarray): Array of shape (series, quarters), NaN for missing values
+        quarters (np.ndarray): Quarter number (1-4) of every column
+
+    Returns:
+        tuple: (adjusted values, seasonal factors), both shaped like values
+    """
+    n_series, n_quarters = values.shape
+    trend = np.full(values.shape, np.nan)
+    if n_quarters >= len(TREND_WEIGHTS):
+        windows = np.lib.stride_tricks.sliding_window_view(values, len(TREND_WEIGHTS), axis=1)
+        trend[:, 2:-2] = windows @ TREND_WEIGHTS
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        ratios = values / trend
+
+        # Average detrended ratio of each quarter, normalized to average 1 over the year
+        factors = np.column_stack([np.nanmean(ratios[:, quarters == q], axis=1) for q in range(1, 5)])
+        factors = factors / np.nanmean(factors, axis=1, keepdims=True)
+
+    # Series too short to estimate seasonality are left unadjusted
+    factors = np.where(np.isnan(factors), 1.0, factors)
+    seasonal = factors[:, quarters - 1]
+    return values / seasonal, seasonal
+
+def seasonally_adjust(values, quarters, workers=None):
+    """Seasonally adjust many series at once, in blocks across a process pool.
+
+    Args:
+        values (np.ndarray): Array of shape (series, quarters)
+        quarters (np.ndarray): Quarter number (1-4) of every column
+        workers (int): Number of processes; None uses one process for small
+            inputs and the number of CPUs otherwise
+
+    Returns:
+        tuple: (adjusted values, seasonal factors), both shaped like values
+    """
+    if workers is None:
+        workers = 1 if len(values) < POOL_MIN_SERIES else os.cpu_count()
+    if workers <= 1:
+        return decompose_block(values, quarters)
+
+    blocks = np.array_split(values, workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(decompose_block, blocks, [quarters] * len(blocks)))
+    return np.vstack([adjusted for adjusted, _ in results]), np.vstack([seasonal for _, seasonal in results])
+
+@memoize
+def adjust_panel(city_data, metrics=SEASONAL_METRICS, workers=None):
+    """Add seasonally adjusted and quarter-on-quarter growth columns to a panel.
+
+    Args:
+        city_data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Quarterly metrics to adjust
+        workers (int): Number of processes for the adjustment
+
+    Returns:
+        pd.DataFrame: Copy of the panel with '<metric>_sa' (seasonally adjusted
+            value) and '<metric>_qoq' (quarter-on-quarter growth of the adjusted
+            value, in %) columns for every metric
+    """
+    metrics = [metric for metric in metrics if metric in city_data.columns]
+    print(f"Seasonally adjusting {len(metrics)} metrics for {city_data['city'].nunique()} cities...")
+
+    # Stack every city x metric series into one (series x quarters) array
+    wide = city_data.pivot_table(index='city', columns=['year', 'quarter'], values=metrics, aggfunc='mean', dropna=False)
+    wide = wide.reindex(columns=wide.columns.sort_values())
+    periods = wide[metrics[0]].columns
+    cities = wide.index
+    quarters = periods.get_level_values('quarter').to_numpy(dtype=int)
+    values = np.vstack([wide[metric].to_numpy(dtype=float) for metric in metrics])
+
+    adjusted, _ = seasonally_adjust(values, quarters, workers)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        growth = (adjusted[:, 1:] / adjusted[:, :-1] - 1) * 100
+    growth = np.hstack([np.full((len(adjusted), 1), np.nan), growth])
+
+    # Back to long format, aligned with the panel's rows
+    result = city_data.copy()
+    n_cities, n_periods = len(cities), len(periods)
+    long_index = pd.MultiIndex.from_arrays([
+        np.repeat(cities.to_numpy(), n_periods),
+        np.tile(periods.get_level_values('year').to_numpy(), n_cities),
+        np.tile(quarters, n_cities)
+    ])
+    keys = pd.MultiIndex.from_arrays([result['city'], result['year'], result['quarter']])
+    for k, metric in enumerate(metrics):
+        block = slice(k * n_cities, (k + 1) * n_cities)
+        for suffix, array in [('sa', adjusted[block]), ('qoq', growth[block])]:
+            series = pd.Series(array.ravel(), index=long_index)
+            result[f'{metric}_{suffix}'] = series.reindex(keys).to_numpy()
+
+    return result
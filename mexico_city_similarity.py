@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Peer Cities
+This module finds the cities most similar to each one, from a standardized
+feature vector of its yearly population, wage, real-wage, housing and
+employment trajectories. The full distance matrix between cities (brute force,
+which is exact and cheap at this number of cities), every city's ranking of the
+others and the quarterly medians of its nearest peers are precomputed once per
+data version, so the dashboard's similar-cities panel and peer benchmark are
+lookups.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+
+from mexico_city_cache import MISSING, memoize
+from mexico_city_data_compiler import TIME_SERIES_METRICS, PeriodAggregates
+from mexico_city_uncertainty import nanmedian
+
+# Trajectories compared between cities
+SIMILARITY_METRICS = ['population', 'monthly_salary', 'real_wage', 'housing_index', 'employment_rate']
+
+# Metrics compared on a log scale, so a city twice as large is equally far whatever its size
+LOG_METRICS = ['population', 'monthly_salary', 'real_wage', 'housing_index']
+
+# Number of nearest cities whose median is the peer benchmark
+PEERS = 5
+
+def city_features(data, metrics=SIMILARITY_METRICS):
+    """Standardized feature vector of every city: its yearly average of each metric.
+
+    Every (metric, year) feature is standardized across cities; a missing year
+    counts as the average city. Each metric's block is scaled by the square
+    root of its number of years, so every metric weighs the same in distances.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Metrics whose trajectories are compared
+
+    Returns:
+        tuple: (cities, features of shape (cities, metrics * years))
+    """
+    aggregates = PeriodAggregates(data, metrics)
+    values = aggregates.values.copy()
+    for k, metric in enumerate(aggregates.metrics):
+        if metric in LOG_METRICS:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[:, :, k] = np.where(values[:, :, k] > 0, np.log(values[:, :, k]), np.nan)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        standardized = np.where(std > 0, (values - mean) / std, 0.0)
+    standardized = np.nan_to_num(standardized, nan=0.0)
+
+    years = max(len(aggregates.years), 1)
+    features = (standardized / np.sqrt(years)).transpose(0, 2, 1).reshape(len(aggregates.cities), -1)
+    return aggregates.cities, features
+
+@memoize
+def build_peer_index(data, metrics=SIMILARITY_METRICS, benchmark_metrics=TIME_SERIES_METRICS, peers=PEERS):
+    """Distances between all cities, their rankings and the quarterly medians of each city's peers.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Metrics whose trajectories are compared
+        benchmark_metrics (list): Metrics of the peer benchmarks
+        peers (int): Number of nearest cities in each benchmark
+
+    Returns:
+        dict: cities, distances (cities x cities), neighbours (each city's other
+            cities, nearest first), the years, quarters and time_points of the
+            periods, and medians of shape (benchmark metrics, cities, periods)
+    """
+    print(f"Building the peer-city index from {len(metrics)} metrics...")
+    cities, features = city_features(data, metrics)
+
+    # Brute-force Euclidean distances from one matrix product
+    squared = (features ** 2).sum(axis=1)
+    distances = np.sqrt(np.maximum(squared[:, np.newaxis] + squared[np.newaxis, :] - 2 * features @ features.T, 0))
+    np.fill_diagonal(distances, np.inf)
+    neighbours = np.argsort(distances, axis=1, kind='stable')[:, :max(len(cities) - 1, 0)]
+    np.fill_diagonal(distances, 0.0)
+
+    # Quarterly median of each city's nearest peers
+    benchmark_metrics = [metric for metric in benchmark_metrics if metric in data.columns]
+    wide = data.pivot_table(index='city', columns=['year', 'quarter'], values=benchmark_metrics, aggfunc='mean',
+                            dropna=False).reindex(cities)
+    wide = wide.reindex(columns=wide.columns.sort_values())
+    periods = wide[benchmark_metrics[0]].columns
+    values = np.stack([wide[metric].to_numpy(dtype=float) for metric in benchmark_metrics])
+    medians = nanmedian(values[:, neighbours[:, :peers]], axis=2)
+    years = periods.get_level_values('year').to_numpy()
+    quarters = periods.get_level_values('quarter').to_numpy()
+
+    return {
+        'cities': cities,
+        'distances': distances,
+        'neighbours': neighbours,
+        'benchmark_metrics': benchmark_metrics,
+        'years': years,
+        'quarters': quarters,
+        'time_points': [f"{year}Q{quarter}" for year, quarter in zip(years, quarters)],
+        'medians': medians
+    }
+
+class PeerIndex:
+    """Nearest cities and peer benchmarks of one panel, computed on first use and cached.
+
+    Attributes:
+        data (pd.DataFrame): The panel
+        peers (int): Number of nearest cities in each benchmark
+    """
+
+    def __init__(self, data, peers=PEERS):
+        self.data = data
+        self.peers = peers
+        self._index = None
+        self._city_index = None
+
+    def index(self):
+        """The precomputed index (see build_peer_index), kept after the first call to skip hashing the panel."""
+        if self._index is None:
+            self._index = build_peer_index(self.data, SIMILARITY_METRICS, TIME_SERIES_METRICS, self.peers)
+            self._city_index = {name: i for i, name in enumerate(self._index['cities'])}
+        return self._index
+
+    def built(self):
+        """Whether the index is built, here or in the metrics cache, without building it."""
+        if self._index is None:
+            index = build_peer_index.cached(self.data, SIMILARITY_METRICS, TIME_SERIES_METRICS, self.peers)
+            if index is MISSING:
+                return False
+            self._index = index
+            self._city_index = {name: i for i, name in enumerate(index['cities'])}
+        return True
+
+    def position(self, city):
+        """Row of a city in the index, None for unknown cities."""
+        self.index()
+        return self._city_index.get(city)
+
+    def similar(self, city, k=None):
+        """The k cities most similar to a city, nearest first.
+
+        Returns:
+            pd.DataFrame: rank, city and distance (standard deviations, averaged
+                over years) of each similar city; empty for unknown cities
+        """
+        index = self.index()
+        i = self.position(city)
+        if i is None:
+            return pd.DataFrame({'rank': [], 'city': [], 'distance': []})
+        nearest = index['neighbours'][i, :k or self.peers]
+        return pd.DataFrame({
+            'rank': np.arange(1, len(nearest) + 1),
+            'city': [index['cities'][j] for j in nearest],
+            'distance': index['distances'][i, nearest]
+        })
+
+    def benchmark(self, city, metric):
+        """Quarterly median of a city's nearest peers, an alternative to the median of all cities.
+
+        Returns:
+            pd.DataFrame: year, quarter, time_point and p50 (as in
+                calculate_time_series_bands), or None for unknown cities or metrics
+        """
+        index = self.index()
+        i = self.position(city)
+        if i is None or metric not in index['benchmark_metrics']:
+            return None
+        return pd.DataFrame({
+            'year': index['years'],
+            'quarter': index['quarters'],
+            'time_point': index['time_points'],
+            'p50': index['medians'][index['benchmark_metrics'].index(metric), i]
+        })
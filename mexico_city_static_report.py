@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Static Report Renderer
+This script renders the 8 dashboard figures for every city as PNG/SVG images
+and combines them into one PDF brief per city. Rendering is headless (matplotlib
+Agg) and runs across a process pool, with one persistent renderer per worker.
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+
+from mexico_city_data_compiler import CityPanel
+from mexico_city_figure_tables import COMPILED_PANEL_FILE, END_YEAR, START_YEAR, FigureTables, city_slug, parse_period
+
+HIGHLIGHT_COLOR = 'red'
+BASE_COLOR = '#636efa'
+
+class StaticRenderer:
+    """A reusable Agg figure that draws one chart at a time.
+
+    Creating the figure and canvas once per worker avoids paying the renderer
+    startup cost for every image.
+    """
+
+    def __init__(self, width=11, height=6.5, dpi=150):
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+
+    def render(self, draw, *args):
+        """Clear the figure and draw a new chart on a fresh set of axes."""
+        self.figure.clf()
+        ax = self.figure.add_subplot(1, 1, 1)
+        draw(ax, *args)
+        ax.grid(True, alpha=0.3)
+        self.figure.tight_layout()
+        return self.figure
+
+    def save(self, path, fmt):
+        self.figure.savefig(path, format=fmt)
+
+# Drawing functions (static equivalents of the dashboard figures)
+def _highlight(ax, x, y, label):
+    """Draw the selected city as a red marker on top of the other points."""
+    if len(x):
+        ax.scatter(x, y, s=120, color=HIGHLIGHT_COLOR, edgecolors='black', linewidths=1.5, zorder=3, label=label)
+        ax.legend(loc='best')
+
+def draw_employment_vs_population(ax, panel, selected_city):
+    """Employment rate vs. population for all cities, latest year (Fig. 1)."""
+    latest_data = panel.latest
+    ax.scatter(latest_data['population'], latest_data['employment_rate'], s=50, color=BASE_COLOR)
+    for _, row in latest_data.iterrows():
+        ax.annotate(row['city'], (row['population'], row['employment_rate']),
+                    textcoords='offset points', xytext=(0, 6), ha='center', fontsize=7)
+    city_data = panel.latest_city(selected_city)
+    _highlight(ax, city_data['population'], city_data['employment_rate'], selected_city)
+    ax.set_title("Employment Rate vs. Population by City (Latest Year)")
+    ax.set_xlabel("Population")
+    ax.set_ylabel("Employment Rate (%)")
+
+def draw_population_growth_boxplot(ax, panel, selected_city, box_stats, outliers):
+    """Population growth boxplots by year, from the precomputed statistics (Fig. 2)."""
+    boxes = [
+        dict(med=row['median'], q1=row['q1'], q3=row['q3'], whislo=row['lowerfence'], whishi=row['upperfence'],
+             fliers=outliers.loc[outliers['year'] == row['year'], 'population_growth'].values)
+        for _, row in box_stats.iterrows()
+    ]
+    years = list(box_stats['year'])
+    ax.bxp(boxes, positions=np.arange(len(years)), widths=0.6)
+    city_data = panel.city(selected_city).dropna(subset=['population_growth'])
+    city_data = city_data[city_data['year'].isin(years)]
+    positions = [years.index(year) for year in city_data['year']]
+    _highlight(ax, positions, city_data['population_growth'], selected_city)
+    ax.set_xticks(np.arange(len(years)))
+    ax.set_xticklabels([str(year) for year in years])
+    ax.set_title("Population Growth Boxplots by Year")
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Population Growth (%)")
+
+def draw_population_growth_vs_real_wages(ax, panel, selected_city):
+    """Population growth vs. real wages, all city-years (Fig. 3)."""
+    filtered_data = panel.frame.dropna(subset=['population_growth', 'avg_real_wage'])
+    ax.scatter(filtered_data['avg_real_wage'], filtered_data['population_growth'], s=25, alpha=0.6, color=BASE_COLOR)
+    city_data = panel.city(selected_city).dropna(subset=['population_growth', 'avg_real_wage'])
+    _highlight(ax, city_data['avg_real_wage'], city_data['population_growth'], selected_city)
+    ax.set_title("Population Growth vs. Real Wages")
+    ax.set_xlabel("Real Wages (Monthly Salary / Housing Index)")
+    ax.set_ylabel("Population Growth (%)")
+
+def draw_cagr_scatter(ax, panel, selected_city, y_var, y_label, title):
+    """CAGR of a wage measure vs. population CAGR (Figs. 4-5)."""
+    filtered_data = panel.frame.dropna(subset=[y_var, 'population_cagr'])
+    ax.scatter(filtered_data['population_cagr'], filtered_data[y_var], s=50, color=BASE_COLOR)
+    for _, row in filtered_data.iterrows():
+        ax.annotate(row['city'], (row['population_cagr'], row[y_var]),
+                    textcoords='offset points', xytext=(0, 6), ha='center', fontsize=7)
+    city_data = panel.city(selected_city).dropna(subset=[y_var, 'population_cagr'])
+    _highlight(ax, city_data['population_cagr'], city_data[y_var], selected_city)
+    ax.axhline(0, linestyle='--', color='gray', linewidth=1)
+    ax.axvline(0, linestyle='--', color='gray', linewidth=1)
+    ax.set_title(title)
+    ax.set_xlabel("Population CAGR (%)")
+    ax.set_ylabel(y_label)
+
+def draw_time_series(ax, panel, selected_city, time_series_bands, value_col, value_label, title):
+    """Quarterly series of the selected city against all-city quantile bands (Figs. 6-8)."""
+    bands = time_series_bands[value_col]
+    positions = np.arange(len(bands))
+    ax.fill_between(positions, bands['p10'], bands['p90'], color='gray', alpha=0.15, linewidth=0, label='All Cities (p10-p90)')
+    ax.fill_between(positions, bands['p25'], bands['p75'], color='gray', alpha=0.3, linewidth=0, label='All Cities (p25-p75)')
+    ax.plot(positions, bands['p50'], color='gray', label='Median of All Cities')
+    city_data = panel.city(selected_city)
+    city_positions = city_data['time_point'].map(dict(zip(bands['time_point'], positions)))
+    ax.plot(city_positions, city_data[value_col], marker='o', markersize=3, color=HIGHLIGHT_COLOR, label=selected_city)
+    ax.set_xticks(positions[::4])
+    ax.set_xticklabels(bands['time_point'][::4], rotation=45)
+    ax.legend(loc='best')
+    ax.set_title(title)
+    ax.set_xlabel("Time Period")
+    ax.set_ylabel(value_label)
+
+def report_pages(city, tables, cagr_tables):
+    """List the (file name, draw function, arguments) of every figure for a city."""
+    pages = [
+        ("1_employment_vs_population", draw_employment_vs_population, (tables.city_panel, city)),
+        ("2_population_growth_boxplot", draw_population_growth_boxplot,
+         (tables.yearly_panel, city, tables.population_growth_box_stats, tables.population_growth_outliers)),
+        ("3_population_growth_vs_real_wages", draw_population_growth_vs_real_wages, (tables.yearly_panel, city))
+    ]
+    for (period_start, period_end), cagr_table in cagr_tables.items():
+        pages.append((
+            f"4_cagr_real_wages_vs_population_{period_start}_{period_end}", draw_cagr_scatter,
+            (cagr_table, city, 'real_wage_cagr', 'Real Wage CAGR (%)',
+             f"CAGR of Real Wages vs. Population Growth ({period_start}-{period_end})")
+        ))
+        pages.append((
+            f"5_cagr_nominal_wages_vs_population_{period_start}_{period_end}", draw_cagr_scatter,
+            (cagr_table, city, 'nominal_wage_cagr', 'Nominal Wage CAGR (%)',
+             f"CAGR of Nominal Wages vs. Population Growth ({period_start}-{period_end})")
+        ))
+    pages += [
+        ("6_nominal_wages_over_time", draw_time_series,
+         (tables.city_panel, city, tables.time_series_bands, 'monthly_salary', 'Monthly Nominal Salary',
+          f"Nominal Wages Over Time for {city}")),
+        ("7_real_wages_over_time", draw_time_series,
+         (tables.city_panel, city, tables.time_series_bands, 'real_wage', 'Real Wage (Monthly Salary / Housing Index)',
+          f"Real Wages Over Time for {city}")),
+        ("8_housing_costs_over_time", draw_time_series,
+         (tables.city_panel, city, tables.time_series_bands, 'housing_index', 'Housing Cost Index',
+          f"Housing Cost Index Over Time for {city}"))
+    ]
+    return pages
+
+# Worker pool
+_renderer = None
+
+# Tables of the report, loaded by render_all_reports (and inherited by forked workers)
+_tables = None
+
+def _init_worker(dpi, store_file, panel_file):
+    """Create the persistent renderer of a worker process, loading the tables if it wasn't forked."""
+    global _renderer, _tables
+    _renderer = StaticRenderer(dpi=dpi)
+    if _tables is None:
+        _tables = FigureTables(store_file, panel_file)
+
+def render_city_report(city, output_dir, cagr_tables, formats):
+    """Render every figure of a city as images and as one combined PDF brief."""
+    global _renderer
+    if _renderer is None:
+        _renderer = StaticRenderer()
+
+    city_dir = os.path.join(output_dir, city_slug(city))
+    os.makedirs(city_dir, exist_ok=True)
+
+    with PdfPages(os.path.join(city_dir, f"{city_slug(city)}_brief.pdf")) as pdf:
+        for name, draw, args in report_pages(city, _tables, cagr_tables):
+            figure = _renderer.render(draw, *args)
+            for fmt in formats:
+                _renderer.save(os.path.join(city_dir, f"{name}.{fmt}"), fmt)
+            pdf.savefig(figure)
+
+    return city
+
+def render_all_reports(output_dir="static_report", periods=None, formats=('png', 'svg'), workers=None, dpi=150,
+                       store_file=None, panel_file=COMPILED_PANEL_FILE):
+    """Render the static report of every city across a process pool.
+
+    Args:
+        store_file (str): DuckDB file written by the compiler's --store, or None
+            to read panel_file
+        panel_file (str): CSV written by mexico_city_data_compiler.py
+
+    Returns:
+        list: Cities that were rendered
+    """
+    global _tables
+    _tables = FigureTables(store_file, panel_file)
+    periods = periods or [(_tables.start_year, _tables.end_year)]
+    os.makedirs(output_dir, exist_ok=True)
+    cagr_tables = {period: CityPanel(_tables.period_aggregates.cagr(*period), []) for period in periods}
+
+    cities = _tables.cities
+    print(f"Rendering static reports for {len(cities)} cities to {output_dir}...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(dpi, store_file, panel_file)) as executor:
+        futures = [executor.submit(render_city_report, city, output_dir, cagr_tables, formats) for city in cities]
+        rendered = [future.result() for future in futures]
+
+    print(f"Rendered {len(rendered)} city reports")
+    return rendered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render static PNG/SVG/PDF reports for every city")
+    parser.add_argument('--output-dir', default="static_report", help="Directory for the rendered reports")
+    parser.add_argument('--formats', nargs='+', default=['png', 'svg'], choices=['png', 'svg'],
+                        help="Image formats to write for each figure")
+    parser.add_argument('--periods', nargs='+', default=[f"{START_YEAR}-{END_YEAR}"],
+                        help="CAGR periods to render, as START-END")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of rendering processes (defaults to the number of CPUs)")
+    parser.add_argument('--dpi', type=int, default=150, help="Resolution of the PNG images")
+    parser.add_argument('--store', default=os.environ.get('MEXICO_CITY_STORE'),
+                        help="DuckDB file written by the compiler's --store (defaults to $MEXICO_CITY_STORE)")
+    parser.add_argument('--panel-file', default=COMPILED_PANEL_FILE,
+                        help="Compiled panel to read without a store (compiled from the source files if missing)")
+    args = parser.parse_args()
+
+    render_all_reports(args.output_dir, [parse_period(p) for p in args.periods], args.formats, args.workers, args.dpi,
+                       args.store, args.panel_file)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mexico City Growth Uncertainty
+This module computes bootstrap confidence intervals for every city's CAGR and
+for the cross-city medians of the time-series figures, since the ENOE
+employment and salary series are survey estimates. Resamples are drawn as
+batched NumPy arrays (resamples x cities x ...), in blocks with their own
+seeds, across a process pool when there are many of them; results are the
+same whatever the number of processes, and are cached by data version.
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from mexico_city_cache import MISSING, memoize
+from mexico_city_data_compiler import CAGR_PREFIXES, TIME_SERIES_METRICS
+
+BOOTSTRAP_RESAMPLES = 1000
+CONFIDENCE = 0.90
+BOOTSTRAP_SEED = 20240101
+
+# Values drawn per block of resamples, which bounds the memory of a block (80MB of floats)
+BLOCK_VALUES = 10_000_000
+
+# Below this many resampled values the bootstrap runs in the calling process
+POOL_MIN_VALUES = 50_000_000
+
+def run_blocks(block_fn, args, resamples, seed, values_per_resample, workers=None):
+    """Run a bootstrap in blocks of resamples, across a process pool for large ones.
+
+    Every block gets its own seed spawned from seed, so the result only depends
+    on the seed, the number of resamples and the data size, not on the number of
+    processes.
+
+    Args:
+        block_fn (callable): block_fn(seed, size, *args) returning an array with resamples first
+        args (tuple): Arrays passed to every block
+        resamples (int): Total number of resamples
+        seed (int): Seed of the whole bootstrap
+        values_per_resample (int): Values drawn per resample, to decide on the pool
+        workers (int): Number of processes; None picks one or the number of CPUs
+
+    Returns:
+        np.ndarray: Results of all blocks, concatenated along the first axis
+    """
+    block = max(1, BLOCK_VALUES // max(values_per_resample, 1))
+    sizes = [min(block, resamples - start) for start in range(0, resamples, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers is None:
+        workers = 1 if resamples * values_per_resample < POOL_MIN_VALUES else os.cpu_count()
+    if workers <= 1 or len(sizes) <= 1:
+        results = [block_fn(block_seed, size, *args) for block_seed, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as executor:
+            results = list(executor.map(block_fn, seeds, sizes, *[[arg] * len(sizes) for arg in args]))
+    return np.concatenate(results)
+
+def interval(samples, confidence):
+    """Percentile interval over the first (resample) axis, NaN where every resample is NaN."""
+    tail = (1 - confidence) / 2 * 100
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+
+def endpoint_quarters(data, metrics, start_year, end_year):
+    """Quarterly values of the first and last year of the window of every city.
+
+    The endpoints are the first and last years with rows in the window, and only
+    cities with at least two such years are kept, as in calculate_cagr. Within a
+    year the observed quarters come first, so resampling draws among them.
+
+    Returns:
+        tuple: (cities, values of shape (metrics, cities, 2, 4), observed quarters of shape (metrics, cities, 2))
+    """
+    window = data[(data['year'] >= start_year) & (data['year'] <= end_year)]
+    years = window.groupby('city')['year'].agg(['min', 'max', 'nunique'])
+    years = years[years['nunique'] >= 2]
+    cities = years.index.tolist()
+    values = np.full((len(metrics), len(cities), 2, 4), np.nan)
+    if not cities:
+        return cities, values, np.zeros(values.shape[:-1], dtype=int)
+
+    quarters = window.pivot_table(index=['city', 'year'], columns='quarter', values=metrics, aggfunc='mean', dropna=False)
+    for k, metric in enumerate(metrics):
+        wide = quarters[metric].reindex(columns=range(1, 5))
+        for e, edge in enumerate(['min', 'max']):
+            rows = pd.MultiIndex.from_arrays([cities, years[edge].to_numpy()])
+            values[k, :, e] = wide.reindex(rows).to_numpy(dtype=float)
+
+    # NaN sorts last, so the first count quarters of every year are the observed ones
+    values = np.sort(values, axis=-1)
+    return cities, values, (~np.isnan(values)).sum(axis=-1)
+
+def cagr_block(seed, size, values, counts, years):
+    """CAGR (%) of size resamples of the quarters of each endpoint year, shape (size, metrics, cities)."""
+    rng = np.random.default_rng(seed)
+    draws = np.floor(rng.random((size,) + values.shape) * counts[..., np.newaxis]).astype(np.intp)
+    resampled = np.take_along_axis(np.broadcast_to(values, draws.shape), draws, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        yearly = np.nanmean(resampled, axis=-1)
+        first, last = yearly[..., 0], yearly[..., 1]
+        return np.where(first > 0, (last / first) ** (1 / years) - 1, np.nan) * 100
+
+@memoize
+def bootstrap_cagr(data, start_year, end_year, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE,
+                   seed=BOOTSTRAP_SEED):
+    """Bootstrap confidence intervals of every city's CAGR over a window.
+
+    The CAGR only depends on the yearly averages of the first and last year, so
+    each resample redraws the quarters of those two years with replacement.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        start_year (int): Start year of the window
+        end_year (int): End year of the window
+        resamples (int): Number of bootstrap resamples
+        confidence (float): Coverage of the intervals, e.g. 0.90
+        seed (int): Seed of the resampling
+
+    Returns:
+        pd.DataFrame: city plus '<prefix>_cagr_low' and '<prefix>_cagr_high' for
+            every CAGR column of calculate_cagr
+    """
+    print(f"Bootstrapping CAGR intervals for {start_year}-{end_year} ({resamples} resamples)...")
+    metrics = list(CAGR_PREFIXES)
+    cities, values, counts = endpoint_quarters(data, metrics, start_year, end_year)
+    years = end_year - start_year if end_year > start_year else 1
+
+    result = pd.DataFrame({'city': cities})
+    columns = [f'{prefix}_cagr_{bound}' for prefix in CAGR_PREFIXES.values() for bound in ['low', 'high']]
+    if not cities:
+        # No city has two years in the window (e.g. a single-year window)
+        return result.reindex(columns=['city'] + columns).astype({column: float for column in columns})
+
+    samples = run_blocks(cagr_block, (values, counts, years), resamples, seed, values.size)
+    low, high = interval(samples, confidence)
+
+    for k, prefix in enumerate(CAGR_PREFIXES.values()):
+        result[f'{prefix}_cagr_low'] = low[k]
+        result[f'{prefix}_cagr_high'] = high[k]
+    return result
+
+def nanmedian(values, axis):
+    """Median ignoring NaN, from one sort (np.nanmedian loops over slices when NaNs are present)."""
+    ordered = np.sort(values, axis=axis)
+    counts = np.expand_dims((~np.isnan(ordered)).sum(axis=axis), axis)
+
+    # Middle two observed values (the same one for odd counts); NaN sorts last
+    lower = np.take_along_axis(ordered, np.maximum(counts - 1, 0) // 2, axis=axis)
+    upper = np.take_along_axis(ordered, np.minimum(counts // 2, ordered.shape[axis] - 1), axis=axis)
+    return np.squeeze(np.where(counts > 0, (lower + upper) / 2, np.nan), axis=axis)
+
+def median_block(seed, size, values):
+    """Cross-city medians of size resamples of the cities, shape (size, metrics, quarters)."""
+    rng = np.random.default_rng(seed)
+    draws = rng.integers(0, values.shape[1], size=(size, values.shape[1]))
+    return nanmedian(values[:, draws], axis=2).transpose(1, 0, 2)
+
+@memoize
+def bootstrap_median_bands(data, metrics=TIME_SERIES_METRICS, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE,
+                           seed=BOOTSTRAP_SEED):
+    """Bootstrap confidence intervals of the cross-city median of each metric for every quarter.
+
+    Each resample redraws the cities with replacement.
+
+    Args:
+        data (pd.DataFrame): Combined dataset with all metrics
+        metrics (list): Metrics to compute the intervals for
+        resamples (int): Number of bootstrap resamples
+        confidence (float): Coverage of the intervals, e.g. 0.90
+        seed (int): Seed of the resampling
+
+    Returns:
+        dict: Metric mapped to a DataFrame of year, quarter, time_point, p50,
+            p50_low and p50_high (p50 as in calculate_time_series_bands)
+    """
+    metrics = [metric for metric in metrics if metric in data.columns]
+    print(f"Bootstrapping cross-city median intervals for {len(metrics)} metrics ({resamples} resamples)...")
+    wide = data.pivot_table(index='city', columns=['year', 'quarter'], values=metrics, aggfunc='mean', dropna=False)
+    wide = wide.reindex(columns=wide.columns.sort_values())
+    periods = wide[metrics[0]].columns
+    values = np.stack([wide[metric].to_numpy(dtype=float) for metric in metrics])
+
+    samples = run_blocks(median_block, (values,), resamples, seed, values.size)
+    low, high = interval(samples, confidence)
+    medians = nanmedian(values, axis=1)
+
+    years = periods.get_level_values('year').to_numpy()
+    quarters = periods.get_level_values('quarter').to_numpy()
+    return {metric: pd.DataFrame({
+        'year': years,
+        'quarter': quarters,
+        'time_point': [f"{year}Q{quarter}" for year, quarter in zip(years, quarters)],
+        'p50': medians[k],
+        'p50_low': low[k],
+        'p50_high': high[k]
+    }) for k, metric in enumerate(metrics)}
+
+class Bootstrap:
+    """Bootstrap confidence intervals of one panel, computed on first use and cached.
+
+    Attributes:
+        data (pd.DataFrame): The panel
+        resamples (int): Number of bootstrap resamples
+        confidence (float): Coverage of the intervals
+    """
+
+    def __init__(self, data, resamples=BOOTSTRAP_RESAMPLES, confidence=CONFIDENCE, seed=BOOTSTRAP_SEED):
+        self.data = data
+        self.resamples = resamples
+        self.confidence = confidence
+        self.seed = seed
+        self._cagr = {}
+        self._median_bands = None
+
+    def cagr(self, start_year, end_year):
+        """Intervals of every city's CAGR over a window (see bootstrap_cagr), kept per window to skip hashing the panel."""
+        window = (start_year, end_year)
+        if window not in self._cagr:
+            self._cagr[window] = bootstrap_cagr(self.data, start_year, end_year, self.resamples, self.confidence,
+                                                self.seed)
+        return self._cagr[window].copy()
+
+    def cagr_built(self, start_year, end_year):
+        """Whether the intervals of a window are computed, here or in the metrics cache, without computing them."""
+        window = (start_year, end_year)
+        if window not in self._cagr:
+            intervals = bootstrap_cagr.cached(self.data, start_year, end_year, self.resamples, self.confidence,
+                                              self.seed)
+            if intervals is MISSING:
+                return False
+            self._cagr[window] = intervals
+        return True
+
+    def median_bands(self, metric):
+        """Intervals of the cross-city median of one metric for every quarter (see bootstrap_median_bands)."""
+        if self._median_bands is None:
+            self._median_bands = bootstrap_median_bands(self.data, TIME_SERIES_METRICS, self.resamples,
+                                                        self.confidence, self.seed)
+        return self._median_bands[metric]
+
+    def median_bands_built(self):
+        """Whether the median intervals are computed, here or in the metrics cache, without computing them."""
+        if self._median_bands is None:
+            bands = bootstrap_median_bands.cached(self.data, TIME_SERIES_METRICS, self.resamples, self.confidence,
+                                                  self.seed)
+            if bands is MISSING:
+                return False
+            self._median_bands = bands
+        return True
+
+def error_bars(frame, columns):
+    """Distances from each value to its interval bounds, as plotly error bar columns.
+
+    Args:
+        frame (pd.DataFrame): Table with '<column>_low' and '<column>_high' for every column
+        columns (list): Columns that get error bars
+
+    Returns:
+        pd.DataFrame: Copy of frame with '<column>_plus' and '<column>_minus' columns
+    """
+    frame = frame.copy()
+    for column in columns:
+        # A percentile interval of a skewed estimate may not contain it; never draw negative bars
+        frame[f'{column}_plus'] = (frame[f'{column}_high'] - frame[column]).clip(lower=0)
+        frame[f'{column}_minus'] = (frame[column] - frame[f'{column}_low']).clip(lower=0)
+    return frame
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Keys and misses of the metrics cache in mexico_city_cache.py, checked with pytest.
+"""
+
+import mexico_city_cache
+from mexico_city_cache import MISSING, MetricsCache, memoize
+
+def test_cached_none_is_not_a_miss():
+    cache = MetricsCache(disk_dir=None)
+    calls = []
+
+    @memoize(cache=cache)
+    def nothing(value):
+        calls.append(value)
+        return None
+
+    assert nothing.cached(1) is MISSING
+    assert nothing(1) is None
+    assert nothing.cached(1) is None
+    assert nothing(1) is None
+    assert calls == [1]
+    assert cache.stats()['misses'] == 1
+
+def test_code_change_invalidates_results(monkeypatch):
+    cache = MetricsCache(disk_dir=None)
+
+    @memoize(cache=cache)
+    def double(value):
+        return 2 * value
+
+    assert double(2) == 4
+    assert double.cached(2) == 4
+    monkeypatch.setattr(mexico_city_cache, 'code_version', lambda: 'edited')
+    assert double.cached(2) is MISSING
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Parity of the queries of mexico_city_duckdb.py's PanelStore with the in-memory
+computations of mexico_city_data_compiler.py, checked with pytest.
+"""
+
+import io
+import contextlib
+import pandas as pd
+import pytest
+
+pytest.importorskip('duckdb')
+
+from mexico_city_data_compiler import (
+    PeriodAggregates, calculate_boxplot_stats, calculate_growth_rates, calculate_time_series_bands
+)
+from mexico_city_duckdb import PanelStore, write_store
+
+WINDOWS = [(2005, 2024), (2015, 2020), (2017, 2018), (2017, 2017), (2030, 2035)]
+
+@pytest.fixture(scope='module', params=['all', 'single-year'])
+def stored(request, panel, tmp_path_factory):
+    """The panel and its yearly growth (or one year of both), and a store written from them."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        data, yearly = panel, calculate_growth_rates(panel)
+        if request.param == 'single-year':
+            data = data[data['year'] == 2017].reset_index(drop=True)
+            yearly = yearly[yearly['year'] == 2017].reset_index(drop=True)
+        path = tmp_path_factory.mktemp('store') / 'panel.duckdb'
+        write_store(str(path), {'city_data': data, 'yearly_growth': yearly})
+    return data, yearly, PanelStore(str(path))
+
+def test_bands(stored):
+    data, _, store = stored
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = calculate_time_series_bands(data)
+    bands = store.bands()
+    assert list(bands) == list(expected)
+    for metric in expected:
+        pd.testing.assert_frame_equal(bands[metric], expected[metric])
+
+def test_boxplot_stats(stored):
+    _, yearly, store = stored
+    expected_stats, expected_outliers = calculate_boxplot_stats(yearly, 'population_growth')
+    stats, outliers = store.boxplot_stats('yearly_growth', 'population_growth')
+    pd.testing.assert_frame_equal(stats, expected_stats)
+    pd.testing.assert_frame_equal(outliers, expected_outliers)
+
+@pytest.mark.parametrize('start_year,end_year', WINDOWS)
+def test_cagr(stored, start_year, end_year):
+    data, _, store = stored
+    pd.testing.assert_frame_equal(store.cagr(start_year, end_year), PeriodAggregates(data).cagr(start_year, end_year))
+
+@pytest.mark.parametrize('start_year,end_year', WINDOWS)
+def test_window_means(stored, start_year, end_year):
+    data, _, store = stored
+    pd.testing.assert_frame_equal(store.window_means(start_year, end_year),
+                                  PeriodAggregates(data).window_means(start_year, end_year))
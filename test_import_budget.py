@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Import-time budget of the compiler, the dashboard and the figure tables, checked with pytest.
+Runs the checks of mexico_city_import_budget.py against import_budget.json.
+"""
+
+import os
+import json
+import pytest
+
+from mexico_city_import_budget import BUDGET_FILE, FORBIDDEN_IMPORTS, check_budget
+
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), BUDGET_FILE)
+
+# Imports per module; the fastest is compared with the snapshot
+REPEATS = 3
+
+@pytest.fixture(scope='module')
+def budget_results():
+    with open(BUDGET_PATH) as f:
+        budget = json.load(f)
+    return budget, check_budget(budget, REPEATS)
+
+def test_every_budgeted_module_has_forbidden_imports(budget_results):
+    budget, _ = budget_results
+    assert set(budget) == set(FORBIDDEN_IMPORTS)
+
+def test_no_forbidden_imports_at_startup(budget_results):
+    _, (_, failures) = budget_results
+    assert [failure for failure in failures if 'at startup' in failure] == []
+
+def test_import_time_within_budget(budget_results):
+    _, (_, failures) = budget_results
+    assert [failure for failure in failures if 'limit' in failure] == []
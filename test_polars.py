@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Parity of the Polars backend in mexico_city_polars.py with the pandas
+implementations of mexico_city_data_compiler.py, checked with pytest.
+"""
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('polars')
+
+import mexico_city_data_compiler
+import mexico_city_polars
+from conftest import random_sources
+
+@pytest.fixture(autouse=True)
+def pandas_backend(monkeypatch):
+    # The compiler's functions dispatch to Polars when it is the selected backend
+    monkeypatch.setattr(mexico_city_data_compiler, 'BACKEND', 'pandas')
+
+@pytest.mark.parametrize('sources', [random_sources(40, seed=2), ({}, {}, {}, {}, [])], ids=['random', 'empty'])
+def test_compile_data(sources):
+    pd.testing.assert_frame_equal(mexico_city_polars.compile_data(*sources),
+                                  mexico_city_data_compiler.compile_data(*sources))
+
+@pytest.mark.parametrize('years', [None, (2017, 2017), (2030, 2030)], ids=['all', 'single-year', 'empty'])
+def test_calculate_growth_rates(panel, years):
+    if years is not None:
+        panel = panel[(panel['year'] >= years[0]) & (panel['year'] <= years[1])]
+    pd.testing.assert_frame_equal(mexico_city_polars.calculate_growth_rates(panel),
+                                  mexico_city_data_compiler.calculate_growth_rates(panel))
+
+@pytest.mark.parametrize('start_year,end_year', [(2005, 2024), (2015, 2020), (2017, 2017), (2030, 2035)])
+def test_calculate_cagr(panel, start_year, end_year):
+    pd.testing.assert_frame_equal(mexico_city_polars.calculate_cagr(panel, start_year, end_year),
+                                  mexico_city_data_compiler.calculate_cagr(panel, start_year, end_year))
+
+def test_calculate_cagr_of_empty_panel(panel):
+    empty = panel.iloc[0:0]
+    pd.testing.assert_frame_equal(mexico_city_polars.calculate_cagr(empty, 2015, 2020),
+                                  mexico_city_data_compiler.calculate_cagr(empty, 2015, 2020))
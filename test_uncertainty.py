@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Bootstrap intervals of mexico_city_uncertainty.py, checked with pytest.
+"""
+
+import pytest
+
+from mexico_city_uncertainty import Bootstrap, bootstrap_cagr
+
+RESAMPLES = 50
+
+@pytest.mark.parametrize('start_year,end_year', [(2017, 2017), (2030, 2035)])
+def test_cagr_without_two_year_cities_is_empty(panel, start_year, end_year):
+    intervals = Bootstrap(panel, resamples=RESAMPLES).cagr(start_year, end_year)
+    assert intervals.empty
+    assert list(intervals.columns) == ['city', 'population_cagr_low', 'population_cagr_high',
+                                       'real_wage_cagr_low', 'real_wage_cagr_high',
+                                       'nominal_wage_cagr_low', 'nominal_wage_cagr_high']
+
+def test_cagr_intervals_bracket_every_city(panel):
+    intervals = bootstrap_cagr(panel, 2015, 2020, resamples=RESAMPLES)
+    assert intervals['city'].is_unique and len(intervals) > 0
+    bounded = intervals.dropna()
+    assert (bounded['real_wage_cagr_low'] <= bounded['real_wage_cagr_high']).all()